@@ -0,0 +1,184 @@
+import os
+import gzip
+import json
+import time
+import logging
+import argparse
+import threading
+import concurrent.futures
+
+from extraction import extract_card, extract_listing, firm_id_from_url
+from profiles import DEFAULT_PROFILE, PROFILES, get_profile
+from record import CompanyRecord
+from compressed_io import remove_framed, strip_compression
+from writer import CsvStreamWriter
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = "snapshots.bin"
+INDEX_FILE = "index.jsonl"
+
+
+def build_archive_path(csv_file_path):
+    return os.path.splitext(strip_compression(csv_file_path))[0] + "_archive"
+
+
+# Архив отрендеренного HTML страниц выдачи и карточек компаний.
+# snapshots.bin — склейка независимых gzip-блоков, только дописывается;
+# index.jsonl — по строке на снимок: тип, ключ (ID фирмы или номер страницы),
+# смещение и длина блока в snapshots.bin и служебные поля.
+class SnapshotArchive:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._data = open(os.path.join(path, DATA_FILE), 'ab')
+        self._index = open(os.path.join(path, INDEX_FILE), 'a', encoding='utf-8')
+
+    def add(self, kind, key, html, **meta):
+        payload = gzip.compress(html.encode('utf-8'), compresslevel=6)
+        with self._lock:
+            offset = self._data.tell()
+            self._data.write(payload)
+            self._data.flush()
+            entry = {
+                "kind": kind,
+                "key": key,
+                "offset": offset,
+                "length": len(payload),
+                "ts": time.time(),
+            }
+            entry.update(meta)
+            self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index.flush()
+
+    def add_card(self, company_url, html, redirect=None, resolved=None):
+        meta = {"url": company_url}
+        if redirect and resolved:
+            meta["redirect"] = redirect
+            meta["resolved"] = resolved
+        self.add("card", firm_id_from_url(company_url) or company_url, html, **meta)
+
+    def add_listing(self, city_alias, search_query, page, html, firm_ids, area=None):
+        # В режиме --grid номера страниц повторяются в каждой области карты,
+        # поэтому область входит в ключ снимка.
+        key = f"{city_alias}:{search_query}:{page}" if area is None else f"{city_alias}:{search_query}:{area}:{page}"
+        meta = {"city": city_alias, "query": search_query, "page": page, "firm_ids": firm_ids}
+        if area is not None:
+            meta["area"] = area
+        self.add("listing", key, html, **meta)
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._index.close()
+
+
+def read_index(archive_path):
+    entries = []
+    with open(os.path.join(archive_path, INDEX_FILE), 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Недописанная строка после аварийного завершения.
+                logger.warning("Пропущена повреждённая строка индекса архива")
+    return entries
+
+
+def read_snapshot(archive_path, entry):
+    with open(os.path.join(archive_path, DATA_FILE), 'rb') as f:
+        f.seek(entry["offset"])
+        return gzip.decompress(f.read(entry["length"])).decode('utf-8')
+
+
+def latest_entries(entries, kind):
+    latest = {}
+    for entry in entries:
+        if entry["kind"] == kind:
+            latest.pop(entry["key"], None)
+            latest[entry["key"]] = entry
+    return list(latest.values())
+
+
+def _extract_listing_entry(task):
+    archive_path, entry, listing_fields = task
+    return extract_listing(read_snapshot(archive_path, entry), listing_fields)
+
+
+def _extract_card_entry(task):
+    archive_path, entry, groups = task
+    data = extract_card(read_snapshot(archive_path, entry), groups)
+    if entry.get("redirect") and data["website"] == entry["redirect"]:
+        data["website"] = entry["resolved"]
+    return entry["key"], data
+
+
+def reextract(archive_path, profile, output_path, workers=None):
+    entries = read_index(archive_path)
+    listings = sorted(
+        latest_entries(entries, "listing"), key=lambda e: (e.get("query", ""), e.get("area", ""), e.get("page", 0))
+    )
+    cards = latest_entries(entries, "card")
+    logger.info(f"Архив {archive_path}: {len(listings)} страниц выдачи, {len(cards)} карточек")
+
+    companies = {}
+    processed = set()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        listing_tasks = [(archive_path, entry, profile.listing_fields) for entry in listings]
+        for page_companies in executor.map(_extract_listing_entry, listing_tasks, chunksize=4):
+            for company_data in page_companies:
+                dedup_key = profile.dedup_key(company_data)
+                if dedup_key in processed or dedup_key in (None, "Н/Д"):
+                    continue
+                processed.add(dedup_key)
+                firm_id = firm_id_from_url(company_data.get("Ссылка 2ГИС")) or dedup_key
+                companies[firm_id] = CompanyRecord.from_dict(company_data)
+
+        details = {}
+        if profile.needs_details:
+            card_tasks = [(archive_path, entry, profile.detail_groups) for entry in cards]
+            details = dict(executor.map(_extract_card_entry, card_tasks, chunksize=16))
+
+    remove_framed(output_path)
+
+    with CsvStreamWriter(output_path, profile.columns) as csv_writer:
+        for firm_id, record in companies.items():
+            if firm_id in details:
+                record.apply_card(details[firm_id], profile.detail_groups)
+            csv_writer.write(record)
+
+    matched = sum(1 for firm_id in companies if firm_id in details)
+    logger.info(f"Повторное извлечение завершено: {len(companies)} компаний, {matched} с карточками")
+    return len(companies)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Архив снимков страниц 2ГИС")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stats_parser = commands.add_parser("stats", help="сводка по архиву")
+    stats_parser.add_argument("archive")
+
+    reextract_parser = commands.add_parser("reextract", help="повторно извлечь данные без браузера")
+    reextract_parser.add_argument("archive")
+    reextract_parser.add_argument("--output", required=True, help="путь к итоговому CSV")
+    reextract_parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=sorted(PROFILES))
+    reextract_parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        entries = read_index(args.archive)
+        size = os.path.getsize(os.path.join(args.archive, DATA_FILE))
+        print(f"Страниц выдачи: {len(latest_entries(entries, 'listing'))}")
+        print(f"Карточек: {len(latest_entries(entries, 'card'))}")
+        print(f"Всего снимков: {len(entries)}, {size / 1024 / 1024:.1f} МБ")
+    elif args.command == "reextract":
+        reextract(args.archive, get_profile(args.profile), args.output, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import time
+import logging
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from page_scripts import run_page_script
+
+logger = logging.getLogger(__name__)
+
+# Признаки страниц блокировки в адресе и тексте страницы (в нижнем регистре).
+URL_MARKERS = {
+    "captcha": ("captcha", "showcaptcha"),
+    "error_page": ("chrome-error://",),
+}
+TEXT_MARKERS = {
+    "captcha": ("я не робот", "подтвердите, что вы не робот", "подтвердите, что запросы отправляли вы"),
+    "rate_limit": ("слишком много запросов", "too many requests"),
+    "forbidden": ("доступ ограничен", "доступ запрещён", "access denied", "403 forbidden"),
+    "server_error": ("502 bad gateway", "503 service", "504 gateway", "сервис временно недоступен"),
+}
+# Страница почти без текста после загрузки — пустой ответ вместо выдачи или карточки.
+EMPTY_PAGE_CHARS = 40
+# Почти пустая страница бывает и при медленной отрисовке, поэтому без других
+# признаков блокировкой считается только столько пустых страниц подряд в одном драйвере.
+EMPTY_REPEATS = 2
+
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0",
+)
+
+SITE_ORIGIN = "https://2gis.ru"
+
+
+class BlockDetected(Exception):
+    def __init__(self, reason, where=None):
+        super().__init__(f"страница блокировки ({reason})")
+        self.reason = reason
+        self.where = where
+        # Номер страницы выдачи, на которой обход упёрся в блокировку.
+        self.page = None
+
+
+def classify_page(state):
+    url = (state.get("url") or "").lower()
+    for reason, markers in URL_MARKERS.items():
+        if any(marker in url for marker in markers):
+            return reason
+    if state.get("captcha"):
+        return "captcha"
+    text = f"{state.get('title') or ''}\n{state.get('text') or ''}".lower()
+    for reason, markers in TEXT_MARKERS.items():
+        if any(marker in text for marker in markers):
+            return reason
+    if (state.get("textLength") or 0) < EMPTY_PAGE_CHARS:
+        return "empty"
+    return None
+
+
+def detect_block(driver):
+    try:
+        return classify_page(run_page_script(driver, "page_state") or {})
+    except Exception as e:
+        logger.debug("Не удалось проверить страницу на блокировку: %s", e)
+        return None
+
+
+def reset_identity(driver, user_agent):
+    # Новая «личность» в том же браузере: без cookies и локальных данных сайта,
+    # с другим User-Agent. Перезапуск Chrome не нужен.
+    commands = (
+        ("Network.clearBrowserCookies", {}),
+        ("Storage.clearDataForOrigin", {"origin": SITE_ORIGIN, "storageTypes": "all"}),
+        ("Network.setUserAgentOverride", {"userAgent": user_agent}),
+    )
+    for command, params in commands:
+        try:
+            driver.execute_cdp_cmd(command, params)
+        except Exception as e:
+            logger.debug("Команда %s не выполнена: %s", command, e)
+
+
+# Реакция на блокировки, общая для всех драйверов. Каждая блокировка считается
+# по причине, драйвер получает новую личность и на cooldown секунд выводится из
+# пула, а число одновременных загрузок карточек уменьшается вдвое и все загрузки
+# ставятся на паузу. Пауза удваивается при повторных блокировках (до max_cooldown);
+# после recover_after успешных карточек подряд лимит растёт на единицу, пока не
+# снимется совсем.
+class BlockMonitor:
+    def __init__(self, cooldown=30.0, max_cooldown=600.0, recover_after=20, user_agents=USER_AGENTS):
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.recover_after = recover_after
+        self.events = Counter()
+        self.quarantined = 0
+        self._user_agents = itertools.cycle(user_agents)
+        self._cond = threading.Condition()
+        self._cooldown = cooldown
+        # Пауза, назначенная последней блокировкой: на неё же уходит драйвер на карантин.
+        self._applied_cooldown = cooldown
+        self._pause_until = 0.0
+        self._limit = None
+        self._active = 0
+        self._peak = 0
+        self._streak = 0
+        self._empty_streaks = {}
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while True:
+                pause = self._pause_until - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self._limit is not None and self._active >= self._limit:
+                    self._cond.wait()
+                else:
+                    break
+            self._active += 1
+            self._peak = max(self._peak, self._active)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def record(self, reason, where=None):
+        with self._cond:
+            self.events[reason] += 1
+            self._streak = 0
+            current = self._limit if self._limit is not None else max(self._peak, 1)
+            self._limit = max(1, current // 2)
+            self._pause_until = max(self._pause_until, time.monotonic() + self._cooldown)
+            cooldown = self._applied_cooldown = self._cooldown
+            limit = self._limit
+            self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+        logger.warning(
+            f"Блокировка ({reason}, {where or 'карточка'}): пауза {cooldown:.0f} с, "
+            f"одновременных загрузок не больше {limit}"
+        )
+        return cooldown
+
+    def success(self):
+        with self._cond:
+            if self._limit is None:
+                return
+            self._streak += 1
+            if self._streak < self.recover_after:
+                return
+            self._streak = 0
+            self._cooldown = self.base_cooldown
+            self._limit += 1
+            if self._limit > self._peak:
+                self._limit = None
+                logger.info("Ограничение после блокировок снято")
+            self._cond.notify_all()
+
+    def confirm(self, reason, key=None):
+        # Причины с явными признаками подтверждаются сразу, «empty» — только после
+        # EMPTY_REPEATS пустых страниц подряд у одного драйвера (key); нормальная
+        # страница этого драйвера сбрасывает счёт.
+        with self._cond:
+            if reason != "empty":
+                self._empty_streaks.pop(key, None)
+                return reason is not None
+            streak = self._empty_streaks.get(key, 0) + 1
+            if streak < EMPTY_REPEATS:
+                self._empty_streaks[key] = streak
+                return False
+            self._empty_streaks.pop(key, None)
+            return True
+
+    def check(self, driver, where=None):
+        reason = detect_block(driver)
+        if self.confirm(reason, getattr(driver, "session_id", None) or id(driver)):
+            self.record(reason, where)
+            raise BlockDetected(reason, where)
+        if reason is not None:
+            logger.debug("Почти пустая страница (%s), блокировкой пока не считается", where or "карточка")
+
+    def new_identity(self, driver):
+        reset_identity(driver, next(self._user_agents))
+
+    def quarantine(self, driver, driver_pool):
+        # Драйвер возвращается в пул по таймеру, а не сразу после ошибки.
+        self.new_identity(driver)
+        with self._cond:
+            self.quarantined += 1
+            cooldown = self._applied_cooldown
+        timer = threading.Timer(cooldown, driver_pool.return_driver, [driver])
+        timer.daemon = True
+        timer.start()
+
+    def wait_out(self):
+        pause = self._pause_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+    def report(self):
+        with self._cond:
+            return {
+                "events": dict(self.events),
+                "total": sum(self.events.values()),
+                "quarantined": self.quarantined,
+                "limit": self._limit,
+            }
+
+    def log_report(self):
+        report = self.report()
+        if not report["total"]:
+            return
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(report["events"].items()))
+        logger.warning(f"Блокировок за запуск: {report['total']} ({reasons}), драйверов на карантине: {report['quarantined']}")
@@ -0,0 +1,225 @@
+import io
+import os
+import csv
+import zlib
+import gzip
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+COMPRESSIONS = tuple(EXTENSIONS)
+FRAMES_SUFFIX = ".frames"
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def compression_for(path):
+    if not path:
+        return None
+    for compression, extension in EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+def compressed_path(path, compression):
+    if not compression:
+        return path
+    return path + EXTENSIONS[compression]
+
+
+def strip_compression(path):
+    compression = compression_for(path)
+    return path[:-len(EXTENSIONS[compression])] if compression else path
+
+
+def frames_path(path):
+    return path + FRAMES_SUFFIX
+
+
+def _require(compression):
+    if compression not in EXTENSIONS:
+        raise ValueError(f"Неизвестное сжатие: {compression}. Доступны: {', '.join(COMPRESSIONS)}")
+    if compression == "zstd" and zstandard is None:
+        raise RuntimeError("Для сжатия zstd нужен пакет zstandard: pip install zstandard")
+
+
+def committed_size(path):
+    # Длина сжатого файла по последнему завершённому кадру. Без индекса кадров
+    # (файл сжат другой программой) весь файл считается завершённым.
+    index = frames_path(path)
+    if not os.path.exists(index):
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    committed = 0
+    with open(index, 'r', encoding='ascii') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                committed = int(line)
+    return committed
+
+
+def frame_offsets(path):
+    # Смещения начала кадров: по ним можно читать файл с любого кадра.
+    offsets = [0]
+    if os.path.exists(frames_path(path)):
+        with open(frames_path(path), 'r', encoding='ascii') as f:
+            offsets.extend(int(line) for line in f if line.strip())
+    return offsets[:-1]
+
+
+def truncate_uncommitted(path):
+    # Отрезает хвост незавершённого кадра, оставшийся после аварийного завершения.
+    if not os.path.exists(path):
+        return 0
+    committed = committed_size(path)
+    tail = os.path.getsize(path) - committed
+    if tail > 0:
+        os.truncate(path, committed)
+        logger.warning(f"Отброшен незавершённый хвост {path}: {tail} байт")
+    return max(tail, 0)
+
+
+def replace_framed(src, dst):
+    # Переименование сжатого файла вместе с индексом кадров.
+    os.replace(src, dst)
+    if os.path.exists(frames_path(src)):
+        os.replace(frames_path(src), frames_path(dst))
+
+
+def remove_framed(path):
+    for name in (path, frames_path(path)):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+# Текстовый файл, сжимаемый потоком из независимых кадров: членов gzip или
+# кадров zstd, которые при чтении склеиваются в один поток. commit() закрывает
+# текущий кадр, делает fsync и записывает его конец в индекс <файл>.frames.
+# Дописывать файл можно в следующих запусках: при открытии хвост после
+# последнего завершённого кадра отрезается, а читатели дальше него не читают.
+class FramedWriter:
+    def __init__(self, path, compression, level=None):
+        _require(compression)
+        self.path = path
+        self.compression = compression
+        self.level = level
+        truncate_uncommitted(path)
+        self._raw = open(path, 'ab')
+        self._index = open(frames_path(path), 'a', encoding='ascii')
+        self._compressor = self._new_compressor()
+        self._dirty = False
+
+    def _new_compressor(self):
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=self.level or ZSTD_LEVEL).compressobj()
+        # wbits=31: поток с заголовком и контрольной суммой gzip.
+        return zlib.compressobj(self.level or GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def write(self, text):
+        self._raw.write(self._compressor.compress(text.encode('utf-8')))
+        self._dirty = True
+        return len(text)
+
+    def tell(self):
+        return self._raw.tell()
+
+    def flush(self):
+        # Сжатые данные незавершённого кадра читатели всё равно не видят,
+        # поэтому flush() только передаёт готовые байты системе.
+        self._raw.flush()
+
+    def commit(self):
+        if not self._dirty:
+            return
+        self._raw.write(self._compressor.flush())
+        self._compressor = self._new_compressor()
+        self._dirty = False
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._index.write(f"{self._raw.tell()}\n")
+        self._index.flush()
+        os.fsync(self._index.fileno())
+
+    def close(self):
+        if self._raw.closed:
+            return
+        try:
+            self.commit()
+        finally:
+            self._raw.close()
+            self._index.close()
+
+
+class _BoundedReader(io.RawIOBase):
+    # Читает файл только до limit байт: до конца последнего завершённого кадра.
+    def __init__(self, path, limit, start=0):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = limit - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:self._remaining]
+        read = self._file.readinto(view)
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class _GzipReader(gzip.GzipFile):
+    # GzipFile не закрывает переданный ему fileobj.
+    def __init__(self, source):
+        super().__init__(fileobj=source, mode='rb')
+        self._source = source
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._source.close()
+
+
+def open_binary(path, start=0, compression=None):
+    compression = compression or compression_for(path)
+    if compression is None:
+        return open(path, 'rb')
+    _require(compression)
+    raw = io.BufferedReader(_BoundedReader(path, committed_size(path), start))
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+    return _GzipReader(raw)
+
+
+def open_text(path, encoding='utf-8-sig', compression=None):
+    # Открытие CSV или JSON lines на чтение независимо от сжатия.
+    compression = compression or compression_for(path)
+    if compression is None:
+        return open(path, 'r', encoding=encoding, newline='')
+    return io.TextIOWrapper(open_binary(path, compression=compression), encoding=encoding, newline='')
+
+
+def open_writer(path, compression=None):
+    compression = compression or compression_for(path)
+    if compression is None:
+        return open(path, 'a', newline='', encoding='utf-8')
+    return FramedWriter(path, compression)
+
+
+def iter_records(path, delimiter=';'):
+    # Потоковое чтение строк результата (обычного или сжатого CSV) в виде словарей.
+    with open_text(path) as f:
+        yield from csv.DictReader(f, delimiter=delimiter)
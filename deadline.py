@@ -0,0 +1,32 @@
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+# Бюджет времени на обработку одной компании. Каждое ожидание получает не свой
+# полный таймаут, а остаток бюджета, поэтому одна медленная карточка не держит
+# драйвер дольше заданного времени.
+class Deadline:
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, limit):
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Бюджет времени на компанию исчерпан")
+        return min(limit, remaining)
+
+
+def budget(deadline, limit):
+    return limit if deadline is None else deadline.timeout(limit)
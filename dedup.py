@@ -0,0 +1,279 @@
+import re
+import csv
+import zlib
+import logging
+import argparse
+from collections import defaultdict
+
+from profiles import firm_id_from_url
+from record import CompanyRecord
+from compressed_io import open_text, remove_framed
+from writer import CsvStreamWriter
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_COLUMN = "Кластер"
+
+# Число корзин MinHash на поле и разбиение общей сигнатуры на полосы LSH.
+# Полоса берёт по четыре корзины названия и адреса, поэтому кандидатами становятся
+# записи, похожие и по названию, и по адресу, а не все филиалы одной сети.
+NAME_BINS = 32
+ADDRESS_BINS = 32
+BAND_BINS = 4
+MAX_BUCKET = 200
+
+NAME_THRESHOLD = 0.8
+ADDRESS_THRESHOLD = 0.75
+
+_LEGAL_FORMS = re.compile(r"\b(ооо|оао|зао|пао|ао|ип|нко|ано|чоу|llc|ltd|inc)\b")
+_NON_WORD = re.compile(r"[^0-9a-zа-я]+")
+# Правила применяются до удаления пунктуации: сокращения вида «пр-кт» и «б-р»
+# пишутся через дефис.
+_ADDRESS_ABBREVIATIONS = [
+    # Этаж и офис на сущность не влияют и убираются вместе с номером.
+    (re.compile(r"\b\d+\s*(?:-?й\s*)?этаж\b|\bэтаж\s*\d*"), " "),
+    (re.compile(r"\b(?:офис|оф)\b\.?\s*[0-9a-zа-я/-]*"), " "),
+    (re.compile(r"\bулица\b"), "ул"),
+    (re.compile(r"\bпроспект\b|\bпр-кт\b|\bпр-т\b"), "пр"),
+    (re.compile(r"\bпереулок\b|\bпер\b"), "пер"),
+    (re.compile(r"\bбульвар\b|\bб-р\b"), "бул"),
+    (re.compile(r"\bшоссе\b|\bш\b"), "ш"),
+    (re.compile(r"\bплощадь\b|\bпл\b"), "пл"),
+    (re.compile(r"\bнабережная\b|\bнаб\b"), "наб"),
+    (re.compile(r"\bдом\b|\bд\b"), ""),
+    (re.compile(r"\bкорпус\b|\bкорп\b"), "к"),
+    (re.compile(r"\bстроение\b|\bстр\b"), "с"),
+]
+_PHONE_DIGITS = re.compile(r"\D+")
+
+
+def _empty(value):
+    return not value or value == "Н/Д"
+
+
+def normalize_name(name):
+    if _empty(name):
+        return ""
+    name = name.lower().replace("ё", "е")
+    name = _LEGAL_FORMS.sub(" ", name)
+    return " ".join(_NON_WORD.sub(" ", name).split())
+
+
+def normalize_address(address):
+    if _empty(address):
+        return ""
+    address = address.lower().replace("ё", "е")
+    for pattern, replacement in _ADDRESS_ABBREVIATIONS:
+        address = pattern.sub(replacement, address)
+    return " ".join(_NON_WORD.sub(" ", address).split())
+
+
+def normalize_phones(phones):
+    result = set()
+    for phone in phones:
+        digits = _PHONE_DIGITS.sub("", phone)
+        if len(digits) >= 10:
+            result.add(digits[-10:])
+    return frozenset(result)
+
+
+def shingles(text, size=3):
+    if not text:
+        return set()
+    padded = f" {text} "
+    if len(padded) <= size:
+        return {padded}
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
+
+
+def minhash(items, bins):
+    # MinHash с одной перестановкой: каждый шингл хешируется один раз и попадает
+    # в корзину по остатку, в корзине остаётся минимум. Пустые корзины заполняются
+    # из соседних, чтобы короткие строки сравнивались корректно.
+    signature = [None] * bins
+    for item in items:
+        value = zlib.crc32(item.encode("utf-8"))
+        index = value % bins
+        value //= bins
+        if signature[index] is None or value < signature[index]:
+            signature[index] = value
+    if all(v is None for v in signature):
+        return None
+    for i in range(bins):
+        offset = 1
+        while signature[i] is None:
+            neighbour = signature[(i + offset) % bins]
+            if neighbour is not None:
+                signature[i] = neighbour + offset * 0x10000000
+            offset += 1
+    return tuple(signature)
+
+
+def similarity(left, right):
+    if left is None or right is None:
+        return 0.0
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+class _DisjointSet:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, left, right):
+        left, right = self.find(left), self.find(right)
+        if left == right:
+            return False
+        # Корнем остаётся меньший индекс, он и будет ID кластера.
+        if right < left:
+            left, right = right, left
+        self.parent[right] = left
+        return True
+
+
+class EntityResolver:
+    def __init__(self, name_threshold=NAME_THRESHOLD, address_threshold=ADDRESS_THRESHOLD,
+                 max_bucket=MAX_BUCKET):
+        self.name_threshold = name_threshold
+        self.address_threshold = address_threshold
+        self.max_bucket = max_bucket
+        self.name_signatures = []
+        self.address_signatures = []
+        self.phones = []
+        self.firm_ids = []
+
+    def add(self, record):
+        self.name_signatures.append(minhash(shingles(normalize_name(record.name)), NAME_BINS))
+        self.address_signatures.append(minhash(shingles(normalize_address(record.address)), ADDRESS_BINS))
+        self.phones.append(normalize_phones(record.phones))
+        self.firm_ids.append(firm_id_from_url(record.gis_link))
+
+    def _is_match(self, left, right):
+        name_similarity = similarity(self.name_signatures[left], self.name_signatures[right])
+        if name_similarity < self.name_threshold:
+            return False
+        if self.address_signatures[left] is None or self.address_signatures[right] is None:
+            # Без адреса сливаем только записи с общим телефоном.
+            return bool(self.phones[left] & self.phones[right])
+        address_similarity = similarity(self.address_signatures[left], self.address_signatures[right])
+        if address_similarity >= self.address_threshold:
+            return True
+        return address_similarity >= self.address_threshold / 2 and bool(self.phones[left] & self.phones[right])
+
+    def _buckets(self):
+        buckets = defaultdict(list)
+        by_firm = defaultdict(list)
+        for index, (name_sig, address_sig) in enumerate(zip(self.name_signatures, self.address_signatures)):
+            if self.firm_ids[index]:
+                by_firm[self.firm_ids[index]].append(index)
+            if name_sig is None:
+                continue
+            address_sig = address_sig or (0,) * ADDRESS_BINS
+            for band, start in enumerate(range(0, NAME_BINS, BAND_BINS)):
+                key = (band, name_sig[start:start + BAND_BINS], address_sig[start:start + BAND_BINS])
+                buckets[key].append(index)
+        return by_firm, buckets
+
+    def resolve(self):
+        disjoint = _DisjointSet(len(self.name_signatures))
+        by_firm, buckets = self._buckets()
+
+        # Одна фирма 2ГИС под разными ссылками — всегда одна сущность.
+        for members in by_firm.values():
+            for other in members[1:]:
+                disjoint.union(members[0], other)
+
+        compared = 0
+        skipped = 0
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            if len(members) > self.max_bucket:
+                skipped += 1
+                continue
+            for i, left in enumerate(members):
+                for right in members[i + 1:]:
+                    if disjoint.find(left) == disjoint.find(right):
+                        continue
+                    compared += 1
+                    if self._is_match(left, right):
+                        disjoint.union(left, right)
+
+        if skipped:
+            logger.warning(f"Пропущено {skipped} слишком крупных групп кандидатов (больше {self.max_bucket} записей)")
+        clusters = [disjoint.find(index) for index in range(len(self.name_signatures))]
+        logger.info(
+            f"Сравнено пар: {compared}, записей: {len(clusters)}, сущностей: {len(set(clusters))}"
+        )
+        return clusters
+
+
+def _completeness(record):
+    return sum(1 for value in record.to_row().values() if not _empty(value))
+
+
+def resolve_csv(input_path, output_path, collapse=False, name_threshold=NAME_THRESHOLD,
+                address_threshold=ADDRESS_THRESHOLD):
+    resolver = EntityResolver(name_threshold, address_threshold)
+    with open_text(input_path) as f:
+        reader = csv.DictReader(f, delimiter=';')
+        fieldnames = list(reader.fieldnames or [])
+        records = []
+        for row in reader:
+            record = CompanyRecord.from_dict(row)
+            resolver.add(record)
+            records.append(record)
+
+    clusters = resolver.resolve()
+
+    if collapse:
+        # Из каждого кластера остаётся самая полная запись.
+        best = {}
+        for index, cluster in enumerate(clusters):
+            if cluster not in best or _completeness(records[index]) > _completeness(records[best[cluster]]):
+                best[cluster] = index
+        selected = sorted(best.values())
+    else:
+        selected = range(len(records))
+
+    # Строки пишутся вторым проходом по исходному файлу как есть: колонки, которых
+    # нет в CompanyRecord (данные сайтов, постобработка), не теряются.
+    selected = set(selected)
+    columns = fieldnames if CLUSTER_COLUMN in fieldnames else fieldnames + [CLUSTER_COLUMN]
+    remove_framed(output_path)
+    with open_text(input_path) as f, CsvStreamWriter(output_path, columns) as csv_writer:
+        for index, row in enumerate(csv.DictReader(f, delimiter=';')):
+            if index not in selected:
+                continue
+            row[CLUSTER_COLUMN] = clusters[index] + 1
+            csv_writer.write(row)
+
+    return len(records), len(set(clusters))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Поиск дублей компаний в CSV-выгрузке 2ГИС")
+    parser.add_argument("input", help="CSV-файл с результатами парсинга")
+    parser.add_argument("--output", required=True, help="путь к CSV с колонкой кластера")
+    parser.add_argument("--collapse", action="store_true", help="оставить по одной записи на кластер")
+    parser.add_argument("--name-threshold", type=float, default=NAME_THRESHOLD, help="порог сходства названий")
+    parser.add_argument("--address-threshold", type=float, default=ADDRESS_THRESHOLD, help="порог сходства адресов")
+    args = parser.parse_args()
+
+    total, entities = resolve_csv(
+        args.input, args.output, args.collapse, args.name_threshold, args.address_threshold
+    )
+    print(f"Записей: {total}, уникальных компаний: {entities}")
+
+
+if __name__ == "__main__":
+    main()
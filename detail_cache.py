@@ -0,0 +1,102 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 200000
+
+
+# Кеш данных карточек между запросами, ключ — ID фирмы 2ГИС. Хранится результат
+# извлечения карточки (телефоны, сайт, соцсети и т.д.) вместе с набором групп
+# полей, с которым он был получен: запись подходит, только если в ней есть все
+# группы, нужные текущему профилю. Старые записи вытесняются по времени
+# последнего обращения, когда размер превышает max_entries.
+class DetailCache:
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS details ("
+            " firm_id TEXT PRIMARY KEY,"
+            " groups TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS details_accessed ON details (accessed_at)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM details").fetchone()[0]
+
+    def get(self, firm_id, groups):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT groups, data, created_at FROM details WHERE firm_id = ?", (firm_id,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl or not set(groups) <= set(row[0].split(",")):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE details SET accessed_at = ? WHERE firm_id = ?", (now, firm_id))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[1])
+
+    def put(self, firm_id, groups, data):
+        now = time.time()
+        payload = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM details WHERE firm_id = ?", (firm_id,)
+            ).fetchone() is not None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO details (firm_id, groups, data, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (firm_id, ",".join(sorted(groups)), payload, now, now)
+            )
+            if not exists:
+                self._size += 1
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._size = self._conn.execute("SELECT COUNT(*) FROM details").fetchone()[0]
+        excess = self._size - self.max_entries
+        if excess <= 0:
+            return
+        # Удаляем с запасом в 1%, чтобы не вытеснять на каждой вставке.
+        excess += self.max_entries // 100
+        cursor = self._conn.execute(
+            "DELETE FROM details WHERE firm_id IN ("
+            " SELECT firm_id FROM details ORDER BY accessed_at LIMIT ?)",
+            (excess,)
+        )
+        self.evictions += cursor.rowcount
+        self._size -= cursor.rowcount
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "size": self._size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
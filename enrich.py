@@ -0,0 +1,362 @@
+import re
+import ssl
+import csv
+import time
+import asyncio
+import logging
+import argparse
+from urllib.parse import quote, urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from detail_cache import DetailCache
+from extraction import classify_social, href_of, inner_text, parse_html, select
+from record import MISSING, SOCIAL_BY_COLUMN, CompanyRecord
+from compressed_io import open_text, remove_framed
+from writer import CsvStreamWriter
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (compatible; 2gisTrace-enrich/1.0)"
+LIVENESS_COLUMN = "Сайт доступен"
+
+MAX_REDIRECTS = 5
+MAX_BODY_BYTES = 512 * 1024
+ROBOTS_TIMEOUT = 5.0
+CACHE_GROUPS = ("site",)
+# Колонки, которые может заполнить дополнение; остальные колонки строки не меняются.
+ENRICHED_COLUMNS = ("Email", *SOCIAL_BY_COLUMN)
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[a-zа-я]{2,}", re.IGNORECASE)
+_NOT_EMAIL_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp")
+_REDIRECT_CODES = {301, 302, 303, 307, 308}
+_SAFE_PATH_CHARS = "/?&=%:@+,;~!$'()*#[]"
+
+
+class HttpResponse:
+    __slots__ = ("status", "headers", "body", "url")
+
+    def __init__(self, status, headers, body, url):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.url = url
+
+    def text(self):
+        content_type = self.headers.get("content-type", "")
+        match = re.search(r"charset=([\w-]+)", content_type, re.IGNORECASE)
+        encodings = [match.group(1)] if match else []
+        for encoding in encodings + ["utf-8", "cp1251"]:
+            try:
+                return self.body.decode(encoding)
+            except (LookupError, UnicodeDecodeError):
+                continue
+        return self.body.decode("utf-8", errors="replace")
+
+
+async def _read_body(reader, headers, max_bytes):
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        chunks = []
+        size = 0
+        while size < max_bytes:
+            line = await reader.readline()
+            chunk_size = int(line.split(b";")[0].strip() or b"0", 16)
+            if chunk_size == 0:
+                break
+            chunks.append(await reader.readexactly(chunk_size))
+            size += chunk_size
+            await reader.readline()
+        return b"".join(chunks)[:max_bytes]
+    length = headers.get("content-length")
+    if length is not None and length.isdigit():
+        return await reader.readexactly(min(int(length), max_bytes))
+    body = b""
+    while len(body) < max_bytes:
+        block = await reader.read(max_bytes - len(body))
+        if not block:
+            break
+        body += block
+    return body
+
+
+# Минимальный HTTP/1.1-клиент на asyncio: один GET на соединение, без сжатия.
+# Полноценная HTTP-библиотека в зависимостях проекта не нужна — для главной
+# страницы сайта этого достаточно.
+async def http_get(url, timeout=10.0, max_bytes=MAX_BODY_BYTES, ssl_context=None):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Неподдерживаемый адрес: {url}")
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    path = quote(parts.path or "/", safe=_SAFE_PATH_CHARS)
+    if parts.query:
+        path += "?" + quote(parts.query, safe=_SAFE_PATH_CHARS)
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, port,
+            ssl=(ssl_context or ssl.create_default_context()) if secure else None,
+            server_hostname=parts.hostname if secure else None
+        )
+        try:
+            host = parts.hostname.encode("idna").decode("ascii")
+            if parts.port:
+                host += f":{parts.port}"
+            writer.write(
+                f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n"
+                f"Accept: text/html,*/*;q=0.5\r\nAccept-Encoding: identity\r\nConnection: close\r\n\r\n"
+                .encode("ascii")
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            fields = status_line.split(None, 2)
+            if len(fields) < 2 or not fields[1].isdigit():
+                raise ValueError(f"Некорректный ответ сервера: {status_line[:80]!r}")
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await _read_body(reader, headers, max_bytes)
+            return HttpResponse(int(fields[1]), headers, body, url)
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+def extract_contacts(html, base_url):
+    root = parse_html(html)
+    emails = []
+    socials = {}
+    for link in select(root, "a[href]"):
+        href = href_of(link, base_url)
+        if href.startswith("mailto:"):
+            email = href[len("mailto:"):].split("?")[0].strip()
+            if email and email not in emails:
+                emails.append(email)
+            continue
+        if href.startswith("http"):
+            network = classify_social(href, link.get("aria-label", ""))
+            if network and network not in socials:
+                socials[network] = href
+    for email in _EMAIL_RE.findall(inner_text(root)):
+        if not email.lower().endswith(_NOT_EMAIL_SUFFIXES) and email not in emails:
+            emails.append(email)
+    return emails, socials
+
+
+# Обход сайтов компаний: главная страница каждого сайта загружается один раз,
+# не больше per_host соединений на хост и concurrency всего. robots.txt
+# запрашивается один раз на хост; результаты можно сохранять в кеш между запусками.
+class SiteEnricher:
+    def __init__(self, concurrency=100, per_host=2, timeout=10.0, cache=None, respect_robots=True,
+                 ssl_context=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.cache = cache
+        self.respect_robots = respect_robots
+        self.ssl_context = ssl_context
+        self._semaphore = None
+        self._hosts = {}
+        self._robots = {}
+
+    def _host_semaphore(self, origin):
+        if origin not in self._hosts:
+            self._hosts[origin] = asyncio.Semaphore(self.per_host)
+        return self._hosts[origin]
+
+    async def _get(self, url, timeout=None):
+        parts = urlsplit(url)
+        # Сначала слот хоста, потом общий: запрос, ждущий занятый хост, не держит общий слот.
+        async with self._host_semaphore(f"{parts.scheme}://{parts.netloc}"), self._semaphore:
+            return await http_get(url, timeout or self.timeout, ssl_context=self.ssl_context)
+
+    async def _robots_for(self, origin):
+        if origin not in self._robots:
+            # Будущее записывается сразу, чтобы параллельные запросы к хосту ждали один robots.txt.
+            self._robots[origin] = asyncio.ensure_future(self._load_robots(origin))
+        return await self._robots[origin]
+
+    async def _load_robots(self, origin):
+        parser = RobotFileParser()
+        try:
+            response = await self._get(origin + "/robots.txt", ROBOTS_TIMEOUT)
+        except Exception:
+            parser.allow_all = True
+            return parser
+        if response.status in (401, 403):
+            parser.disallow_all = True
+        elif 200 <= response.status < 300:
+            parser.parse(response.text().splitlines())
+        else:
+            parser.allow_all = True
+        return parser
+
+    async def _allowed(self, url):
+        if not self.respect_robots:
+            return True
+        parts = urlsplit(url)
+        robots = await self._robots_for(f"{parts.scheme}://{parts.netloc}")
+        return robots.can_fetch(USER_AGENT, url)
+
+    async def enrich_url(self, url):
+        if self.cache is not None:
+            cached = self.cache.get(url, CACHE_GROUPS)
+            if cached is not None:
+                return cached
+
+        result = {"status": None, "final_url": url, "emails": [], "socials": {}, "error": None}
+        current = url
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                if not await self._allowed(current):
+                    result["error"] = "robots.txt"
+                    break
+                response = await self._get(current)
+                location = response.headers.get("location")
+                if response.status in _REDIRECT_CODES and location:
+                    current = urljoin(current, location)
+                    continue
+                result["status"] = response.status
+                result["final_url"] = current
+                if 200 <= response.status < 300:
+                    result["emails"], result["socials"] = extract_contacts(response.text(), current)
+                break
+            else:
+                result["error"] = "слишком много редиректов"
+        except asyncio.TimeoutError:
+            result["error"] = "таймаут"
+        except Exception as e:
+            result["error"] = type(e).__name__
+
+        # Ошибки сети не кешируются: сайт мог быть временно недоступен.
+        if self.cache is not None and result["status"] is not None:
+            self.cache.put(url, CACHE_GROUPS, result)
+        return result
+
+    async def enrich_many(self, urls, on_result=None):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        results = {}
+
+        async def run(url):
+            results[url] = await self.enrich_url(url)
+            if on_result is not None:
+                on_result(url, results[url])
+
+        await asyncio.gather(*(run(url) for url in urls))
+        return results
+
+
+def liveness(result):
+    if result is None:
+        return MISSING
+    if result["error"] == "robots.txt":
+        return "запрещено robots.txt"
+    if result["status"] is None:
+        return f"нет ({result['error']})"
+    if 200 <= result["status"] < 400:
+        return "да"
+    return f"нет ({result['status']})"
+
+
+def apply_enrichment(record, result):
+    if result is None:
+        return
+    if record.email is None and result["emails"]:
+        record.email = result["emails"][0]
+    found = result["socials"]
+    if found:
+        record.set_socials({
+            column: record.social(network) or found.get(column)
+            for column, network in SOCIAL_BY_COLUMN.items()
+        })
+
+
+def _site_url(record):
+    website = record.website
+    if not website or "2gis." in website:
+        return None
+    return website if "://" in website else "http://" + website
+
+
+def enrich_csv(input_path, output_path, enricher):
+    total = 0
+    urls = set()
+    with open_text(input_path) as f:
+        reader = csv.DictReader(f, delimiter=';')
+        columns = list(reader.fieldnames or [])
+        for row in reader:
+            total += 1
+            url = _site_url(CompanyRecord.from_dict(row))
+            if url:
+                urls.add(url)
+    urls = sorted(urls)
+    logger.info(f"Записей: {total}, уникальных сайтов: {len(urls)}")
+
+    done = 0
+    started = time.monotonic()
+
+    def on_result(url, result):
+        nonlocal done
+        done += 1
+        if done % 500 == 0:
+            logger.info(f"Обработано сайтов: {done}/{len(urls)} ({done / (time.monotonic() - started):.0f}/с)")
+
+    results = asyncio.run(enricher.enrich_many(urls, on_result))
+
+    if LIVENESS_COLUMN not in columns:
+        columns.append(LIVENESS_COLUMN)
+    remove_framed(output_path)
+    filled = 0
+    # Второй проход по исходному файлу: строка пишется как есть, поверх неё —
+    # только дополненные колонки, поэтому колонки вне CompanyRecord сохраняются.
+    with open_text(input_path) as f, CsvStreamWriter(output_path, columns) as csv_writer:
+        for row in csv.DictReader(f, delimiter=';'):
+            record = CompanyRecord.from_dict(row)
+            result = results.get(_site_url(record))
+            before = record.email, record.socials
+            apply_enrichment(record, result)
+            if (record.email, record.socials) != before:
+                filled += 1
+                enriched = record.to_row(ENRICHED_COLUMNS)
+                row.update((column, enriched[column]) for column in ENRICHED_COLUMNS if column in row)
+            row[LIVENESS_COLUMN] = liveness(result)
+            csv_writer.write(row)
+
+    alive = sum(1 for result in results.values() if liveness(result) == "да")
+    logger.info(f"Сайтов доступно: {alive}/{len(urls)}, дополнено записей: {filled}")
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Дополнение выгрузки 2ГИС данными с сайтов компаний")
+    parser.add_argument("input", help="CSV-файл с результатами парсинга")
+    parser.add_argument("--output", required=True, help="путь к дополненному CSV")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременных запросов всего")
+    parser.add_argument("--per-host", type=int, default=2, help="одновременных запросов к одному хосту")
+    parser.add_argument("--timeout", type=float, default=10.0, help="таймаут запроса, секунды")
+    parser.add_argument("--cache", metavar="PATH", help="SQLite-файл кеша результатов по адресу сайта")
+    parser.add_argument("--cache-ttl", type=float, default=168, help="срок жизни записи кеша в часах")
+    parser.add_argument("--ignore-robots", action="store_true", help="не проверять robots.txt")
+    args = parser.parse_args()
+
+    cache = DetailCache(args.cache, ttl=args.cache_ttl * 3600) if args.cache else None
+    enricher = SiteEnricher(
+        concurrency=args.concurrency, per_host=args.per_host, timeout=args.timeout,
+        cache=cache, respect_robots=not args.ignore_robots
+    )
+    try:
+        enrich_csv(args.input, args.output, enricher)
+    finally:
+        if cache is not None:
+            logger.info(f"Кеш: {cache.stats()}")
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from profiles import DETAIL_GROUPS, LISTING_SELECTORS, firm_id_from_url
+
+BASE_URL = "https://2gis.ru/"
+
+# Хешированные классы 2ГИС, от которых зависит извлечение. Таблица общая для
+# браузерного скрипта (page_scripts.py) и офлайн-извлечения из архива, поэтому
+# исправление селектора делается только здесь.
+SELECTORS = {
+    "search_input": "input._cu5ae4",
+    "listing_item": "div._1kf6gff",
+    "listing_name": "._1rehek",
+    "card_ready": "div._qvsf7z",
+    "phones": 'div._b0ke8 a[href^="tel:"]',
+    "phone_reveal": "button._1tkj2hw",
+    "email": 'a[href^="mailto:"]',
+    "contact_block": "div._172gbf8",
+    "contact_links": 'div._172gbf8 div._49kxlr a[href*="http"]',
+    "globe_icon": 'svg path[d*="M12 4a8 8 0 1 0 8 8"]',
+    "hours": "div._ksc2xc",
+    "business_type": "button._1rehek",
+    "social_blocks": "div._2fgdxvm, div._14uxmys",
+    "social_primary_block": "div._2fgdxvm",
+    "social_icon": 'svg[fill="#028eff"], svg path[fill-rule="evenodd"]',
+    "captcha": 'iframe[src*="captcha"], .smart-captcha, #captcha, .g-recaptcha, form[action*="captcha"]',
+    "review_item": "div._1k5soqfl",
+    "review_author": "span._wrdavn",
+    "review_date": "div._a5f6uz",
+    "review_rating": "div._1fkin5c span",
+    "review_text": "a._1oir7fah, a._1msln3t",
+    "reviews_more": "button._kuel4no",
+}
+
+# Запасные варианты без хешированных классов для ожиданий в браузере
+# (selector_registry.py): используются, когда основной селектор перестал находиться.
+SELECTOR_FALLBACKS = {
+    "search_input": ['input[type="text"][placeholder]'],
+    "card_ready": ['a[href^="tel:"]', "h1"],
+    "phones": ['a[href^="tel:"]'],
+    "phone_reveal": ['button[aria-label*="елефон"]'],
+    "review_item": ['div[itemprop="review"]'],
+}
+
+BUSINESS_TYPE_MARKERS = [
+    "Интернет-магазин", "Розница", "Опт", "Производство", "магазин", "Шоурум", "Салон"
+]
+
+# --- Разбор HTML ---------------------------------------------------------
+
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr"
+}
+_BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "div", "dl", "dt", "dd",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "li",
+    "main", "nav", "ol", "p", "section", "table", "tr", "ul"
+}
+_SKIP_TEXT_TAGS = {"script", "style", "noscript", "template"}
+
+
+class Node:
+    __slots__ = ("tag", "attrs", "children", "parent", "text")
+
+    def __init__(self, tag, attrs=None, parent=None, text=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.children = []
+        self.parent = parent
+        self.text = text
+
+    @property
+    def classes(self):
+        return self.attrs.get("class", "").split()
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def iter_elements(self):
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if node.tag is None:
+                continue
+            yield node
+            stack.extend(reversed(node.children))
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document")
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(node)
+        if tag not in _VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(node)
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not None and node.tag != tag:
+            node = node.parent
+        if node is not None and node.parent is not None:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(Node(None, parent=self.current, text=data))
+
+
+def parse_html(html):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+# --- CSS-селекторы -------------------------------------------------------
+# Поддерживается подмножество CSS, которое используется в SELECTORS:
+# тег, классы, атрибуты ([a], [a=v], [a^=v], [a*=v], [a$=v]),
+# комбинатор потомка и перечисление через запятую.
+
+_COMPOUND_RE = re.compile(r"^(\*|[a-zA-Z][\w-]*)?((?:\.[\w-]+)*)((?:\[[^\]]*\])*)$")
+_ATTR_RE = re.compile(r"""\[\s*([\w-]+)\s*(?:([\^*$]?=)\s*(?:"([^"]*)"|'([^']*)'|([^\]\s]*)))?\s*\]""")
+_SELECTOR_CACHE = {}
+
+
+def _split_outside(text, separator):
+    parts, current, depth, quote = [], [], 0, None
+    for char in text:
+        if quote:
+            current.append(char)
+            if char == quote:
+                quote = None
+            continue
+        if char in "\"'":
+            quote = char
+        elif char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif depth == 0 and (char.isspace() if separator == " " else char == separator):
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _compile_compound(text):
+    match = _COMPOUND_RE.match(text)
+    if not match:
+        raise ValueError(f"Неподдерживаемый селектор: {text}")
+    tag, classes, attrs = match.groups()
+    return (
+        None if tag in (None, "*") else tag.lower(),
+        [cls for cls in classes.split(".") if cls],
+        [
+            (name, op, next((v for v in values if v), ""))
+            for name, op, *values in _ATTR_RE.findall(attrs)
+        ] if attrs else [],
+    )
+
+
+def compile_selector(selector):
+    compiled = _SELECTOR_CACHE.get(selector)
+    if compiled is None:
+        compiled = _SELECTOR_CACHE[selector] = [
+            [_compile_compound(part) for part in _split_outside(group, " ")]
+            for group in _split_outside(selector, ",")
+        ]
+    return compiled
+
+
+def _match_compound(node, compound):
+    tag, classes, attrs = compound
+    if tag and node.tag != tag:
+        return False
+    if classes:
+        node_classes = node.classes
+        if any(cls not in node_classes for cls in classes):
+            return False
+    for name, op, value in attrs:
+        if name not in node.attrs:
+            return False
+        actual = node.attrs[name]
+        if op == "=" and actual != value:
+            return False
+        if op == "^=" and not actual.startswith(value):
+            return False
+        if op == "*=" and value not in actual:
+            return False
+        if op == "$=" and not actual.endswith(value):
+            return False
+    return True
+
+
+def _match_chain(node, chain):
+    if not _match_compound(node, chain[-1]):
+        return False
+    if len(chain) == 1:
+        return True
+    ancestor = node.parent
+    while ancestor is not None:
+        if ancestor.tag not in (None, "#document") and _match_chain(ancestor, chain[:-1]):
+            return True
+        ancestor = ancestor.parent
+    return False
+
+
+def matches(node, selector):
+    return any(_match_chain(node, chain) for chain in compile_selector(selector))
+
+
+def select(root, selector):
+    compiled = compile_selector(selector)
+    return [
+        node for node in root.iter_elements()
+        if any(_match_chain(node, chain) for chain in compiled)
+    ]
+
+
+def select_one(root, selector):
+    compiled = compile_selector(selector)
+    for node in root.iter_elements():
+        if any(_match_chain(node, chain) for chain in compiled):
+            return node
+    return None
+
+
+def closest(node, selector):
+    while node is not None and node.tag != "#document":
+        if node.tag is not None and matches(node, selector):
+            return node
+        node = node.parent
+    return None
+
+
+def inner_text(node):
+    parts = []
+
+    def walk(current):
+        if current.tag is None:
+            parts.append(re.sub(r"\s+", " ", current.text))
+            return
+        if current.tag in _SKIP_TEXT_TAGS:
+            return
+        if current.tag == "br":
+            parts.append("\n")
+            return
+        block = current.tag in _BLOCK_TAGS
+        if block:
+            parts.append("\n")
+        for child in current.children:
+            walk(child)
+        if block:
+            parts.append("\n")
+
+    walk(node)
+    lines = [line.strip() for line in "".join(parts).split("\n")]
+    return "\n".join(line for line in lines if line)
+
+
+def href_of(node, base_url=BASE_URL):
+    href = node.get("href")
+    return urljoin(base_url, href) if href else ""
+
+
+# --- Извлечение данных ---------------------------------------------------
+
+def classify_social(href, aria_label=""):
+    if "vk.com" in href or "vkontakte" in href or "ВКонтакте" in aria_label:
+        return "ВКонтакте"
+    if "youtube.com" in href or "youtu.be" in href:
+        return "YouTube"
+    if "wa.me" in href or "whatsapp" in href or "WhatsApp" in aria_label:
+        return "WhatsApp"
+    if "t.me" in href or "telegram" in href or "Telegram" in aria_label:
+        return "Telegram"
+    if "instagram.com" in href:
+        return "Instagram"
+    if "facebook.com" in href or "fb.com" in href:
+        return "Facebook"
+    if "ok.ru" in href or "Одноклассники" in aria_label:
+        return "Одноклассники"
+    if "twitter.com" in href or "x.com" in href:
+        return "Twitter"
+    return None
+
+
+def empty_card_data():
+    return {
+        "phones": [],
+        "email": "Н/Д",
+        "website": "Н/Д",
+        "workingHours": "Н/Д",
+        "businessType": "Н/Д",
+        "socials": {column: "Н/Д" for column in DETAIL_GROUPS["socials"]},
+    }
+
+
+# Повторяет браузерный скрипт company_details из page_scripts.py поверх
+# сохранённого HTML; результат имеет ту же структуру.
+def extract_card(html, groups=tuple(DETAIL_GROUPS), base_url=BASE_URL):
+    root = parse_html(html) if isinstance(html, str) else html
+    want = set(groups)
+    result = empty_card_data()
+
+    if "phones" in want:
+        result["phones"] = [
+            text for text in (inner_text(el) for el in select(root, SELECTORS["phones"])) if text
+        ]
+
+    if "email" in want:
+        email = select_one(root, SELECTORS["email"])
+        if email is not None:
+            result["email"] = inner_text(email) or href_of(email, base_url).replace("mailto:", "")
+
+    if "website" in want:
+        for link in select(root, SELECTORS["contact_links"]):
+            href = href_of(link, base_url)
+            parent = closest(link, SELECTORS["contact_block"])
+            has_globe_icon = parent is not None and select_one(parent, SELECTORS["globe_icon"]) is not None
+            if has_globe_icon and href and "tel:" not in href and "mailto:" not in href:
+                result["website"] = href
+                break
+
+    if "hours" in want:
+        hours = select_one(root, SELECTORS["hours"])
+        if hours is not None:
+            text = inner_text(hours).split("\n")[0].strip()
+            if text:
+                result["workingHours"] = text
+
+    if "business" in want:
+        business_types = []
+        for button in select(root, SELECTORS["business_type"]):
+            text = inner_text(button)
+            if text and any(marker in text for marker in BUSINESS_TYPE_MARKERS):
+                business_types.append(text)
+        if business_types:
+            result["businessType"] = "; ".join(business_types)
+
+    if "socials" in want:
+        socials = result["socials"]
+        for block in select(root, SELECTORS["social_blocks"]):
+            for link in select(block, 'a[href*="http"]'):
+                network = classify_social(href_of(link, base_url), link.get("aria-label", ""))
+                if network:
+                    socials[network] = href_of(link, base_url)
+
+        for link in select(root, 'a[href*="http"]'):
+            href = href_of(link, base_url)
+            if not href:
+                continue
+            has_social_icon = select_one(link, SELECTORS["social_icon"]) is not None
+            if has_social_icon or closest(link, SELECTORS["social_primary_block"]) is not None:
+                network = classify_social(href)
+                if network and socials[network] == "Н/Д":
+                    socials[network] = href
+
+    return result
+
+
+def detail_columns(data, profile):
+    all_info = {
+        "Телефоны": "; ".join(data['phones']) if data['phones'] else "Н/Д",
+        "Email": data.get('email', 'Н/Д'),
+        "Веб-сайт": data['website'],
+        "Режим работы": data['workingHours'],
+        "Тип предприятия": data['businessType']
+    }
+    all_info.update(data['socials'])
+
+    return {
+        column: all_info[column]
+        for group in profile.detail_groups
+        for column in DETAIL_GROUPS[group]
+    }
+
+
+# Признаки формата работы в «Типе предприятия». Каждый список собран в одно
+# регулярное выражение: строка просматривается за один проход на список, а не
+# по разу на каждое слово.
+ONLINE_INDICATORS = ("интернет-магазин", "интернет магазин", "онлайн")
+OFFLINE_INDICATORS = ("розница", "опт", "оптовая", "производство",
+                      "магазин", "шоурум", "салон", "студия", "офис")
+_ONLINE_RE = re.compile("|".join(map(re.escape, ONLINE_INDICATORS)))
+_OFFLINE_RE = re.compile("|".join(map(re.escape, OFFLINE_INDICATORS)))
+
+
+def determine_work_mode(business_type):
+    if business_type == "Н/Д":
+        return "Н/Д"
+
+    business_type = business_type.lower()
+    has_online = _ONLINE_RE.search(business_type) is not None
+    has_offline = _OFFLINE_RE.search(business_type) is not None
+
+    if has_online and has_offline:
+        return "Онлайн/Оффлайн"
+    elif has_online:
+        return "Онлайн"
+    elif has_offline:
+        return "Оффлайн"
+    else:
+        return "Не определено"
+
+
+def extract_listing(html, listing_fields=tuple(LISTING_SELECTORS), base_url=BASE_URL):
+    root = parse_html(html) if isinstance(html, str) else html
+    companies = []
+    for item in select(root, SELECTORS["listing_item"]):
+        company_data = {}
+        name = select_one(item, SELECTORS["listing_name"])
+        if name is not None:
+            company_data["Название"] = inner_text(name)
+            company_data["Ссылка 2ГИС"] = href_of(name, base_url) or "Н/Д"
+        else:
+            company_data["Название"] = "Н/Д"
+            company_data["Ссылка 2ГИС"] = "Н/Д"
+
+        for field in listing_fields:
+            element = select_one(item, LISTING_SELECTORS[field])
+            company_data[field] = inner_text(element) if element is not None else "Н/Д"
+            if not company_data[field]:
+                company_data[field] = "Н/Д"
+
+        companies.append(company_data)
+    return companies
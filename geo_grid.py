@@ -0,0 +1,79 @@
+import math
+from collections import namedtuple
+from urllib.parse import quote
+
+# Приблизительные границы городов: (мин. долгота, мин. широта, макс. долгота, макс. широта).
+CITY_BOUNDS = {
+    "moscow": (37.32, 55.49, 37.97, 55.96),
+    "spb": (30.04, 59.74, 30.57, 60.09),
+    "novosibirsk": (82.75, 54.80, 83.15, 55.12),
+    "ekaterinburg": (60.45, 56.73, 60.78, 56.95),
+    "kazan": (48.95, 55.70, 49.28, 55.88),
+    "n_novgorod": (43.75, 56.18, 44.12, 56.39),
+    "krasnoyarsk": (92.70, 55.95, 93.10, 56.10),
+    "chelyabinsk": (61.25, 55.05, 61.55, 55.28),
+    "samara": (50.05, 53.15, 50.35, 53.35),
+    "ufa": (55.85, 54.65, 56.15, 54.85),
+    "krasnodar": (38.88, 44.98, 39.15, 45.12),
+    "omsk": (73.20, 54.90, 73.50, 55.10),
+    "perm": (55.90, 57.90, 56.40, 58.10),
+    "rostov": (39.55, 47.18, 39.85, 47.32),
+    "voronezh": (39.05, 51.60, 39.35, 51.75),
+    "volgograd": (44.30, 48.55, 44.65, 48.85),
+}
+
+# Ширина области карты в пикселях при окне 1920x1080 за вычетом панели выдачи.
+MAP_WIDTH_PX = 1400
+MIN_ZOOM = 10
+MAX_ZOOM = 18
+
+
+class Tile(namedtuple("Tile", "min_lon min_lat max_lon max_lat depth")):
+    __slots__ = ()
+
+    @property
+    def center(self):
+        return (self.min_lon + self.max_lon) / 2, (self.min_lat + self.max_lat) / 2
+
+    @property
+    def zoom(self):
+        # Web Mercator: на масштабе z вся долгота (360°) занимает 256 * 2^z пикселей.
+        span = max(self.max_lon - self.min_lon, 1e-6)
+        zoom = math.floor(math.log2(MAP_WIDTH_PX * 360 / (256 * span)))
+        return max(MIN_ZOOM, min(MAX_ZOOM, zoom))
+
+    def split(self):
+        lon, lat = self.center
+        depth = self.depth + 1
+        return [
+            Tile(self.min_lon, self.min_lat, lon, lat, depth),
+            Tile(lon, self.min_lat, self.max_lon, lat, depth),
+            Tile(self.min_lon, lat, lon, self.max_lat, depth),
+            Tile(lon, lat, self.max_lon, self.max_lat, depth),
+        ]
+
+    def label(self):
+        lon, lat = self.center
+        return f"{lon:.4f},{lat:.4f}/z{self.zoom}"
+
+
+def initial_tiles(city_alias, grid=2):
+    if city_alias not in CITY_BOUNDS:
+        raise ValueError(f"Для города {city_alias} не заданы границы, шардирование по карте недоступно")
+    min_lon, min_lat, max_lon, max_lat = CITY_BOUNDS[city_alias]
+    lon_step = (max_lon - min_lon) / grid
+    lat_step = (max_lat - min_lat) / grid
+    return [
+        Tile(
+            min_lon + col * lon_step, min_lat + row * lat_step,
+            min_lon + (col + 1) * lon_step, min_lat + (row + 1) * lat_step,
+            0
+        )
+        for row in range(grid)
+        for col in range(grid)
+    ]
+
+
+def tile_search_url(city_alias, search_query, tile):
+    lon, lat = tile.center
+    return f"https://2gis.ru/{city_alias}/search/{quote(search_query)}?m={lon:.6f}%2C{lat:.6f}%2F{tile.zoom}"
@@ -0,0 +1,121 @@
+import json
+import atexit
+import logging
+import itertools
+from queue import SimpleQueue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Логгер для сообщений по каждой компании. На больших выгрузках их можно
+# прореживать, не теряя сообщений о страницах, ошибках и итогах.
+COMPANY_LOGGER = "company"
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # Стандартный QueueHandler форматирует сообщение в потоке, который пишет в лог.
+    # Очередь здесь внутрипроцессная, поэтому запись передаётся как есть, а
+    # форматирование и запись в файл выполняются в потоке QueueListener.
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        # Поля, переданные через extra=, попадают в запись отдельными ключами.
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SampleFilter(logging.Filter):
+    # Пропускает каждую every-ю запись уровня ниже WARNING; предупреждения и ошибки проходят всегда.
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        return next(self._counter) % self.every == 0
+
+
+def company_logger(name):
+    return logging.getLogger(f"{name}.{COMPANY_LOGGER}")
+
+
+def setup_logging(log_file=None, json_lines=False, sample_every=1, level=logging.INFO):
+    global _listener
+
+    formatter = JsonFormatter() if json_lines else logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue = SimpleQueue()
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(queue))
+    root.setLevel(level)
+
+    # Повторная настройка (например, когда стал известен файл лога задачи):
+    # прежний слушатель дописывает свою очередь и закрывает обработчики.
+    if _listener is not None:
+        atexit.unregister(_listener.stop)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+
+    sample_filter = SampleFilter(sample_every) if sample_every > 1 else None
+    for name in list(logging.root.manager.loggerDict):
+        if name.endswith(f".{COMPANY_LOGGER}"):
+            company = logging.getLogger(name)
+            for old in [f for f in company.filters if isinstance(f, SampleFilter)]:
+                company.removeFilter(old)
+            if sample_filter is not None:
+                company.addFilter(sample_filter)
+
+    listener.start()
+    atexit.register(listener.stop)
+    _listener = listener
+    return listener
+
+
+def setup_worker_logging(queue, prefix="", level=logging.INFO):
+    # Дочерний процесс не пишет лог сам: записи уходят в родительский процесс
+    # (forward_log_record) и попадают в его консоль и лог задачи. queue — любой
+    # объект с put_nowait; сообщение форматируется здесь, с префиксом процесса.
+    handler = QueueHandler(queue)
+    handler.setFormatter(logging.Formatter(f"{prefix}%(message)s"))
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def forward_log_record(record):
+    # Запись из дочернего процесса передаётся логгеру с тем же именем: к ней
+    # применяются прореживание и обработчики родителя (консоль и лог задачи).
+    logging.getLogger(record.name).handle(record)
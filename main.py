@@ -1,12 +1,14 @@
 import os
 import time
-import csv
-import json
+import shutil
+import argparse
 import logging
+import tempfile
+import threading
 import concurrent.futures
 from queue import Queue
 from functools import wraps
-from datetime import datetime
+from urllib.parse import quote
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
@@ -17,23 +19,118 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import StaleElementReferenceException
 
+from page_scripts import register_page_scripts, run_page_script, script_versions
+from archive import SnapshotArchive, build_archive_path
+from deadline import Deadline, DeadlineExceeded, budget
+from log_config import company_logger, setup_logging
+from detail_cache import DEFAULT_MAX_ENTRIES, DetailCache
+from geo_grid import CITY_BOUNDS, initial_tiles, tile_search_url
+from extraction import SELECTORS, empty_card_data, firm_id_from_url
+from selector_registry import SelectorRegistry
+from blocks import EMPTY_REPEATS, BlockDetected, BlockMonitor, detect_block
+from memory_governor import MemoryGovernor
+from multiproc import WorkerProcessPool
+from priority import FetchBudget, default_score, load_scorer, prioritize
+from tracing import span, start_tracing, stop_tracing
+from compressed_io import COMPRESSIONS, compressed_path
+from state import JobLocked, JobState, job_name
+from shards import ShardedCsvWriter, build_shards_path
+from writer import CsvStreamWriter
+from postprocess import output_columns, process_rows
+from profiles import DEFAULT_PROFILE, LISTING_SELECTORS, PROFILES, get_profile
+from record import CompanyRecord
+
 OUTPUT_FOLDER = "parsed_data"
 if not os.path.exists(OUTPUT_FOLDER):
     os.makedirs(OUTPUT_FOLDER)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'parsing_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
+company_log = company_logger(__name__)
 
-CHECKPOINT_FILE = os.path.join(OUTPUT_FOLDER, "checkpoint.json")
+# Общие для всех задач чекпоинты прежних версий. Чей это обход, по ним не понять,
+# поэтому они не загружаются: чекпоинт теперь лежит в каталоге задачи (state.JobState).
+LEGACY_CHECKPOINTS = (
+    os.path.join(OUTPUT_FOLDER, "checkpoint.json"),
+    os.path.join(OUTPUT_FOLDER, "checkpoint.jsonl.gz"),
+)
+PAGE_LOAD_TIMEOUT = 15
+# Сколько раз компания возвращается в очередь после страницы блокировки
+# и сколько раз перезагружается заблокированная страница выдачи.
+BLOCK_RETRIES = 2
+# Время на одну компанию, секунды: загрузка карточки, раскрытие телефонов,
+# редирект и повторные попытки вместе.
+COMPANY_BUDGET = 30
+# Колонки записи, по которым профиль строит ключ дедупликации.
+KEY_COLUMNS = ("Название", "Ссылка 2ГИС")
 csv_file_path = None
 
+# Множество обработанных компаний общее для всех потоков обхода выдачи.
+_processed_lock = threading.Lock()
+# Состояние текущей задачи: чекпоинт, логи, временные файлы и профили Chrome.
+job_state = None
+
+# Статистика селекторов общая для всех драйверов: если селектор перестал
+# находиться в одной вкладке, остальные не ждут его полный таймаут.
+selectors = SelectorRegistry()
+# Блокировки тоже учитываются на все драйверы сразу: при капче снижается
+# общее число одновременных загрузок, а не только у попавшего под неё драйвера.
+block_monitor = BlockMonitor()
+# Память драйверов: лишние вкладки, замеры RSS и перезапуск драйверов сверх бюджета.
+memory_governor = MemoryGovernor()
+
+CITIES = {
+    "1": ("spb", "Санкт-Петербург"),
+    "2": ("moscow", "Москва"),
+    "3": ("novosibirsk", "Новосибирск"),
+    "4": ("ekaterinburg", "Екатеринбург"),
+    "5": ("kazan", "Казань"),
+    "6": ("n_novgorod", "Нижний Новгород"),
+    "7": ("krasnoyarsk", "Красноярск"),
+    "8": ("chelyabinsk", "Челябинск"),
+    "9": ("samara", "Самара"),
+    "10": ("ufa", "Уфа"),
+    "11": ("krasnodar", "Краснодар"),
+    "12": ("omsk", "Омск"),
+    "13": ("perm", "Пермь"),
+    "14": ("rostov", "Ростов-на-Дону"),
+    "15": ("voronezh", "Воронеж"),
+    "16": ("volgograd", "Волгоград"),
+    "17": ("saratov", "Саратов"),
+    "18": ("tyumen", "Тюмень"),
+    "19": ("tolyatti", "Тольятти"),
+    "20": ("izhevsk", "Ижевск"),
+    "21": ("barnaul", "Барнаул"),
+    "22": ("ulyanovsk", "Ульяновск"),
+    "23": ("irkutsk", "Иркутск"),
+    "24": ("vladivostok", "Владивосток"),
+    "25": ("yaroslavl", "Ярославль"),
+    "26": ("habarovsk", "Хабаровск"),
+    "27": ("makhachkala", "Махачкала"),
+    "28": ("orenburg", "Оренбург"),
+    "29": ("novokuznetsk", "Новокузнецк"),
+    "30": ("kemerovo", "Кемерово"),
+    "31": ("ryazan", "Рязань"),
+    "32": ("tomsk", "Томск"),
+    "33": ("astrakhan", "Астрахань"),
+    "34": ("penza", "Пенза"),
+    "35": ("lipetsk", "Липецк"),
+    "36": ("tula", "Тула"),
+    "37": ("kirov", "Киров"),
+    "38": ("cheboksary", "Чебоксары"),
+    "39": ("kaliningrad", "Калининград"),
+    "40": ("bryanskaya_oblast", "Брянск"),
+    "41": ("kursk", "Курск"),
+    "42": ("ivanovo", "Иваново"),
+    "43": ("magnitogorsk", "Магнитогорск"),
+    "44": ("tver", "Тверь"),
+    "45": ("stavropol", "Ставрополь"),
+    "46": ("simferopol", "Симферополь"),
+    "47": ("sevastopol", "Севастополь"),
+    "48": ("sochi", "Сочи"),
+    "49": ("surgut", "Сургут"),
+    "50": ("vologda", "Вологда")
+}
+
 
 def retry(max_attempts=3, delay=0.1, backoff=1.5):
     def decorator(func):
@@ -41,15 +138,22 @@ def retry(max_attempts=3, delay=0.1, backoff=1.5):
         def wrapper(*args, **kwargs):
             attempt = 0
             current_delay = delay
+            deadline = kwargs.get("deadline")
             while attempt < max_attempts:
                 try:
                     return func(*args, **kwargs)
+                except BlockDetected:
+                    # Повтор с того же драйвера снова попадёт на блокировку.
+                    raise
                 except Exception as e:
                     attempt += 1
                     if attempt >= max_attempts:
-                        logger.error(f"Все {max_attempts} попытки исчерпаны: {e}")
+                        logger.error("Все %d попытки исчерпаны: %s", max_attempts, e)
                         raise
-                    logger.warning(f"Попытка {attempt}/{max_attempts} не удалась: {e}")
+                    if deadline is not None and deadline.remaining() <= current_delay:
+                        logger.warning("Повтор не выполняется, бюджет времени исчерпан: %s", e)
+                        raise
+                    logger.warning("Попытка %d/%d не удалась: %s", attempt, max_attempts, e)
                     time.sleep(current_delay)
                     current_delay *= backoff
             return None
@@ -63,10 +167,15 @@ def wait_for_page_load(driver, timeout=10):
     )
 
 
-def setup_driver():
+def setup_driver(profile_dir=None):
     logger.info("Инициализация драйвера...")
     chrome_options = Options()
 
+    if profile_dir:
+        # Свой каталог профиля у каждого драйвера: параллельные задачи на одной
+        # машине не делят профиль, а его остатки удаляются вместе с каталогом задачи.
+        chrome_options.add_argument(f"--user-data-dir={profile_dir}")
+
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--no-sandbox")
@@ -95,6 +204,8 @@ def setup_driver():
     chrome_options.add_argument("--disable-renderer-backgrounding")
     chrome_options.add_argument("--metrics-recording-only")
     chrome_options.add_argument("--mute-audio")
+    for argument in memory_governor.chrome_arguments():
+        chrome_options.add_argument(argument)
     chrome_options.page_load_strategy = 'eager'
 
     prefs = {
@@ -114,7 +225,7 @@ def setup_driver():
 
     try:
         driver = webdriver.Chrome(options=chrome_options)
-        driver.set_page_load_timeout(15)
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
         driver.set_script_timeout(15)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         logger.info("Драйвер успешно создан")
@@ -125,30 +236,103 @@ def setup_driver():
 
 
 class DriverPool:
-    def __init__(self, size=5):
+    def __init__(self, size=5, profile_root=None):
         logger.info(f"Создание пула драйверов размером {size}...")
+        self.profile_root = profile_root
         self.drivers = []
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._closed = False
         for i in range(size):
             try:
-                driver = setup_driver()
-                self.drivers.append(driver)
+                self.drivers.append(self._create_driver())
                 logger.info(f"Драйвер {i+1}/{size} создан")
             except Exception as e:
                 logger.error(f"Не удалось создать драйвер {i+1}: {e}")
         
+        self.script_versions = {}
+        self.script_identifiers = {}
+        for driver in self.drivers:
+            self.ensure_scripts(driver)
+
         self.available = Queue()
         for driver in self.drivers:
             self.available.put(driver)
         logger.info(f"Пул драйверов готов: {len(self.drivers)} драйверов")
+
+    def _create_driver(self):
+        profile_dir = tempfile.mkdtemp(prefix="chrome-", dir=self.profile_root) if self.profile_root else None
+        try:
+            driver = setup_driver(profile_dir)
+        except Exception:
+            if profile_dir:
+                shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+        self._profiles[driver.session_id] = profile_dir
+        memory_governor.register(driver)
+        return driver
+
+    def recycle(self, driver):
+        # Драйвер сверх бюджета памяти заменяется новым между компаниями. Если
+        # новый не запустился, работа продолжается на старом.
+        try:
+            fresh = self._create_driver()
+        except Exception as e:
+            logger.error(f"Не удалось перезапустить драйвер: {e}")
+            return driver
+        self.ensure_scripts(fresh)
+        with self._lock:
+            if driver in self.drivers:
+                self.drivers[self.drivers.index(driver)] = fresh
+            else:
+                self.drivers.append(fresh)
+        key = driver.session_id
+        memory_governor.unregister(driver, recycled=True)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.debug("Ошибка при закрытии драйвера: %s", e)
+        self.script_versions.pop(key, None)
+        self.script_identifiers.pop(key, None)
+        profile_dir = self._profiles.pop(key, None)
+        if profile_dir:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+        return fresh
     
+    def ensure_scripts(self, driver):
+        key = driver.session_id
+        versions = script_versions()
+        if self.script_versions.get(key) == versions:
+            return
+        try:
+            self.script_identifiers[key] = register_page_scripts(
+                driver, self.script_identifiers.get(key)
+            )
+            logger.debug(f"Скрипты извлечения зарегистрированы: {versions}")
+        except Exception as e:
+            logger.warning(f"Не удалось закрепить скрипты в браузере, будут отправляться целиком: {e}")
+        self.script_versions[key] = versions
+
     def get_driver(self):
-        return self.available.get()
+        driver = self.available.get()
+        self.ensure_scripts(driver)
+        return driver
     
     def return_driver(self, driver):
+        # Драйвер с карантина возвращается по таймеру и может опоздать к close_all:
+        # он уже закрыт вместе с остальными, в пул его не кладём.
+        if self._closed:
+            return
+        if memory_governor.on_return(driver):
+            driver = self.recycle(driver)
         self.available.put(driver)
     
     def close_all(self):
         logger.info("Закрытие всех драйверов в пуле...")
+        with self._lock:
+            self._closed = True
+        for driver in self.drivers:
+            memory_governor.sample(driver)
         while not self.available.empty():
             driver = self.available.get()
             try:
@@ -160,328 +344,267 @@ class DriverPool:
                 driver.quit()
             except:
                 pass
+            memory_governor.unregister(driver)
 
 
-def save_checkpoint(page_num, processed_urls):
-    try:
-        with open(CHECKPOINT_FILE, 'w', encoding='utf-8') as f:
-            json.dump({
-                'last_page': page_num,
-                'processed_urls': list(processed_urls)
-            }, f)
-        logger.info(f"Чекпоинт сохранён: страница {page_num}")
-    except Exception as e:
-        logger.error(f"Ошибка сохранения чекпоинта: {e}")
+def claim_company(processed, dedup_key):
+    with _processed_lock:
+        if dedup_key in processed:
+            return False
+        processed.add(dedup_key)
+        return True
+
+
+def save_checkpoint(page_num, keys):
+    if job_state is not None:
+        job_state.checkpoint.save(page_num, keys)
+
+
+def commit_page(csv_writer, page, checkpoint_page, keys):
+    # Чекпоинт продвигается, только когда строки страницы уже на диске.
+    if csv_writer.sync(page) is None:
+        logger.warning(f"Строки страницы {page} не сброшены на диск, чекпоинт не продвигается")
+        return
+    save_checkpoint(checkpoint_page, keys)
+
+
+def remove_checkpoint():
+    if job_state is not None:
+        job_state.checkpoint.remove()
 
 
 def load_checkpoint():
-    if os.path.exists(CHECKPOINT_FILE):
-        try:
-            with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logger.info(f"Чекпоинт загружен: страница {data['last_page']}")
-                return {
-                    'last_page': data.get('last_page', 0),
-                    'processed_urls': set(data.get('processed_urls', []))
-                }
-        except Exception as e:
-            logger.error(f"Ошибка загрузки чекпоинта: {e}")
-    return {'last_page': 0, 'processed_urls': set()}
+    for path in LEGACY_CHECKPOINTS:
+        if os.path.exists(path):
+            logger.warning(f"Общий чекпоинт прежней версии {path} не загружается: чекпоинты хранятся по задачам")
+    if job_state is None:
+        return {'last_page': 0, 'processed': set()}
+    return job_state.checkpoint.load()
 
 
-def extract_company_basic_data(company_element):
+def extract_company_basic_data(company_element, profile=PROFILES[DEFAULT_PROFILE]):
     company_data = {}
 
     try:
         if not company_element.is_displayed():
             raise Exception("Элемент не отображается")
 
-        name_element = company_element.find_element(By.CSS_SELECTOR, "._1rehek")
+        name_element = company_element.find_element(By.CSS_SELECTOR, SELECTORS["listing_name"])
         company_data["Название"] = name_element.text.strip()
         company_data["Ссылка 2ГИС"] = name_element.get_attribute("href")
     except Exception as e:
-        logger.debug(f"Ошибка при получении названия: {e}")
+        logger.debug("Ошибка при получении названия: %s", e)
         company_data["Название"] = "Н/Д"
         company_data["Ссылка 2ГИС"] = "Н/Д"
 
-    try:
-        address = company_element.find_element(By.CSS_SELECTOR, "._14quei").text.strip()
-        company_data["Адрес"] = address
-    except:
-        company_data["Адрес"] = "Н/Д"
-
-    try:
-        category = company_element.find_element(By.CSS_SELECTOR, "._4cxmw7").text.strip()
-        company_data["Категория"] = category
-    except:
-        company_data["Категория"] = "Н/Д"
-
-    try:
-        rating = company_element.find_element(By.CSS_SELECTOR, "._y10azs").text.strip()
-        company_data["Рейтинг"] = rating
-    except:
-        company_data["Рейтинг"] = "Н/Д"
-
-    try:
-        reviews = company_element.find_element(By.CSS_SELECTOR, "._jspzdm").text.strip()
-        company_data["Отзывы"] = reviews
-    except:
-        company_data["Отзывы"] = "Н/Д"
+    for field in profile.listing_fields:
+        try:
+            value = company_element.find_element(By.CSS_SELECTOR, LISTING_SELECTORS[field]).text.strip()
+            company_data[field] = value
+        except:
+            company_data[field] = "Н/Д"
 
     return company_data
 
 
 @retry(max_attempts=3, delay=0.2)
-def get_company_details_optimized(driver, company_url):
-    logger.debug(f"Переход на страницу компании: {company_url}")
+def get_company_details_optimized(driver, company_url, profile=PROFILES[DEFAULT_PROFILE], archive=None,
+                                  deadline=None):
+    company_log.debug("Переход на страницу компании: %s", company_url)
 
     main_window = driver.current_window_handle
+    opened_window = False
+    timed_out = []
 
     try:
-        driver.execute_script(f"window.open('{company_url}', '_blank');")
-        driver.switch_to.window(driver.window_handles[-1])
+        if deadline is not None:
+            driver.set_page_load_timeout(deadline.timeout(PAGE_LOAD_TIMEOUT))
 
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div._qvsf7z"))
-        )
+        # Карточка открывается в рабочей вкладке драйвера: скрипты, закреплённые
+        # через CDP, действуют только для документов этой вкладки.
+        with span("card_load"):
+            driver.get(company_url)
 
-        all_data_script = """
-            const result = {
-                phones: [],
-                email: 'Н/Д',
-                website: 'Н/Д',
-                workingHours: 'Н/Д',
-                businessType: 'Н/Д',
-                socials: {
-                    'ВКонтакте': 'Н/Д',
-                    'YouTube': 'Н/Д',
-                    'WhatsApp': 'Н/Д',
-                    'Telegram': 'Н/Д',
-                    'Instagram': 'Н/Д',
-                    'Facebook': 'Н/Д',
-                    'Одноклассники': 'Н/Д',
-                    'Twitter': 'Н/Д',
-                    'Другие соцсети': 'Н/Д'
-                }
-            };
-
-            const phoneElements = document.querySelectorAll('div._b0ke8 a[href^="tel:"]');
-            result.phones = Array.from(phoneElements)
-                .map(el => el.innerText.trim())
-                .filter(text => text);
-
-            const emailElement = document.querySelector('a[href^="mailto:"]');
-            if (emailElement) {
-                result.email = emailElement.innerText.trim() || emailElement.href.replace('mailto:', '');
-            }
-
-            const contactLinks = document.querySelectorAll('div._172gbf8 div._49kxlr a[href*="http"]');
-            for (const link of contactLinks) {
-                const href = link.href || '';
-                const parent = link.closest('div._172gbf8');
-                
-                const hasGlobeIcon = parent && parent.querySelector('svg path[d*="M12 4a8 8 0 1 0 8 8"]');
-                
-                if (hasGlobeIcon && href && !href.includes('tel:') && !href.includes('mailto:')) {
-                    result.website = href;
-                    break;
-                }
-            }
-
-            const hoursElement = document.querySelector('div._ksc2xc');
-            if (hoursElement) {
-                const hoursText = hoursElement.innerText.split('\\n')[0].trim();
-                if (hoursText) result.workingHours = hoursText;
-            }
-
-            const businessTypeButtons = document.querySelectorAll('button._1rehek');
-            const businessTypes = [];
-            for (const btn of businessTypeButtons) {
-                const text = btn.innerText.trim();
-                if (text && (text.includes('Интернет-магазин') || text.includes('Розница') || 
-                    text.includes('Опт') || text.includes('Производство') || 
-                    text.includes('магазин') || text.includes('Шоурум') || text.includes('Салон'))) {
-                    businessTypes.push(text);
-                }
-            }
-            if (businessTypes.length > 0) {
-                result.businessType = businessTypes.join('; ');
-            }
-
-            const socialBlocks = document.querySelectorAll('div._2fgdxvm, div._14uxmys');
-            for (const block of socialBlocks) {
-                const links = block.querySelectorAll('a[href*="http"]');
-                for (const link of links) {
-                    const href = link.href || '';
-                    const ariaLabel = link.getAttribute('aria-label') || '';
-                    const text = link.innerText.trim() || '';
-                    
-                    if (href.includes('vk.com') || ariaLabel.includes('ВКонтакте')) {
-                        result.socials['ВКонтакте'] = href;
-                    } else if (href.includes('youtube.com') || href.includes('youtu.be')) {
-                        result.socials['YouTube'] = href;
-                    } else if (href.includes('wa.me') || href.includes('whatsapp') || ariaLabel.includes('WhatsApp')) {
-                        result.socials['WhatsApp'] = href;
-                    } else if (href.includes('t.me') || href.includes('telegram') || ariaLabel.includes('Telegram')) {
-                        result.socials['Telegram'] = href;
-                    } else if (href.includes('instagram.com')) {
-                        result.socials['Instagram'] = href;
-                    } else if (href.includes('facebook.com') || href.includes('fb.com')) {
-                        result.socials['Facebook'] = href;
-                    } else if (href.includes('ok.ru') || ariaLabel.includes('Одноклассники')) {
-                        result.socials['Одноклассники'] = href;
-                    } else if (href.includes('twitter.com') || href.includes('x.com')) {
-                        result.socials['Twitter'] = href;
-                    }
-                }
-            }
-
-            const allSocialLinks = document.querySelectorAll('a[href*="http"]');
-            for (const link of allSocialLinks) {
-                const href = link.href || '';
-                if (!href) continue;
-
-                const hasSocialIcon = link.querySelector('svg[fill="#028eff"], svg path[fill-rule="evenodd"]');
-                
-                if (hasSocialIcon || link.closest('div._2fgdxvm')) {
-                    if ((href.includes('vk.com') || href.includes('vkontakte')) && result.socials['ВКонтакте'] === 'Н/Д') {
-                        result.socials['ВКонтакте'] = href;
-                    } else if ((href.includes('youtube.com') || href.includes('youtu.be')) && result.socials['YouTube'] === 'Н/Д') {
-                        result.socials['YouTube'] = href;
-                    } else if ((href.includes('wa.me') || href.includes('whatsapp')) && result.socials['WhatsApp'] === 'Н/Д') {
-                        result.socials['WhatsApp'] = href;
-                    } else if ((href.includes('t.me') || href.includes('telegram')) && result.socials['Telegram'] === 'Н/Д') {
-                        result.socials['Telegram'] = href;
-                    } else if (href.includes('instagram.com') && result.socials['Instagram'] === 'Н/Д') {
-                        result.socials['Instagram'] = href;
-                    } else if ((href.includes('facebook.com') || href.includes('fb.com')) && result.socials['Facebook'] === 'Н/Д') {
-                        result.socials['Facebook'] = href;
-                    } else if (href.includes('ok.ru') && result.socials['Одноклассники'] === 'Н/Д') {
-                        result.socials['Одноклассники'] = href;
-                    } else if ((href.includes('twitter.com') || href.includes('x.com')) && result.socials['Twitter'] === 'Н/Д') {
-                        result.socials['Twitter'] = href;
-                    }
-                }
-            }
-
-            return result;
-        """
-
-        data = driver.execute_script(all_data_script)
-
-        if not data.get('phones'):
+            # Если признак загрузки карточки не нашёлся, извлекаем то, что уже есть на странице.
+            if selectors.wait(driver, "card_ready", 10, required=False, deadline=deadline) is None:
+                logger.debug("Не дождались загрузки карточки: %s", company_url)
+
+            block_monitor.check(driver, "карточка")
+
+        with span("card_script"):
+            data = run_page_script(driver, "company_details", list(profile.detail_groups))
+
+        if profile.needs_phone_reveal and not data.get('phones'):
             try:
-                show_button = WebDriverWait(driver, 2).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, "button._1tkj2hw"))
-                )
-                driver.execute_script("arguments[0].click();", show_button)
-                
-                WebDriverWait(driver, 2).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div._b0ke8 a[href^='tel:']"))
-                )
-                
-                phone_elements = driver.find_elements(By.CSS_SELECTOR, "div._b0ke8 a[href^='tel:']")
-                phones = [el.text.strip() for el in phone_elements if el.text.strip()]
-                data['phones'] = phones
+                with span("phone_reveal"):
+                    show_button = selectors.wait(driver, "phone_reveal", 2, clickable=True, deadline=deadline)
+                    driver.execute_script("arguments[0].click();", show_button)
+                    
+                    selectors.wait(driver, "phones", 2, deadline=deadline)
+                    
+                    phone_elements = selectors.find_all(driver, "phones")
+                    phones = [el.text.strip() for el in phone_elements if el.text.strip()]
+                    data['phones'] = phones
+            except DeadlineExceeded:
+                timed_out.append("phones")
             except:
                 pass
 
-        if data.get('website') and 'link.2gis.ru' in data['website']:
+        # Снимок делается после раскрытия телефонов, чтобы они попали в архив.
+        page_html = driver.page_source if archive is not None else None
+        redirect_url = None
+
+        if profile.resolves_redirects and data.get('website') and 'link.2gis.ru' in data['website']:
             try:
-                redirect_url = data['website']
-                driver.execute_script(f"window.open('{redirect_url}', '_blank');")
-                driver.switch_to.window(driver.window_handles[-1])
-                
-                WebDriverWait(driver, 5).until(
-                    lambda d: d.current_url != redirect_url
-                )
-                final_url = driver.current_url
-                driver.close()
-                driver.switch_to.window(driver.window_handles[-1])
-                data['website'] = final_url
+                with span("redirect"):
+                    redirect_url = data['website']
+                    opened_window = True
+                    driver.execute_script(f"window.open('{redirect_url}', '_blank');")
+                    driver.switch_to.window(driver.window_handles[-1])
+                    
+                    WebDriverWait(driver, budget(deadline, 5)).until(
+                        lambda d: d.current_url != redirect_url
+                    )
+                    final_url = driver.current_url
+                    driver.close()
+                    driver.switch_to.window(main_window)
+                    data['website'] = final_url
             except Exception as e:
-                logger.debug(f"Не удалось раскрыть редирект: {e}")
+                if deadline is not None and deadline.expired:
+                    timed_out.append("website")
+                logger.debug("Не удалось раскрыть редирект: %s", e)
                 pass
 
-        detailed_info = {
-            "Телефоны": "; ".join(data['phones']) if data['phones'] else "Н/Д",
-            "Email": data.get('email', 'Н/Д'),
-            "Веб-сайт": data['website'],
-            "Режим работы": data['workingHours'],
-            "Тип предприятия": data['businessType']
-        }
-        
-        detailed_info.update(data['socials'])
+        if archive is not None:
+            archive.add_card(company_url, page_html, redirect=redirect_url, resolved=data['website'])
 
-        return detailed_info
+        if timed_out:
+            data['timed_out'] = timed_out
+        return data
 
+    except BlockDetected:
+        raise
     except Exception as e:
-        logger.error(f"Критическая ошибка при получении данных компании: {e}")
-        return {
-            "Телефоны": "Н/Д",
-            "Email": "Н/Д",
-            "Веб-сайт": "Н/Д",
-            "Режим работы": "Н/Д",
-            "Тип предприятия": "Н/Д",
-            "ВКонтакте": "Н/Д",
-            "YouTube": "Н/Д",
-            "WhatsApp": "Н/Д",
-            "Telegram": "Н/Д",
-            "Instagram": "Н/Д",
-            "Facebook": "Н/Д",
-            "Одноклассники": "Н/Д",
-            "Twitter": "Н/Д",
-            "Другие соцсети": "Н/Д"
-        }
+        if deadline is not None and deadline.expired:
+            # Карточка не успела загрузиться: отдаём пустую запись с отметкой,
+            # а не повторяем попытку за пределами бюджета.
+            logger.warning("Истёк бюджет времени на компанию: %s", company_url)
+            data = empty_card_data()
+            data['timed_out'] = list(profile.detail_groups)
+            return data
+        logger.error("Критическая ошибка при получении данных компании: %s", e)
+        return None
 
     finally:
+        # Закрываются все вкладки, кроме рабочей: window.open мог открыть вкладку,
+        # на которую драйвер так и не переключился.
+        if opened_window:
+            try:
+                for handle in driver.window_handles:
+                    if handle != main_window:
+                        driver.switch_to.window(handle)
+                        driver.close()
+                driver.switch_to.window(main_window)
+            except Exception as e:
+                logger.debug("Ошибка при закрытии вкладки: %s", e)
+        if deadline is not None:
+            try:
+                driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+            except Exception as e:
+                logger.debug("Не удалось вернуть таймаут загрузки страницы: %s", e)
+
+
+def fetch_card_data(link, driver_pool, profile, archive=None, cache=None, company_budget=None):
+    firm_id = firm_id_from_url(link)
+    if cache is not None and firm_id:
+        with span("cache_get"):
+            data = cache.get(firm_id, profile.detail_groups)
+        if data is not None:
+            company_log.debug("Данные карточки %s взяты из кеша", firm_id)
+            return data
+
+    with block_monitor.slot():
+        with span("pool_wait"):
+            driver = driver_pool.get_driver()
+        quarantined = False
+        # Бюджет на компанию отсчитывается с момента, когда драйвер получен: ожидание
+        # в очереди и пауза после блокировки в него не входят.
+        deadline = Deadline(company_budget) if company_budget else None
         try:
-            driver.close()
-            driver.switch_to.window(main_window)
-        except Exception as e:
-            logger.debug(f"Ошибка при закрытии вкладки: {e}")
-
+            with span("card", driver=getattr(driver, "session_id", None)):
+                data = get_company_details_optimized(driver, link, profile, archive, deadline=deadline)
+        except BlockDetected:
+            block_monitor.quarantine(driver, driver_pool)
+            quarantined = True
+            raise
+        finally:
+            if not quarantined:
+                driver_pool.return_driver(driver)
+    if data is not None:
+        block_monitor.success()
+
+    # Неудачные и неполные загрузки не кешируются, чтобы не закрепить пустые данные на весь TTL.
+    if data is not None and not data.get('timed_out') and cache is not None and firm_id:
+        with span("cache_put"):
+            cache.put(firm_id, profile.detail_groups, data)
+    return data
+
+
+def process_single_company(company_basic_data, driver_pool, profile=PROFILES[DEFAULT_PROFILE], archive=None,
+                           cache=None, company_budget=COMPANY_BUDGET, budget=None):
+    record = CompanyRecord.from_dict(company_basic_data)
+    if budget is not None and not budget.take():
+        # Бюджет задачи исчерпан: компания записывается с данными из выдачи.
+        record.timed_out = tuple(profile.detail_groups)
+        return record
+    if not profile.needs_details:
+        return record
 
-def process_single_company(company_basic_data, driver_pool):
-    driver = driver_pool.get_driver()
-    
     try:
-        company_data = company_basic_data.copy()
-        
-        link = company_data.get("Ссылка 2ГИС")
-        if link and link != "Н/Д":
+        if record.gis_link:
             try:
-                detailed_info = get_company_details_optimized(driver, link)
-                
-                if detailed_info.get("Веб-сайт") and detailed_info.get("Веб-сайт") != "Н/Д":
-                    company_data["Ссылка"] = detailed_info["Веб-сайт"]
+                data = None
+                for attempt in range(BLOCK_RETRIES + 1):
+                    # После блокировки компания ждёт в очереди конца паузы и получает новый бюджет.
+                    try:
+                        with span("company", firm=firm_id_from_url(record.gis_link)):
+                            data = fetch_card_data(
+                                record.gis_link, driver_pool, profile, archive, cache, company_budget
+                            )
+                        break
+                    except BlockDetected as e:
+                        company_log.warning("Компания %s отложена после блокировки: %s", record.name, e)
                 else:
-                    company_data["Ссылка"] = link
-                
-                company_data.update(detailed_info)
+                    logger.warning("Карточка %s не загружена: блокировка после %d попыток", record.name, BLOCK_RETRIES + 1)
+                    record.timed_out = tuple(profile.detail_groups)
+                if data:
+                    # Если не хватило бюджета, в record.timed_out попадут недозагруженные группы полей.
+                    record.apply_card(data, profile.detail_groups)
             except Exception as e:
-                logger.error(f"Ошибка при получении деталей для {company_data['Название']}: {e}")
-                company_data["Ссылка"] = link
-        else:
-            company_data["Ссылка"] = "Н/Д"
+                logger.error("Ошибка при получении деталей для %s: %s", record.name, e)
         
-        logger.info(f"Обработана компания: {company_data['Название']}")
-        return company_data
+        company_log.info("Обработана компания: %s", record.name)
+        return record
         
     except Exception as e:
-        logger.error(f"Ошибка при обработке компании: {e}")
+        logger.error("Ошибка при обработке компании: %s", e)
         return None
-    finally:
-        driver_pool.return_driver(driver)
 
 
-def process_company_batch_parallel(companies_basic_data, driver_pool, max_workers=5):
+def process_company_batch_parallel(companies_basic_data, driver_pool, max_workers=5,
+                                   profile=PROFILES[DEFAULT_PROFILE], on_result=None, archive=None,
+                                   cache=None, company_budget=COMPANY_BUDGET, scorer=None, query=None,
+                                   budget=None):
     companies_data = []
     
+    # Пул потоков берёт задачи по порядку отправки, поэтому компании с большей
+    # оценкой получают драйверы первыми и первыми укладываются в бюджет.
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {
-            executor.submit(process_single_company, company_data, driver_pool): company_data
-            for company_data in companies_basic_data
+            executor.submit(
+                process_single_company, company_data, driver_pool, profile, archive, cache, company_budget, budget
+            ): company_data
+            for company_data in prioritize(companies_basic_data, scorer, query)
         }
         
         for future in concurrent.futures.as_completed(futures):
@@ -489,68 +612,20 @@ def process_company_batch_parallel(companies_basic_data, driver_pool, max_worker
                 result = future.result()
                 if result:
                     companies_data.append(result)
+                    if on_result is not None:
+                        on_result(result)
             except Exception as e:
-                logger.error(f"Ошибка при получении результата: {e}")
+                logger.error("Ошибка при получении результата: %s", e)
     
     return companies_data
 
 
-def determine_work_mode(business_type):
-    if business_type == "Н/Д":
-        return "Н/Д"
-
-    business_type = business_type.lower()
-
-    online_indicators = ["интернет-магазин", "интернет магазин", "онлайн"]
-    offline_indicators = ["розница", "опт", "оптовая", "производство", 
-                         "магазин", "шоурум", "салон", "студия", "офис"]
-
-    has_online = any(indicator in business_type for indicator in online_indicators)
-    has_offline = any(indicator in business_type for indicator in offline_indicators)
-
-    if has_online and has_offline:
-        return "Онлайн/Оффлайн"
-    elif has_online:
-        return "Онлайн"
-    elif has_offline:
-        return "Оффлайн"
-    else:
-        return "Не определено"
-
-
-def save_to_csv(data, file_path):
-    if not data:
-        return
-
-    fieldnames = [
-        "Название", "Адрес", "Категория", "Рейтинг", "Отзывы", "Ссылка",
-        "Телефоны", "Email", "Веб-сайт", "Режим работы", "Режим работы (тип)", 
-        "Тип предприятия", "ВКонтакте", "YouTube", "WhatsApp", "Telegram", 
-        "Instagram", "Facebook", "Одноклассники", "Twitter", "Другие соцсети", 
-        "Ссылка 2ГИС"
-    ]
-
-    for company in data:
-        company["Режим работы (тип)"] = determine_work_mode(
-            company.get("Тип предприятия", "Н/Д")
-        )
-        for field in fieldnames:
-            company.setdefault(field, "Н/Д")
-
-    file_exists = os.path.isfile(file_path)
-
-    try:
-        with open(file_path, 'a', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=';')
-            if not file_exists:
-                writer.writeheader()
-            writer.writerows(data)
-        logger.info(f"Сохранено {len(data)} записей в {file_path}")
-    except Exception as e:
-        logger.error(f"Ошибка сохранения в CSV: {e}")
+def go_to_next_page(driver, current_page):
+    with span("next_page", page=current_page + 1):
+        return _click_next_page(driver, current_page)
 
 
-def go_to_next_page(driver, current_page):
+def _click_next_page(driver, current_page):
     next_page_num = current_page + 1
     
     try:
@@ -601,186 +676,726 @@ def go_to_next_page(driver, current_page):
     return False
 
 
-def main():
-    global csv_file_path
-    
-    try:
-        logger.info("=== Настройка парсинга 2ГИС ===")
+def parse_args(default_profile=DEFAULT_PROFILE):
+    parser = argparse.ArgumentParser(description="Парсинг компаний из каталога 2ГИС")
+    parser.add_argument("--city", help="номер или псевдоним города из списка (например, 2 или moscow)")
+    parser.add_argument("--query", help="поисковый запрос")
+    parser.add_argument(
+        "--profile", default=default_profile, choices=sorted(PROFILES),
+        help="набор собираемых полей"
+    )
+    parser.add_argument(
+        "--grid", action="store_true",
+        help="разбить город на области карты и обходить их параллельно (обходит лимит в 100 страниц)"
+    )
+    parser.add_argument(
+        "--parallel-listing", action="store_true",
+        help="делить страницы выдачи на диапазоны и обходить их несколькими драйверами"
+    )
+    parser.add_argument("--page-chunk", type=int, default=5, help="размер диапазона страниц в режиме --parallel-listing")
+    parser.add_argument(
+        "--listing-drivers", type=int, default=3,
+        help="число драйверов для обхода выдачи в режимах --grid и --parallel-listing"
+    )
+    parser.add_argument("--grid-depth", type=int, default=4, help="максимальная глубина деления областей")
+    parser.add_argument("--tile-pages", type=int, default=25, help="страниц на область, после которых она делится")
+    parser.add_argument(
+        "--archive", action="store_true",
+        help="сохранять HTML страниц выдачи и карточек для повторного извлечения (archive.py)"
+    )
+    parser.add_argument(
+        "--company-budget", type=float, default=COMPANY_BUDGET,
+        help="максимум секунд на одну компанию, 0 — без ограничения"
+    )
+    parser.add_argument(
+        "--detail-cache", metavar="PATH",
+        help="SQLite-файл кеша карточек по ID фирмы, общий для разных запусков и запросов"
+    )
+    parser.add_argument("--cache-ttl", type=float, default=168, help="срок жизни записи кеша в часах")
+    parser.add_argument(
+        "--cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+        help="максимум записей в кеше, старые по времени обращения вытесняются"
+    )
+    parser.add_argument(
+        "--max-companies", type=int, metavar="N",
+        help="загрузить карточки не больше чем N компаний, начиная с самых ценных"
+    )
+    parser.add_argument(
+        "--time-budget", type=float, metavar="SECONDS",
+        help="загружать карточки не дольше заданного числа секунд"
+    )
+    parser.add_argument(
+        "--scorer", metavar="MODULE:FUNCTION",
+        help="своя функция оценки компании для порядка загрузки карточек (см. priority.py)"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=0, metavar="N",
+        help="обрабатывать карточки в N процессах, у каждого свой пул драйверов (см. multiproc.py)"
+    )
+    parser.add_argument(
+        "--process-drivers", type=int, default=3, metavar="N",
+        help="число драйверов в каждом процессе режима --processes"
+    )
+    parser.add_argument(
+        "--compress", choices=COMPRESSIONS,
+        help="сжимать результаты потоком (.csv.gz или .csv.zst), чтение — compressed_io.iter_records"
+    )
+    parser.add_argument(
+        "--postprocess", action="store_true",
+        help="нормализовать телефоны (E.164), сайты и адреса пачками при записи (см. postprocess.py)"
+    )
+    parser.add_argument(
+        "--shard-rows", type=int, metavar="N",
+        help="писать результаты частями, начиная новую часть после N строк (см. shards.py)"
+    )
+    parser.add_argument(
+        "--shard-pages", type=int, metavar="N",
+        help="писать результаты частями, начиная новую часть после N страниц выдачи"
+    )
+    parser.add_argument(
+        "--driver-memory", type=int, metavar="MB",
+        help="перезапускать драйвер, если его процессы Chrome заняли больше MB мегабайт (см. memory_governor.py)"
+    )
+    parser.add_argument("--js-heap", type=int, metavar="MB", help="предел кучи JavaScript во вкладках Chrome")
+    parser.add_argument(
+        "--memory-cgroup", metavar="PATH",
+        help="cgroup v2, внутри которой каждый драйвер получает свою группу с пределом памяти (нужен --driver-memory)"
+    )
+    parser.add_argument("--log-json", action="store_true", help="писать лог в формате JSON lines")
+    parser.add_argument(
+        "--trace", metavar="PATH",
+        help="записать временную шкалу этапов в формате Chrome trace events (Perfetto, chrome://tracing)"
+    )
+    parser.add_argument(
+        "--log-sample", type=int, default=1, metavar="N",
+        help="писать в лог только каждое N-е сообщение по отдельным компаниям"
+    )
+    return parser.parse_args()
 
-        cities = {
-            "1": ("spb", "Санкт-Петербург"),
-            "2": ("moscow", "Москва"),
-            "3": ("novosibirsk", "Новосибирск"),
-            "4": ("ekaterinburg", "Екатеринбург"),
-            "5": ("kazan", "Казань"),
-            "6": ("n_novgorod", "Нижний Новгород"),
-            "7": ("krasnoyarsk", "Красноярск"),
-            "8": ("chelyabinsk", "Челябинск"),
-            "9": ("samara", "Самара"),
-            "10": ("ufa", "Уфа"),
-            "11": ("krasnodar", "Краснодар"),
-            "12": ("omsk", "Омск"),
-            "13": ("perm", "Пермь"),
-            "14": ("rostov", "Ростов-на-Дону"),
-            "15": ("voronezh", "Воронеж"),
-            "16": ("volgograd", "Волгоград")
-        }
 
-        print("\nДоступные города:")
-        for key, (alias, name) in cities.items():
-            print(f"{key}. {name}")
+def find_city(value):
+    if value in CITIES:
+        return CITIES[value]
+    for city_alias, city_name in CITIES.values():
+        if value in (city_alias, city_name):
+            return city_alias, city_name
+    return None
 
-        while True:
-            city_choice = input("\nВыберите город (введите номер): ").strip()
-            if city_choice in cities:
-                city_alias, city_name = cities[city_choice]
-                break
-            else:
-                print("Неверный выбор. Попробуйте снова.")
 
-        search_query = input(f"\nВведите поисковый запрос для {city_name}: ").strip()
+def choose_city(value=None):
+    if value:
+        city = find_city(value)
+        if city is None:
+            raise ValueError(f"Неизвестный город: {value}")
+        return city
 
-        if not search_query:
-            search_query = "детская мебель"
-            logger.info(f"Используется запрос по умолчанию: '{search_query}'")
+    print("\nДоступные города:")
+    for key, (alias, name) in sorted(CITIES.items(), key=lambda x: int(x[0])):
+        print(f"{key}. {name}")
 
-        safe_query = "".join(c for c in search_query if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        safe_city = city_name.replace("-", "_").replace(" ", "_")
-        csv_file_path = os.path.join(OUTPUT_FOLDER, f"{safe_city}_{safe_query.replace(' ', '_')}.csv")
+    while True:
+        city_choice = input("\nВыберите город (введите номер): ").strip()
+        if city_choice in CITIES:
+            return CITIES[city_choice]
+        print("Неверный выбор. Попробуйте снова.")
 
-        logger.info(f"Начинаем парсинг:")
-        logger.info(f"Город: {city_name}")
-        logger.info(f"Запрос: {search_query}")
-        logger.info(f"Файл результатов: {csv_file_path}")
 
-        checkpoint = load_checkpoint()
-        current_page = checkpoint['last_page']
-        processed_urls = checkpoint['processed_urls']
+def build_csv_path(city_name, search_query, profile):
+    safe_query = "".join(c for c in search_query if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    safe_city = city_name.replace("-", "_").replace(" ", "_")
+    suffix = "" if profile.name == DEFAULT_PROFILE else f"_{profile.name}"
+    return os.path.join(OUTPUT_FOLDER, f"{safe_city}_{safe_query.replace(' ', '_')}{suffix}.csv")
 
-        if current_page > 0:
-            logger.info(f"Продолжаем парсинг со страницы {current_page + 1}")
 
-        driver = setup_driver()
+def open_search(driver, city_alias, city_name, search_query):
+    logger.info("Открытие сайта 2ГИС...")
+    driver.get(f"https://2gis.ru/{city_alias}")
+    wait_for_page_load(driver, timeout=10)
+    time.sleep(0.5)
+    logger.info(f"Открыт 2ГИС для города {city_name}")
 
-        MAX_WORKERS = 5
+    for attempt in range(3):
+        try:
+            search_input = selectors.wait(driver, "search_input", 10)
+            search_input.clear()
+            search_input.send_keys(search_query)
+            search_input.send_keys(Keys.ENTER)
+            logger.info(f"Введен запрос: '{search_query}'")
+            break
+        except StaleElementReferenceException:
+            if attempt == 2:
+                raise
+            time.sleep(0.3)
+            continue
+
+    selectors.wait(driver, "listing_item", 10)
+
+    time.sleep(0.5)
+
+
+def open_search_url(driver, search_url):
+    driver.get(search_url)
+    wait_for_page_load(driver, timeout=10)
+    selectors.wait(driver, "listing_item", 10)
+    time.sleep(0.5)
+
+
+def find_listing_items(driver, page):
+    company_elements = selectors.find_all(driver, "listing_item")
+    attempt = 0
+    empty_seen = 0
+    # Пустая выдача проверяется на блокировку: иначе капча выглядит как конец результатов.
+    while not company_elements:
+        reason = detect_block(driver)
+        if reason is None:
+            return company_elements
+        empty_seen += reason == "empty"
+        # Почти пустая страница без признаков блокировки сначала просто перезагружается.
+        if reason != "empty" or empty_seen >= EMPTY_REPEATS:
+            block_monitor.record(reason, f"выдача, страница {page}")
+            if attempt >= BLOCK_RETRIES:
+                error = BlockDetected(reason, "выдача")
+                error.page = page
+                raise error
+            attempt += 1
+            block_monitor.new_identity(driver)
+            block_monitor.wait_out()
+        try:
+            if "captcha" in driver.current_url.lower():
+                driver.back()
+            else:
+                driver.refresh()
+            wait_for_page_load(driver, timeout=10)
+            selectors.wait(driver, "listing_item", 10, required=False)
+        except Exception as e:
+            logger.debug("Не удалось перезагрузить страницу выдачи: %s", e)
+        company_elements = selectors.find_all(driver, "listing_item")
+    return company_elements
 
-        driver_pool = DriverPool(MAX_WORKERS)
 
-        logger.info("Открытие сайта 2ГИС...")
-        driver.get(f"https://2gis.ru/{city_alias}")
-        wait_for_page_load(driver, timeout=10)
-        time.sleep(0.5)
-        logger.info(f"Открыт 2ГИС для города {city_name}")
+def crawl(driver, driver_pool, city_alias, city_name, search_query, profile, on_result,
+          processed=None, start_page=0, on_page_done=None, max_workers=5, should_stop=None,
+          archive=None, search_url=None, max_pages=100, cache=None, company_budget=COMPANY_BUDGET,
+          process_pool=None, scorer=None, budget=None, area=None):
+    if processed is None:
+        processed = set()
 
-        for attempt in range(3):
-            try:
-                search_input = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "input._cu5ae4"))
-                )
-                search_input.clear()
-                search_input.send_keys(search_query)
-                search_input.send_keys(Keys.ENTER)
-                logger.info(f"Введен запрос: '{search_query}'")
+    try:
+        if search_url:
+            open_search_url(driver, search_url)
+        else:
+            open_search(driver, city_alias, city_name, search_query)
+    except Exception:
+        # Страницу блокировки разбирает find_listing_items на первой итерации.
+        if detect_block(driver) is None:
+            raise
+
+    # При открытии по ссылке страница уже выбрана, переходить по номерам не нужно.
+    if start_page > 0 and not search_url:
+        logger.info(f"Навигация на страницу {start_page}...")
+        for page in range(1, start_page + 1):
+            if not go_to_next_page(driver, page):
+                logger.warning(f"Не удалось перейти на страницу {page + 1}")
                 break
-            except StaleElementReferenceException:
-                if attempt == 2:
-                    raise
-                time.sleep(0.3)
-                continue
-
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div._1kf6gff"))
-        )
+            logger.info(f"Переход на страницу {page + 1}")
 
-        time.sleep(0.5)
+    current_page = max(1, start_page)
+    exhausted = False
 
-        if current_page > 0:
-            logger.info(f"Навигация на страницу {current_page}...")
-            for page in range(1, current_page + 1):
-                if not go_to_next_page(driver, page):
-                    logger.warning(f"Не удалось перейти на страницу {page + 1}")
-                    break
-                logger.info(f"Переход на страницу {page + 1}")
+    while current_page <= max_pages:
+        if should_stop is not None and should_stop():
+            logger.info("Парсинг остановлен по запросу")
+            break
+        if budget is not None and budget.exhausted:
+            logger.info("Бюджет задачи исчерпан, обход выдачи остановлен")
+            break
 
-        current_page = max(1, current_page)
-        max_pages = 100
+        logger.info(f"Обработка страницы {current_page}")
 
-        while current_page <= max_pages:
-            logger.info(f"Обработка страницы {current_page}")
+        time.sleep(0.3)
 
-            time.sleep(0.3)
+        company_elements = find_listing_items(driver, current_page)
 
-            company_elements = driver.find_elements(By.CSS_SELECTOR, "div._1kf6gff")
+        if not company_elements:
+            logger.warning("Компании не найдены на этой странице")
+            exhausted = True
+            break
 
-            if not company_elements:
-                logger.warning("Компании не найдены на этой странице")
-                break
+        logger.info(f"Найдено {len(company_elements)} компаний на странице")
 
-            logger.info(f"Найдено {len(company_elements)} компаний на странице")
+        page_html = driver.page_source if archive is not None else None
+        page_firm_ids = []
 
-            companies_basic_data = []
-            for i, element in enumerate(company_elements):
+        companies_basic_data = []
+        for i, element in enumerate(company_elements):
+            try:
                 try:
-                    try:
-                        current_elements = driver.find_elements(By.CSS_SELECTOR, "div._1kf6gff")
-                        if i < len(current_elements):
-                            element = current_elements[i]
-                        else:
-                            logger.debug(f"Элемент {i} больше не доступен")
-                            continue
-                    except:
-                        logger.debug(f"Не удалось повторно найти элемент {i}")
+                    current_elements = driver.find_elements(By.CSS_SELECTOR, SELECTORS["listing_item"])
+                    if i < len(current_elements):
+                        element = current_elements[i]
+                    else:
+                        logger.debug("Элемент %d больше не доступен", i)
                         continue
+                except:
+                    logger.debug("Не удалось повторно найти элемент %d", i)
+                    continue
 
-                    basic_data = extract_company_basic_data(element)
-                    
-                    if basic_data.get("Ссылка 2ГИС") in processed_urls:
-                        logger.debug(f"Компания уже обработана: {basic_data.get('Название')}")
-                        continue
-                    
-                    companies_basic_data.append(basic_data)
-                    processed_urls.add(basic_data.get("Ссылка 2ГИС"))
-                except Exception as e:
-                    logger.error(f"Ошибка при извлечении базовых данных для элемента {i}: {e}")
+                basic_data = extract_company_basic_data(element, profile)
+                page_firm_ids.append(firm_id_from_url(basic_data.get("Ссылка 2ГИС")))
+                
+                dedup_key = profile.dedup_key(basic_data)
+                if dedup_key in (None, "Н/Д") or not claim_company(processed, dedup_key):
+                    company_log.debug("Компания уже обработана или не опознана: %s", basic_data.get('Название'))
                     continue
+                
+                companies_basic_data.append(basic_data)
+            except Exception as e:
+                logger.error("Ошибка при извлечении базовых данных для элемента %d: %s", i, e)
+                continue
 
-            logger.info(f"Извлечены базовые данные для {len(companies_basic_data)} компаний")
+        logger.info(f"Извлечены базовые данные для {len(companies_basic_data)} компаний")
 
-            if not companies_basic_data:
-                logger.info("Нет новых компаний для обработки на этой странице")
-                if not go_to_next_page(driver, current_page):
-                    logger.info("Достигнута последняя страница")
-                    break
-                current_page += 1
-                save_checkpoint(current_page, processed_urls)
-                continue
+        if archive is not None:
+            archive.add_listing(city_alias, search_query, current_page, page_html, page_firm_ids, area)
+
+        if not companies_basic_data:
+            logger.info("Нет новых компаний для обработки на этой странице")
+            if on_page_done is not None:
+                on_page_done(current_page, [])
+            if not go_to_next_page(driver, current_page):
+                logger.info("Достигнута последняя страница")
+                exhausted = True
+                break
+            current_page += 1
+            continue
 
+        if process_pool is not None:
+            all_companies_data = process_pool.process_batch(
+                prioritize(companies_basic_data, scorer, search_query), on_result, budget
+            )
+        else:
             all_companies_data = process_company_batch_parallel(
                 companies_basic_data, 
                 driver_pool, 
-                max_workers=MAX_WORKERS
+                max_workers=max_workers,
+                profile=profile,
+                on_result=on_result,
+                archive=archive,
+                cache=cache,
+                company_budget=company_budget,
+                scorer=scorer,
+                query=search_query,
+                budget=budget
             )
 
-            if all_companies_data:
-                save_to_csv(all_companies_data, csv_file_path)
-                logger.info(f"Данные с страницы {current_page} сохранены в CSV")
+        if on_page_done is not None:
+            # В чекпоинт уходят ключи компаний, записи которых уже переданы писателю;
+            # компании, не вернувшие записи из-за ошибки, при возобновлении обработаются снова.
+            page_keys = [profile.dedup_key(record.to_row(KEY_COLUMNS)) for record in all_companies_data]
+            on_page_done(current_page, page_keys)
+        logger.info(f"Страница {current_page} обработана: {len(all_companies_data)} компаний")
 
-            save_checkpoint(current_page, processed_urls)
+        if not go_to_next_page(driver, current_page):
+            logger.info("Достигнута последняя страница результатов")
+            exhausted = True
+            break
 
-            if not go_to_next_page(driver, current_page):
-                logger.info("Достигнута последняя страница результатов")
-                break
+        current_page += 1
 
-            current_page += 1
+    return {"last_page": min(current_page, max_pages), "exhausted": exhausted}
+
+
+def search_page_url(city_alias, search_query, page):
+    url = f"https://2gis.ru/{city_alias}/search/{quote(search_query)}"
+    return url if page <= 1 else f"{url}/page/{page}"
+
+
+def crawl_pages_parallel(listing_pool, driver_pool, city_alias, city_name, search_query, profile, on_result,
+                         processed=None, start_page=1, on_page_done=None, max_workers=5, should_stop=None,
+                         archive=None, chunk=5, max_pages=100, cache=None, company_budget=COMPANY_BUDGET,
+                         process_pool=None, scorer=None, budget=None):
+    if processed is None:
+        processed = set()
+
+    lock = threading.Lock()
+    state = {
+        "next_start": max(1, start_page), "end_page": max_pages, "done": {}, "contiguous": start_page - 1,
+        "retry": [], "blocked": {}
+    }
+
+    def take_range():
+        with lock:
+            if state["retry"]:
+                return state["retry"].pop()
+            start = state["next_start"]
+            if start > state["end_page"]:
+                return None
+            state["next_start"] = start + chunk
+            return start, min(start + chunk - 1, state["end_page"])
+
+    # Диапазон, упёршийся в блокировку, возвращается в очередь с заблокированной
+    # страницы. После BLOCK_RETRIES возвратов он пропускается: чекпоинт не
+    # продвинется дальше пропущенных страниц, и они будут обойдены при возобновлении.
+    def requeue(first, last):
+        with lock:
+            attempts = state["blocked"][first] = state["blocked"].get(first, 0) + 1
+            if attempts > BLOCK_RETRIES:
+                logger.error(f"Страницы {first}-{last} пропущены: блокировка после {attempts} попыток")
+                return
+            state["retry"].append((first, last))
+        logger.warning(f"Страницы {first}-{last} возвращены в очередь из-за блокировки")
+
+    def mark_end(page):
+        with lock:
+            state["end_page"] = min(state["end_page"], page)
+
+    # Страницы завершаются не по порядку; в чекпоинт попадает последняя страница
+    # сплошного префикса и ключи компаний только с его страниц, чтобы при
+    # возобновлении ничего не пропустить. Ключи страниц за разрывом ждут, пока
+    # префикс до них дойдёт. Вызов под блокировкой сохраняет порядок записей журнала.
+    def page_done(page, keys):
+        with lock:
+            state["done"][page] = keys
+            committed_from = state["contiguous"]
+            committed = []
+            while state["contiguous"] + 1 in state["done"]:
+                state["contiguous"] += 1
+                committed.extend(state["done"].pop(state["contiguous"]))
+            # Страница за разрывом ничего не подтверждает: её записи попадут в чекпоинт,
+            # когда разрыв закроется.
+            if on_page_done is not None and committed_from < state["contiguous"]:
+                on_page_done(state["contiguous"], committed)
+
+    def worker():
+        driver = listing_pool.get_driver()
+        try:
+            while not (should_stop is not None and should_stop()) and not (budget is not None and budget.exhausted):
+                page_range = take_range()
+                if page_range is None:
+                    break
+                first, last = page_range
+                logger.info(f"Обход страниц {first}-{last}")
+                try:
+                    result = crawl(
+                        driver, driver_pool, city_alias, city_name, search_query, profile, on_result,
+                        processed=processed,
+                        start_page=first,
+                        on_page_done=page_done,
+                        max_workers=max_workers,
+                        should_stop=should_stop,
+                        archive=archive,
+                        cache=cache,
+                        company_budget=company_budget,
+                        process_pool=process_pool,
+                        scorer=scorer,
+                        budget=budget,
+                        search_url=search_page_url(city_alias, search_query, first),
+                        max_pages=last
+                    )
+                except BlockDetected as e:
+                    requeue(e.page or first, last)
+                    continue
+                except Exception as e:
+                    logger.info(f"Страница {first} недоступна, считаем выдачу законченной: {e}")
+                    mark_end(first - 1)
+                    continue
+                if result["exhausted"]:
+                    mark_end(result["last_page"])
+        finally:
+            listing_pool.return_driver(driver)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(listing_pool.drivers)) as executor:
+        futures = [executor.submit(worker) for _ in listing_pool.drivers]
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Ошибка потока обхода выдачи: {e}")
+
+    logger.info(f"Параллельный обход выдачи завершён: {len(processed)} компаний")
+    return processed
 
-        driver_pool.close_all()
+
+def crawl_grid(listing_pool, driver_pool, city_alias, city_name, search_query, profile, on_result,
+               processed=None, on_page_done=None, max_workers=5, should_stop=None, archive=None,
+               grid=2, tile_pages=25, max_depth=4, cache=None, company_budget=COMPANY_BUDGET,
+               process_pool=None, scorer=None, budget=None):
+    if processed is None:
+        processed = set()
+
+    def crawl_tile(tile):
+        tile_page_done = None
+        if on_page_done is not None:
+            # Номера страниц начинаются заново в каждой области, поэтому наружу
+            # страница передаётся парой (область, номер).
+            def tile_page_done(page, keys):
+                on_page_done((tile.label(), page), keys)
+
+        driver = listing_pool.get_driver()
+        try:
+            logger.info(f"Обработка области {tile.label()} (уровень {tile.depth})")
+            return crawl(
+                driver, driver_pool, city_alias, city_name, search_query, profile, on_result,
+                processed=processed,
+                on_page_done=tile_page_done,
+                max_workers=max_workers,
+                should_stop=should_stop,
+                archive=archive,
+                cache=cache,
+                company_budget=company_budget,
+                process_pool=process_pool,
+                scorer=scorer,
+                budget=budget,
+                search_url=tile_search_url(city_alias, search_query, tile),
+                area=tile.label(),
+                max_pages=tile_pages
+            )
+        except BlockDetected as e:
+            logger.warning(f"Область {tile.label()} упёрлась в блокировку: {e}")
+            return {"last_page": 0, "exhausted": False, "blocked": True}
+        except Exception as e:
+            logger.warning(f"Не удалось обработать область {tile.label()}: {e}")
+            return {"last_page": 0, "exhausted": True}
+        finally:
+            listing_pool.return_driver(driver)
+
+    tiles_done = 0
+    blocked = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(listing_pool.drivers)) as executor:
+        pending = {executor.submit(crawl_tile, tile): tile for tile in initial_tiles(city_alias, grid)}
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                tile = pending.pop(future)
+                tiles_done += 1
+                result = future.result()
+                stopped = (should_stop is not None and should_stop()) or (budget is not None and budget.exhausted)
+                if result.get("blocked") and not stopped:
+                    # Область обходится заново: уже обработанные компании пропускаются дедупликацией.
+                    blocked[tile] = blocked.get(tile, 0) + 1
+                    if blocked[tile] <= BLOCK_RETRIES:
+                        pending[executor.submit(crawl_tile, tile)] = tile
+                    else:
+                        logger.error(f"Область {tile.label()} пропущена: блокировка после {blocked[tile]} попыток")
+                    continue
+                # Выдача упёрлась в лимит страниц: делим область на четыре и обходим каждую.
+                if not result["exhausted"] and not stopped and tile.depth < max_depth:
+                    logger.info(f"Область {tile.label()} упёрлась в лимит, делим на части")
+                    for child in tile.split():
+                        pending[executor.submit(crawl_tile, child)] = child
+
+    logger.info(f"Обход по карте завершён: {tiles_done} областей, {len(processed)} компаний")
+    return processed
+
+
+def main(default_profile=DEFAULT_PROFILE):
+    global csv_file_path, job_state
+
+    args = parse_args(default_profile)
+    # Лог пишется в файл, когда известна задача: до выбора города и запроса — только в консоль.
+    setup_logging(json_lines=args.log_json, sample_every=args.log_sample)
+    if args.trace:
+        start_tracing(args.trace)
+        logger.info(f"Трасса этапов пишется в {args.trace}")
+    
+    try:
+        logger.info("=== Настройка парсинга 2ГИС ===")
+
+        profile = get_profile(args.profile)
+        if args.grid and args.parallel_listing:
+            raise ValueError("Режимы --grid и --parallel-listing нельзя использовать одновременно")
+        if args.processes and args.archive:
+            raise ValueError("Архив снимков не поддерживается в режиме --processes")
+        memory_governor.configure(budget_mb=args.driver_memory, js_heap_mb=args.js_heap, cgroup=args.memory_cgroup)
+
+        city_alias, city_name = choose_city(args.city)
+        if args.grid and city_alias not in CITY_BOUNDS:
+            raise ValueError(
+                f"Для города {city_name} не заданы границы карты, режим --grid недоступен. "
+                f"Поддерживаются: {', '.join(sorted(CITY_BOUNDS))}"
+            )
+
+        search_query = args.query
+        if search_query is None:
+            search_query = input(f"\nВведите поисковый запрос для {city_name}: ")
+        search_query = search_query.strip()
+
+        if not search_query:
+            search_query = "детская мебель"
+            logger.info(f"Используется запрос по умолчанию: '{search_query}'")
+
+        csv_file_path = compressed_path(build_csv_path(city_name, search_query, profile), args.compress)
+
+        job_state = JobState(OUTPUT_FOLDER, job_name(csv_file_path)).acquire()
+        setup_logging(log_file=job_state.log_path(), json_lines=args.log_json, sample_every=args.log_sample)
+        logger.info(f"Каталог задачи: {job_state.directory}")
+
+        logger.info(f"Начинаем парсинг:")
+        logger.info(f"Город: {city_name}")
+        logger.info(f"Запрос: {search_query}")
+        logger.info(f"Профиль полей: {profile.name}")
+        logger.info(f"Файл результатов: {csv_file_path}")
+
+        checkpoint = load_checkpoint()
+        current_page = checkpoint['last_page']
+        processed = checkpoint['processed']
+
+        if current_page > 0:
+            logger.info(f"Продолжаем парсинг со страницы {current_page + 1}")
+            logger.info(f"Уже обработано {len(processed)} уникальных компаний")
+
+        MAX_WORKERS = 5
+
+        # В режиме --processes карточки открывают драйверы дочерних процессов,
+        # а кеш карточек каждый процесс открывает сам.
+        driver_pool = None
+        process_pool = None
+        if args.processes:
+            process_pool = WorkerProcessPool(
+                args.processes, args.process_drivers, profile,
+                company_budget=args.company_budget,
+                cache_path=args.detail_cache,
+                profile_root=job_state.tmp_dir,
+                memory=memory_governor.settings()
+            ).start()
+        else:
+            driver_pool = DriverPool(MAX_WORKERS, job_state.tmp_dir)
+
+        columns = profile.columns
+        transform = None
+        if args.postprocess:
+            columns = output_columns(profile.columns)
+            transform = process_rows
+
+        output_path = csv_file_path
+        if args.shard_rows or args.shard_pages:
+            output_path = build_shards_path(csv_file_path)
+            csv_writer = ShardedCsvWriter(
+                output_path, columns, max_rows=args.shard_rows, max_pages=args.shard_pages,
+                compression=args.compress, transform=transform
+            ).start()
+            logger.info(f"Результаты пишутся частями в {output_path}")
+        else:
+            csv_writer = CsvStreamWriter(csv_file_path, columns, transform=transform).start()
+
+        archive = None
+        if args.archive:
+            archive = SnapshotArchive(build_archive_path(csv_file_path))
+            logger.info(f"Снимки страниц сохраняются в {archive.path}")
+
+        cache = None
+        if args.detail_cache and not args.processes:
+            cache = DetailCache(args.detail_cache, ttl=args.cache_ttl * 3600, max_entries=args.cache_size)
+            logger.info(f"Кеш карточек: {args.detail_cache}")
+
+        scorer = load_scorer(args.scorer) if args.scorer else default_score
+        budget = None
+        if args.max_companies or args.time_budget:
+            budget = FetchBudget(args.max_companies, args.time_budget)
+
+        if args.grid:
+            listing_pool = DriverPool(args.listing_drivers, job_state.tmp_dir)
+
+            def on_page_done(page, keys):
+                # Страница здесь — пара (область, номер) для границ частей в shards.py.
+                # В чекпоинт номер не пишется: при возобновлении
+                # области обходятся заново, но уже обработанные компании пропускаются.
+                commit_page(csv_writer, page, 0, keys)
+
+            crawl_grid(
+                listing_pool, driver_pool, city_alias, city_name, search_query, profile,
+                on_result=csv_writer.write,
+                processed=processed,
+                on_page_done=on_page_done,
+                max_workers=MAX_WORKERS,
+                archive=archive,
+                cache=cache,
+                company_budget=args.company_budget,
+                process_pool=process_pool,
+                scorer=scorer,
+                budget=budget,
+                tile_pages=args.tile_pages,
+                max_depth=args.grid_depth
+            )
+            listing_pool.close_all()
+        elif args.parallel_listing:
+            listing_pool = DriverPool(args.listing_drivers, job_state.tmp_dir)
+
+            def on_page_done(page, keys):
+                commit_page(csv_writer, page, page, keys)
+
+            crawl_pages_parallel(
+                listing_pool, driver_pool, city_alias, city_name, search_query, profile,
+                on_result=csv_writer.write,
+                processed=processed,
+                start_page=max(1, current_page),
+                on_page_done=on_page_done,
+                max_workers=MAX_WORKERS,
+                archive=archive,
+                cache=cache,
+                company_budget=args.company_budget,
+                process_pool=process_pool,
+                scorer=scorer,
+                budget=budget,
+                chunk=args.page_chunk
+            )
+            listing_pool.close_all()
+        else:
+            driver = setup_driver(job_state.profile_dir())
+
+            def on_page_done(page, keys):
+                commit_page(csv_writer, page, page, keys)
+
+            crawl(
+                driver, driver_pool, city_alias, city_name, search_query, profile,
+                on_result=csv_writer.write,
+                processed=processed,
+                start_page=current_page,
+                on_page_done=on_page_done,
+                max_workers=MAX_WORKERS,
+                archive=archive,
+                cache=cache,
+                company_budget=args.company_budget,
+                process_pool=process_pool,
+                scorer=scorer,
+                budget=budget
+            )
+
+        if process_pool is not None:
+            process_pool.close()
+        else:
+            driver_pool.close_all()
+        csv_writer.close()
         
-        logger.info(f"Парсинг завершен. Данные сохранены в {csv_file_path}")
+        logger.info(f"Парсинг завершен. Обработано {len(processed)} уникальных компаний")
+        logger.info(f"Данные сохранены в {output_path}")
+        selectors.log_report()
+        block_monitor.log_report()
+        memory_governor.log_report()
+        if budget is not None:
+            stats = budget.stats()
+            logger.info(
+                f"Бюджет задачи: загружено карточек {stats['taken']}, без карточки {stats['skipped']}, "
+                f"{stats['elapsed']:.0f} с"
+            )
+        if cache is not None:
+            stats = cache.stats()
+            logger.info(
+                f"Кеш карточек: {stats['hits']} попаданий, {stats['misses']} промахов "
+                f"({stats['hit_rate']:.0%}), вытеснено {stats['evictions']}, записей {stats['size']}"
+            )
 
-        if os.path.exists(CHECKPOINT_FILE):
-            os.remove(CHECKPOINT_FILE)
-            logger.info("Чекпоинт удален после успешного завершения")
+        remove_checkpoint()
+        logger.info("Чекпоинт удален после успешного завершения")
 
+    except JobLocked as e:
+        logger.error(f"{e}. Дождитесь его завершения или выберите другой город или запрос")
+    except BlockDetected as e:
+        block_monitor.log_report()
+        logger.error(
+            f"Обход остановлен на странице {e.page}: {e}. Чекпоинт сохранён, "
+            f"запустите парсер позже, чтобы продолжить"
+        )
     except Exception as e:
         logger.error(f"Произошла критическая ошибка: {e}", exc_info=True)
 
@@ -793,6 +1408,29 @@ def main():
             driver_pool.close_all()
         except:
             pass
+        try:
+            process_pool.close()
+        except:
+            pass
+        try:
+            listing_pool.close_all()
+        except:
+            pass
+        try:
+            csv_writer.close()
+        except:
+            pass
+        try:
+            archive.close()
+        except:
+            pass
+        try:
+            cache.close()
+        except:
+            pass
+        if job_state is not None:
+            job_state.release()
+        stop_tracing()
 
 
 if __name__ == "__main__":
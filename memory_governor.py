@@ -0,0 +1,269 @@
+import os
+import logging
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+PROC = "/proc"
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+MB = 1024 * 1024
+# Память процессов проверяется на каждом check_every-м возврате драйвера в пул:
+# обход /proc занимает миллисекунды, но делать его после каждой карточки незачем.
+DEFAULT_CHECK_EVERY = 20
+# Жёсткий предел cgroup во столько раз выше бюджета: до него драйвер успевает
+# перезапуститься по бюджету, а ядро убивает только этот Chrome, а не всю машину.
+CGROUP_HARD_FACTOR = 2
+
+
+def _children_map():
+    children = {}
+    for name in os.listdir(PROC):
+        if not name.isdigit():
+            continue
+        try:
+            with open(os.path.join(PROC, name, "stat"), 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Имя процесса в скобках может содержать пробелы, поля идут после последней «)».
+        fields = stat[stat.rfind(")") + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(name))
+    return children
+
+
+def process_tree(pid):
+    # chromedriver и все процессы Chrome, запущенные им: браузер, рендереры, GPU.
+    if psutil is not None:
+        try:
+            parent = psutil.Process(pid)
+            return [pid] + [child.pid for child in parent.children(recursive=True)]
+        except psutil.Error:
+            return []
+    if not os.path.isdir(PROC):
+        return []
+    children = _children_map()
+    tree = []
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, ()))
+    return tree
+
+
+def _rss(pid):
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return 0
+    try:
+        with open(os.path.join(PROC, str(pid), "statm"), 'r') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # Процесс завершился между обходом дерева и чтением.
+        return 0
+
+
+def tree_rss(pid):
+    # Сумма RSS по дереву процессов; общие страницы Chrome считаются в каждом
+    # процессе, поэтому оценка завышена, что для бюджета — запас.
+    tree = process_tree(pid)
+    if not tree:
+        return None
+    return sum(_rss(member) for member in tree)
+
+
+def driver_pid(driver):
+    process = getattr(getattr(driver, "service", None), "process", None)
+    return getattr(process, "pid", None)
+
+
+# Учёт памяти драйверов. Каждый check_every-й возврат драйвера в пул замеряется
+# RSS дерева его процессов; драйвер сверх бюджета budget_mb пул перезапускает
+# между компаниями. Вкладки, оставшиеся открытыми после карточки, закрываются
+# при каждом возврате. Дополнительно Chrome запускается с пределом кучи V8
+# (js_heap_mb), а процессы драйвера можно поместить в отдельную cgroup v2
+# внутри cgroup с пределами memory.high и memory.max.
+class MemoryGovernor:
+    def __init__(self, budget_mb=None, js_heap_mb=None, cgroup=None, check_every=DEFAULT_CHECK_EVERY):
+        self._lock = threading.Lock()
+        self._drivers = {}
+        self.recycled = 0
+        self.closed_windows = 0
+        self.configure(budget_mb, js_heap_mb, cgroup, check_every)
+
+    def configure(self, budget_mb=None, js_heap_mb=None, cgroup=None, check_every=DEFAULT_CHECK_EVERY):
+        self.budget_mb = budget_mb
+        self.js_heap_mb = js_heap_mb
+        self.check_every = max(1, check_every)
+        self.cgroup = cgroup
+        if cgroup and not budget_mb:
+            logger.warning("Cgroup для драйверов не используется: не задан бюджет памяти")
+            self.cgroup = None
+        if self.cgroup:
+            self._enable_memory_controller()
+
+    def settings(self):
+        # Параметры для передачи в дочерние процессы (multiproc.py).
+        return {
+            "budget_mb": self.budget_mb,
+            "js_heap_mb": self.js_heap_mb,
+            "cgroup": self.cgroup,
+            "check_every": self.check_every,
+        }
+
+    def chrome_arguments(self):
+        if not self.js_heap_mb:
+            return []
+        return [f"--js-flags=--max-old-space-size={self.js_heap_mb}"]
+
+    def _enable_memory_controller(self):
+        try:
+            with open(os.path.join(self.cgroup, "cgroup.subtree_control"), 'w') as f:
+                f.write("+memory")
+        except OSError as e:
+            logger.warning(f"Cgroup {self.cgroup} недоступна, пределы памяти не ставятся: {e}")
+            self.cgroup = None
+
+    def _place_in_cgroup(self, pid, tree):
+        path = os.path.join(self.cgroup, f"driver-{pid}")
+        try:
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, "memory.high"), 'w') as f:
+                f.write(str(self.budget_mb * MB))
+            with open(os.path.join(path, "memory.max"), 'w') as f:
+                f.write(str(self.budget_mb * CGROUP_HARD_FACTOR * MB))
+            # Процессы, которые Chrome запустит позже, попадают в cgroup родителя.
+            for member in tree:
+                with open(os.path.join(path, "cgroup.procs"), 'w') as f:
+                    f.write(str(member))
+        except OSError as e:
+            logger.warning(f"Не удалось поместить драйвер {pid} в cgroup: {e}")
+            return None
+        return path
+
+    def register(self, driver):
+        pid = driver_pid(driver)
+        try:
+            main_window = driver.current_window_handle
+        except Exception:
+            main_window = None
+        cgroup = None
+        if self.cgroup and pid is not None:
+            cgroup = self._place_in_cgroup(pid, process_tree(pid))
+        with self._lock:
+            self._drivers[driver.session_id] = {
+                "pid": pid,
+                "main_window": main_window,
+                "cgroup": cgroup,
+                "returns": 0,
+                "last_mb": None,
+                "peak_mb": None,
+                "recycled": False,
+            }
+
+    def unregister(self, driver, recycled=False):
+        with self._lock:
+            entry = self._drivers.get(driver.session_id)
+            if entry is None:
+                return
+            entry["recycled"] = recycled
+            cgroup = entry.pop("cgroup", None)
+            if recycled:
+                self.recycled += 1
+        if cgroup:
+            try:
+                os.rmdir(cgroup)
+            except OSError:
+                # Процессы ещё завершаются; пустая cgroup останется до перезагрузки.
+                pass
+
+    def sample(self, driver):
+        with self._lock:
+            entry = self._drivers.get(driver.session_id)
+        if entry is None or entry["pid"] is None:
+            return None
+        rss = tree_rss(entry["pid"])
+        if rss is None:
+            return None
+        mb = rss / MB
+        with self._lock:
+            entry["last_mb"] = mb
+            entry["peak_mb"] = max(entry["peak_mb"] or 0, mb)
+        return mb
+
+    def close_extra_windows(self, driver):
+        with self._lock:
+            entry = self._drivers.get(driver.session_id)
+        main_window = entry["main_window"] if entry else None
+        try:
+            handles = driver.window_handles
+            if len(handles) <= 1:
+                return 0
+            if main_window not in handles:
+                main_window = handles[0]
+            closed = 0
+            for handle in handles:
+                if handle == main_window:
+                    continue
+                driver.switch_to.window(handle)
+                driver.close()
+                closed += 1
+            driver.switch_to.window(main_window)
+        except Exception as e:
+            logger.debug("Не удалось закрыть лишние вкладки: %s", e)
+            return 0
+        with self._lock:
+            self.closed_windows += closed
+        logger.debug("Закрыто лишних вкладок: %d", closed)
+        return closed
+
+    def on_return(self, driver):
+        # Возвращает True, если драйвер превысил бюджет и его пора перезапустить.
+        self.close_extra_windows(driver)
+        with self._lock:
+            entry = self._drivers.get(driver.session_id)
+            if entry is None:
+                return False
+            entry["returns"] += 1
+            due = entry["returns"] % self.check_every == 0
+        if not due:
+            return False
+        mb = self.sample(driver)
+        if mb is None or not self.budget_mb or mb <= self.budget_mb:
+            return False
+        logger.warning(f"Драйвер {entry['pid']} занимает {mb:.0f} МБ при бюджете {self.budget_mb} МБ, перезапуск")
+        return True
+
+    def report(self):
+        with self._lock:
+            drivers = [
+                {key: entry[key] for key in ("pid", "last_mb", "peak_mb", "recycled")}
+                for entry in self._drivers.values()
+            ]
+            return {
+                "drivers": drivers,
+                "recycled": self.recycled,
+                "closed_windows": self.closed_windows,
+            }
+
+    def log_report(self):
+        report = self.report()
+        sampled = [entry for entry in report["drivers"] if entry["peak_mb"] is not None]
+        if not sampled and not report["recycled"] and not report["closed_windows"]:
+            return
+        per_driver = ", ".join(
+            f"{entry['pid']}: {entry['last_mb']:.0f}/{entry['peak_mb']:.0f} МБ"
+            + (" (перезапущен)" if entry["recycled"] else "")
+            for entry in sampled
+        )
+        logger.info(
+            f"Память драйверов (последний замер/пик): {per_driver or 'нет замеров'}; "
+            f"перезапущено по бюджету {report['recycled']}, закрыто лишних вкладок {report['closed_windows']}"
+        )
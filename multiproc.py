@@ -0,0 +1,404 @@
+import os
+import time
+import queue
+import logging
+import itertools
+import threading
+import multiprocessing
+import concurrent.futures
+from collections import deque
+from multiprocessing.connection import wait
+
+from log_config import forward_log_record, setup_worker_logging
+from record import CompanyRecord
+
+logger = logging.getLogger(__name__)
+
+RESULT_BATCH = 10
+RESULT_INTERVAL = 0.5
+# Перезапуск упавшего процесса откладывается: 1, 2, 4... секунд, но не больше
+# минуты. Процесс, упавший MAX_RESTARTS раз подряд без единого результата,
+# больше не перезапускается.
+RESTART_BACKOFF = 1.0
+MAX_RESTART_BACKOFF = 60.0
+MAX_RESTARTS = 5
+
+_STOP = None
+
+
+# Канал дочернего процесса к родителю: результаты, запросы задач и записи лога.
+# У каждого процесса свой канал, поэтому процесс, упавший посреди отправки,
+# портит только его, а родитель, прочитав из канала конец файла, знает, что
+# все сообщения процесса уже разобраны. put_nowait — интерфейс очереди для QueueHandler.
+class _Channel:
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    def put(self, kind, payload=None):
+        with self._lock:
+            self.conn.send((kind, payload))
+
+    def put_nowait(self, record):
+        self.put("log", record)
+
+
+def _worker_main(worker_id, drivers, profile_name, company_budget, cache_path, profile_root, memory, tasks, conn):
+    channel = _Channel(conn)
+    setup_worker_logging(channel, f"[процесс {worker_id}] ")
+
+    # Модуль main импортируется только в дочернем процессе: он тянет за собой
+    # selenium и сам импортирует этот модуль для режима --processes.
+    from main import DriverPool, block_monitor, memory_governor, process_single_company, selectors
+    from detail_cache import DetailCache
+    from profiles import get_profile
+
+    profile = get_profile(profile_name)
+    if memory:
+        memory_governor.configure(**memory)
+    driver_pool = DriverPool(drivers, profile_root)
+    cache = DetailCache(cache_path) if cache_path else None
+    channel.put("ready", os.getpid())
+
+    # Процесс просит у родителя следующую задачу, только когда у него есть
+    # свободный драйвер: остальные задачи достаются другим процессам, а родитель
+    # в момент выдачи знает, какие задачи у какого процесса.
+    size = len(driver_pool.drivers) or 1
+    slots = threading.Semaphore(size)
+    buffer = []
+    buffer_lock = threading.Lock()
+
+    def flush():
+        with buffer_lock:
+            if not buffer:
+                return
+            batch = buffer[:]
+            buffer.clear()
+        channel.put("results", batch)
+
+    def run(task_id, company_basic_data, held):
+        try:
+            record = process_single_company(
+                company_basic_data, driver_pool, profile, cache=cache, company_budget=company_budget
+            )
+        except Exception as e:
+            logger.error("Ошибка обработки задачи %s: %s", task_id, e)
+            record = None
+        with buffer_lock:
+            buffer.append((task_id, record))
+            full = len(buffer) >= RESULT_BATCH
+        for _ in range(held):
+            slots.release()
+        if full:
+            flush()
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=size) as executor:
+            last_flush = time.monotonic()
+            requested = False
+            while True:
+                if time.monotonic() - last_flush >= RESULT_INTERVAL:
+                    flush()
+                    last_flush = time.monotonic()
+                if not requested:
+                    if not slots.acquire(timeout=RESULT_INTERVAL):
+                        continue
+                    channel.put("want")
+                    requested = True
+                try:
+                    task = tasks.get(timeout=RESULT_INTERVAL)
+                except queue.Empty:
+                    continue
+                requested = False
+                if task is _STOP:
+                    slots.release()
+                    break
+                task_id, company_basic_data, solo = task
+                if solo:
+                    # Подозрительная задача выполняется одна, чтобы падение процесса
+                    # можно было точно приписать ей.
+                    for _ in range(size - 1):
+                        slots.acquire()
+                    flush()
+                executor.submit(run, task_id, company_basic_data, size if solo else 1)
+        flush()
+        selectors.log_report()
+        block_monitor.log_report()
+    finally:
+        driver_pool.close_all()
+        memory_governor.log_report()
+        if cache is not None:
+            cache.close()
+
+
+class _Batch:
+    def __init__(self, task_ids, on_result):
+        self.remaining = set(task_ids)
+        self.on_result = on_result
+        self.results = []
+        self.done = threading.Event()
+        if not self.remaining:
+            self.done.set()
+
+
+# Обработка карточек в нескольких процессах. Каждый процесс держит свой пул из
+# drivers драйверов и, когда освобождается драйвер, просит у родителя следующую
+# компанию; родитель выдаёт её через очередь этого процесса и запоминает, у кого
+# она. Результаты возвращаются пачками в родительский процесс, где их пишет
+# единственный писатель, а записи лога процессов — в лог родителя. Если процесс
+# упал, выданные ему компании возвращаются в очередь на выполнение поодиночке,
+# а процесс перезапускается с задержкой; компания, уронившая процесс и в одиночку,
+# пропускается. Процесс, падающий раз за разом (например, не запускается
+# chromedriver), после max_restarts перезапусков выводится из пула вместе с
+# выданными ему компаниями; когда не остаётся ни одного процесса, компании из
+# очереди тоже пропускаются, чтобы process_batch не ждал вечно.
+class WorkerProcessPool:
+    def __init__(self, processes, drivers, profile, company_budget=None, cache_path=None, profile_root=None,
+                 memory=None, max_restarts=MAX_RESTARTS):
+        self.processes = processes
+        self.drivers = drivers
+        self.profile = profile
+        self.company_budget = company_budget
+        self.cache_path = cache_path
+        self.profile_root = profile_root
+        # Настройки memory_governor: у каждого процесса свой учёт памяти драйверов.
+        self.memory = memory
+        # fork небезопасен для процесса с потоками и запущенными драйверами.
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = {}
+        self._worker_tasks = {}
+        self._channels = {}
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._idle = deque()
+        self._pending = {}
+        self._in_flight = {}
+        self._suspects = set()
+        self._batches = {}
+        self._dispatcher = None
+        self._stopping = False
+        self.max_restarts = max_restarts
+        # Перезапуски подряд без результатов, по процессам.
+        self._failures = {}
+        self._retired = set()
+        self._timers = {}
+        self.restarts = 0
+
+    def start(self):
+        for worker_id in range(self.processes):
+            self._spawn(worker_id)
+        self._dispatcher = threading.Thread(target=self._dispatch, name="process-results", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"Запущено {self.processes} процессов по {self.drivers} драйверов")
+        return self
+
+    def _spawn(self, worker_id):
+        # Очередь задач у каждого запуска процесса своя: упавший процесс мог
+        # оставить прежнюю очередь в неконсистентном состоянии.
+        tasks = self._context.Queue()
+        reader, writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self.drivers, self.profile.name, self.company_budget, self.cache_path,
+                  self.profile_root, self.memory, tasks, writer),
+            name=f"worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        # Пишущий конец остаётся только у процесса: конец файла в канале означает его завершение.
+        writer.close()
+        with self._lock:
+            self._workers[worker_id] = process
+            self._worker_tasks[worker_id] = tasks
+            self._channels[worker_id] = reader
+            self._in_flight[worker_id] = set()
+            stopping = self._stopping
+        if stopping:
+            # Пул закрылся, пока процесс перезапускался.
+            tasks.put(_STOP)
+
+    def _drop_queue(self):
+        # Вызывается под self._lock: без живых процессов задачи из очереди
+        # выполнять некому, они завершаются без результата.
+        if len(self._retired) < self.processes:
+            return []
+        dropped = [task[0] for task in self._queue]
+        self._queue.clear()
+        return dropped
+
+    def _assign(self):
+        # Вызывается под self._lock: задачи из очереди раздаются процессам,
+        # запросившим работу, и сразу записываются за ними.
+        while self._queue and self._idle:
+            worker_id = self._idle.popleft()
+            task = self._queue.popleft()
+            self._in_flight[worker_id].add(task[0])
+            self._worker_tasks[worker_id].put(task)
+
+    def process_batch(self, companies_basic_data, on_result=None, budget=None):
+        skipped = []
+        if budget is not None:
+            # Бюджет задачи проверяется здесь, до постановки в общую очередь:
+            # компании сверх бюджета записываются с данными из выдачи.
+            fetched = []
+            for company_basic_data in companies_basic_data:
+                if budget.take():
+                    fetched.append(company_basic_data)
+                    continue
+                record = CompanyRecord.from_dict(company_basic_data)
+                record.timed_out = tuple(self.profile.detail_groups)
+                skipped.append(record)
+                if on_result is not None:
+                    on_result(record)
+            companies_basic_data = fetched
+        with self._lock:
+            task_ids = [next(self._task_ids) for _ in companies_basic_data]
+            batch = _Batch(task_ids, on_result)
+            for task_id, company_basic_data in zip(task_ids, companies_basic_data):
+                self._pending[task_id] = company_basic_data
+                self._batches[task_id] = batch
+                self._queue.append((task_id, company_basic_data, False))
+            self._assign()
+            dropped = self._drop_queue()
+        if dropped:
+            logger.error(f"Нет работающих процессов, пропущено компаний: {len(dropped)}")
+        for task_id in dropped:
+            self._complete(task_id, None)
+        while not batch.done.wait(RESULT_INTERVAL):
+            if self._stopping:
+                logger.warning(f"Пул процессов остановлен, не получено результатов: {len(batch.remaining)}")
+                break
+        return batch.results + skipped
+
+    def _complete(self, task_id, record):
+        with self._lock:
+            batch = self._batches.pop(task_id, None)
+            self._pending.pop(task_id, None)
+            self._suspects.discard(task_id)
+        if batch is None:
+            return
+        if record is not None:
+            batch.results.append(record)
+            if batch.on_result is not None:
+                batch.on_result(record)
+        batch.remaining.discard(task_id)
+        if not batch.remaining:
+            batch.done.set()
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                channels = {conn: worker_id for worker_id, conn in self._channels.items()}
+            if not channels:
+                if self._stopping:
+                    return
+                time.sleep(RESULT_INTERVAL)
+                continue
+            for conn in wait(list(channels), timeout=RESULT_INTERVAL):
+                worker_id = channels[conn]
+                try:
+                    kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    self._exited(worker_id, conn)
+                    continue
+                self._handle(worker_id, kind, payload)
+
+    def _handle(self, worker_id, kind, payload):
+        if kind == "log":
+            forward_log_record(payload)
+        elif kind == "want":
+            with self._lock:
+                if not self._stopping:
+                    self._idle.append(worker_id)
+                    self._assign()
+        elif kind == "results":
+            with self._lock:
+                self._failures.pop(worker_id, None)
+            for task_id, record in payload:
+                with self._lock:
+                    self._in_flight.get(worker_id, set()).discard(task_id)
+                self._complete(task_id, record)
+        elif kind == "ready":
+            logger.info(f"Процесс {worker_id} готов (pid {payload})")
+
+    def _exited(self, worker_id, conn):
+        # Все сообщения процесса уже разобраны: в канале больше ничего нет.
+        conn.close()
+        with self._lock:
+            if self._channels.get(worker_id) is conn:
+                del self._channels[worker_id]
+            process = self._workers[worker_id]
+        process.join(timeout=5)
+        if not self._stopping:
+            self._recover(worker_id, process.exitcode)
+
+    def _recover(self, worker_id, exitcode):
+        with self._lock:
+            lost = self._in_flight.pop(worker_id, set())
+            self._idle = deque(idle for idle in self._idle if idle != worker_id)
+            tasks = self._worker_tasks.pop(worker_id, None)
+            failures = self._failures[worker_id] = self._failures.get(worker_id, 0) + 1
+            retire = failures > self.max_restarts
+            requeue = []
+            dropped = []
+            for task_id in sorted(lost):
+                if task_id not in self._pending:
+                    continue
+                if retire or task_id in self._suspects:
+                    dropped.append(task_id)
+                else:
+                    self._suspects.add(task_id)
+                    requeue.append((task_id, self._pending[task_id], True))
+            # Возвращённые задачи выполняются первыми.
+            self._queue.extendleft(reversed(requeue))
+            if retire:
+                self._retired.add(worker_id)
+                dropped.extend(self._drop_queue())
+        if tasks is not None:
+            tasks.cancel_join_thread()
+            tasks.close()
+        logger.warning(
+            f"Процесс {worker_id} завершился с кодом {exitcode}: "
+            f"возвращено в очередь {len(requeue)}, пропущено {len(dropped)}"
+        )
+        for task_id in dropped:
+            self._complete(task_id, None)
+        if retire:
+            logger.error(f"Процесс {worker_id} упал {failures} раз подряд и больше не перезапускается")
+            return
+        self.restarts += 1
+        delay = min(RESTART_BACKOFF * 2 ** (failures - 1), MAX_RESTART_BACKOFF)
+        timer = threading.Timer(delay, self._respawn, [worker_id])
+        timer.daemon = True
+        with self._lock:
+            self._timers[worker_id] = timer
+        timer.start()
+
+    def _respawn(self, worker_id):
+        with self._lock:
+            self._timers.pop(worker_id, None)
+            if self._stopping:
+                return
+        self._spawn(worker_id)
+
+    def close(self):
+        if self._stopping:
+            return
+        self._stopping = True
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            queues = list(self._worker_tasks.values())
+            processes = list(self._workers.values())
+        for tasks in queues:
+            tasks.put(_STOP)
+        for process in processes:
+            process.join(timeout=60)
+            if process.is_alive():
+                process.terminate()
+        # Диспетчер дочитывает каналы, включая итоговые записи лога процессов.
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=10)
+        logger.info(f"Процессы остановлены, перезапусков: {self.restarts}")
@@ -0,0 +1,266 @@
+import json
+import zlib
+import logging
+
+from extraction import SELECTORS
+
+logger = logging.getLogger(__name__)
+
+# Скрипты извлечения регистрируются в браузере один раз на драйвер через
+# CDP Page.addScriptToEvaluateOnNewDocument и вызываются по имени.
+# Версию нужно увеличивать при любом изменении тела скрипта: пул сравнивает
+# версии и перерегистрирует скрипты в уже запущенных драйверах. Селекторы
+# подставляются из extraction.SELECTORS (переменная sel) и входят в версию.
+SCRIPT_NAMESPACE = "__gisTrace"
+
+PAGE_SCRIPTS = {
+    "company_details": (3, """
+        function (groups) {
+            const want = new Set(groups || ['phones', 'email', 'website', 'hours', 'business', 'socials']);
+            const result = {
+                phones: [],
+                email: 'Н/Д',
+                website: 'Н/Д',
+                workingHours: 'Н/Д',
+                businessType: 'Н/Д',
+                socials: {
+                    'ВКонтакте': 'Н/Д',
+                    'YouTube': 'Н/Д',
+                    'WhatsApp': 'Н/Д',
+                    'Telegram': 'Н/Д',
+                    'Instagram': 'Н/Д',
+                    'Facebook': 'Н/Д',
+                    'Одноклассники': 'Н/Д',
+                    'Twitter': 'Н/Д',
+                    'Другие соцсети': 'Н/Д'
+                }
+            };
+
+            if (want.has('phones')) {
+                const phoneElements = document.querySelectorAll(sel.phones);
+                result.phones = Array.from(phoneElements)
+                    .map(el => el.innerText.trim())
+                    .filter(text => text);
+            }
+
+            const emailElement = want.has('email') && document.querySelector(sel.email);
+            if (emailElement) {
+                result.email = emailElement.innerText.trim() || emailElement.href.replace('mailto:', '');
+            }
+
+            const contactLinks = want.has('website')
+                ? document.querySelectorAll(sel.contact_links)
+                : [];
+            for (const link of contactLinks) {
+                const href = link.href || '';
+                const parent = link.closest(sel.contact_block);
+
+                const hasGlobeIcon = parent && parent.querySelector(sel.globe_icon);
+
+                if (hasGlobeIcon && href && !href.includes('tel:') && !href.includes('mailto:')) {
+                    result.website = href;
+                    break;
+                }
+            }
+
+            const hoursElement = want.has('hours') && document.querySelector(sel.hours);
+            if (hoursElement) {
+                const hoursText = hoursElement.innerText.split('\\n')[0].trim();
+                if (hoursText) result.workingHours = hoursText;
+            }
+
+            const businessTypeButtons = want.has('business') ? document.querySelectorAll(sel.business_type) : [];
+            const businessTypes = [];
+            for (const btn of businessTypeButtons) {
+                const text = btn.innerText.trim();
+                if (text && (text.includes('Интернет-магазин') || text.includes('Розница') ||
+                    text.includes('Опт') || text.includes('Производство') ||
+                    text.includes('магазин') || text.includes('Шоурум') || text.includes('Салон'))) {
+                    businessTypes.push(text);
+                }
+            }
+            if (businessTypes.length > 0) {
+                result.businessType = businessTypes.join('; ');
+            }
+
+            if (!want.has('socials')) {
+                return result;
+            }
+
+            const socialBlocks = document.querySelectorAll(sel.social_blocks);
+            for (const block of socialBlocks) {
+                const links = block.querySelectorAll('a[href*="http"]');
+                for (const link of links) {
+                    const href = link.href || '';
+                    const ariaLabel = link.getAttribute('aria-label') || '';
+
+                    if (href.includes('vk.com') || ariaLabel.includes('ВКонтакте')) {
+                        result.socials['ВКонтакте'] = href;
+                    } else if (href.includes('youtube.com') || href.includes('youtu.be')) {
+                        result.socials['YouTube'] = href;
+                    } else if (href.includes('wa.me') || href.includes('whatsapp') || ariaLabel.includes('WhatsApp')) {
+                        result.socials['WhatsApp'] = href;
+                    } else if (href.includes('t.me') || href.includes('telegram') || ariaLabel.includes('Telegram')) {
+                        result.socials['Telegram'] = href;
+                    } else if (href.includes('instagram.com')) {
+                        result.socials['Instagram'] = href;
+                    } else if (href.includes('facebook.com') || href.includes('fb.com')) {
+                        result.socials['Facebook'] = href;
+                    } else if (href.includes('ok.ru') || ariaLabel.includes('Одноклассники')) {
+                        result.socials['Одноклассники'] = href;
+                    } else if (href.includes('twitter.com') || href.includes('x.com')) {
+                        result.socials['Twitter'] = href;
+                    }
+                }
+            }
+
+            const allSocialLinks = document.querySelectorAll('a[href*="http"]');
+            for (const link of allSocialLinks) {
+                const href = link.href || '';
+                if (!href) continue;
+
+                const hasSocialIcon = link.querySelector(sel.social_icon);
+
+                if (hasSocialIcon || link.closest(sel.social_primary_block)) {
+                    if ((href.includes('vk.com') || href.includes('vkontakte')) && result.socials['ВКонтакте'] === 'Н/Д') {
+                        result.socials['ВКонтакте'] = href;
+                    } else if ((href.includes('youtube.com') || href.includes('youtu.be')) && result.socials['YouTube'] === 'Н/Д') {
+                        result.socials['YouTube'] = href;
+                    } else if ((href.includes('wa.me') || href.includes('whatsapp')) && result.socials['WhatsApp'] === 'Н/Д') {
+                        result.socials['WhatsApp'] = href;
+                    } else if ((href.includes('t.me') || href.includes('telegram')) && result.socials['Telegram'] === 'Н/Д') {
+                        result.socials['Telegram'] = href;
+                    } else if (href.includes('instagram.com') && result.socials['Instagram'] === 'Н/Д') {
+                        result.socials['Instagram'] = href;
+                    } else if ((href.includes('facebook.com') || href.includes('fb.com')) && result.socials['Facebook'] === 'Н/Д') {
+                        result.socials['Facebook'] = href;
+                    } else if (href.includes('ok.ru') && result.socials['Одноклассники'] === 'Н/Д') {
+                        result.socials['Одноклассники'] = href;
+                    } else if ((href.includes('twitter.com') || href.includes('x.com')) && result.socials['Twitter'] === 'Н/Д') {
+                        result.socials['Twitter'] = href;
+                    }
+                }
+            }
+
+            return result;
+        }
+    """),
+    "page_state": (1, """
+        function () {
+            const text = document.body ? (document.body.innerText || '') : '';
+            return {
+                url: location.href,
+                title: document.title || '',
+                text: text.slice(0, 2000),
+                textLength: text.length,
+                captcha: !!document.querySelector(sel.captcha)
+            };
+        }
+    """),
+    "reviews_batch": (1, """
+        function (limit) {
+            // Отзывы, уже отданные в Python, помечаются и повторно не возвращаются.
+            const items = [];
+            const all = document.querySelectorAll(sel.review_item);
+            for (const el of all) {
+                if (items.length >= limit) break;
+                if (el.dataset.gisTraceSeen) continue;
+                el.dataset.gisTraceSeen = '1';
+                const author = el.querySelector(sel.review_author);
+                const date = el.querySelector(sel.review_date);
+                const text = el.querySelector(sel.review_text);
+                items.push({
+                    author: author ? author.innerText.trim() : '',
+                    date: date ? date.innerText.trim() : '',
+                    rating: el.querySelectorAll(sel.review_rating).length || null,
+                    text: text ? text.innerText.trim() : ''
+                });
+            }
+
+            // Следующая порция: кнопка «Загрузить ещё», а без неё — прокрутка к последнему отзыву.
+            let more = false;
+            if (items.length < limit) {
+                const button = document.querySelector(sel.reviews_more);
+                if (button) {
+                    button.click();
+                    more = true;
+                } else if (all.length) {
+                    all[all.length - 1].scrollIntoView({block: 'end'});
+                }
+            }
+            return {items: items, more: more};
+        }
+    """),
+}
+
+_MISSING = "__gisTraceMissing"
+
+
+def _selectors_json():
+    return json.dumps(SELECTORS, ensure_ascii=False, sort_keys=True)
+
+
+def script_versions():
+    selectors_crc = zlib.crc32(_selectors_json().encode("utf-8"))
+    return {name: f"{version}.{selectors_crc:08x}" for name, (version, _) in PAGE_SCRIPTS.items()}
+
+
+def build_bootstrap(names=None):
+    names = names or list(PAGE_SCRIPTS)
+    versions = script_versions()
+    parts = [
+        f"const ns = window.{SCRIPT_NAMESPACE} = window.{SCRIPT_NAMESPACE} || {{}};",
+        f"const sel = {_selectors_json()};",
+    ]
+    for name in names:
+        _, body = PAGE_SCRIPTS[name]
+        parts.append(f"ns['{name}'] = {{version: '{versions[name]}', fn: {body.strip()}}};")
+    return "(function () {\n" + "\n".join(parts) + "\n})();"
+
+
+def build_invocation(name):
+    version = script_versions()[name]
+    return (
+        f"const s = window.{SCRIPT_NAMESPACE} && window.{SCRIPT_NAMESPACE}['{name}'];"
+        f"if (!s || s.version !== '{version}') return '{_MISSING}';"
+        f"return s.fn.apply(null, arguments);"
+    )
+
+
+_INVOCATIONS = {}
+
+
+def register_page_scripts(driver, previous_identifier=None):
+    if previous_identifier:
+        try:
+            driver.execute_cdp_cmd(
+                "Page.removeScriptToEvaluateOnNewDocument",
+                {"identifier": previous_identifier}
+            )
+        except Exception as e:
+            logger.debug(f"Не удалось снять старые скрипты: {e}")
+
+    bootstrap = build_bootstrap()
+    result = driver.execute_cdp_cmd(
+        "Page.addScriptToEvaluateOnNewDocument",
+        {"source": bootstrap}
+    )
+    # Текущий документ уже загружен, поэтому определяем функции и в нём.
+    driver.execute_script(bootstrap)
+    return result.get("identifier")
+
+
+def run_page_script(driver, name, *args):
+    invocation = _INVOCATIONS.get(name)
+    if invocation is None:
+        invocation = _INVOCATIONS[name] = build_invocation(name)
+
+    result = driver.execute_script(invocation, *args)
+    if result != _MISSING:
+        return result
+
+    # Документ открыт без зарегистрированных скриптов (например, CDP недоступен):
+    # один раз доопределяем скрипт в текущем документе и повторяем вызов.
+    logger.debug("Скрипт %s не найден в документе, отправляется целиком", name)
+    driver.execute_script(build_bootstrap([name]))
+    return driver.execute_script(invocation, *args)
@@ -0,0 +1,211 @@
+import re
+import csv
+import time
+import logging
+import argparse
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from compressed_io import open_text, remove_framed
+from extraction import determine_work_mode
+from record import MISSING
+from writer import CsvStreamWriter
+
+logger = logging.getLogger(__name__)
+
+E164_COLUMN = "Телефоны E.164"
+DOMAIN_COLUMN = "Домен"
+STREET_COLUMN = "Улица"
+HOUSE_COLUMN = "Дом"
+PREMISES_COLUMN = "Помещение"
+# Колонки, которые добавляет обработка; «Веб-сайт» и «Режим работы (тип)» пересчитываются на месте.
+POSTPROCESS_COLUMNS = (E164_COLUMN, DOMAIN_COLUMN, STREET_COLUMN, HOUSE_COLUMN, PREMISES_COLUMN)
+
+DEFAULT_BATCH = 5000
+CACHE_SIZE = 65536
+COUNTRY_CODE = "7"
+
+_NON_DIGITS = re.compile(r"\D+")
+_PHONE_EXTENSION = re.compile(r"\s*(?:доб|вн|ext)\b.*$", re.IGNORECASE)
+_TRACKING_PARAMS = re.compile(r"^(?:utm_\w+|yclid|gclid|fbclid|_openstat|from)$", re.IGNORECASE)
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+# Номер дома: «12», «12а», «12/1», «12 к2», «12 ст3», «12 лит А».
+_HOUSE_RE = re.compile(r"^\d+[а-яa-z]?(?:/\d+[а-яa-z]?)?(?:\s*(?:к|корп|ст|стр|лит)\.?\s*\w+)*$", re.IGNORECASE)
+_PREMISES_MARKERS = re.compile(r"этаж|офис|помещ|кабинет|каб\.|павильон|секция|цокол|подвал", re.IGNORECASE)
+
+
+def _empty(value):
+    return not value or value == MISSING
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def phone_to_e164(phone):
+    # Номера без кода страны считаются российскими; короткие городские номера
+    # без кода города в E.164 не приводятся.
+    phone = _PHONE_EXTENSION.sub("", phone).strip()
+    digits = _NON_DIGITS.sub("", phone)
+    if phone.startswith("+"):
+        return "+" + digits if 8 <= len(digits) <= 15 else None
+    if len(digits) == 11 and digits[0] in "78":
+        return f"+{COUNTRY_CODE}{digits[1:]}"
+    if len(digits) == 10:
+        return f"+{COUNTRY_CODE}{digits}"
+    return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_url(url):
+    # Схема и хост в нижнем регистре, хост в Unicode, без порта по умолчанию,
+    # фрагмента, рекламных параметров и завершающего «/» в пути.
+    if _empty(url):
+        return None
+    url = url.strip()
+    try:
+        parts = urlsplit(url if "://" in url else "http://" + url)
+        host = (parts.hostname or "").rstrip(".")
+        port = parts.port
+    except ValueError:
+        return None
+    if not host:
+        return None
+    if "xn--" in host:
+        try:
+            host = host.encode("ascii").decode("idna")
+        except UnicodeError:
+            pass
+    scheme = parts.scheme.lower()
+    netloc = host if port in (None, _DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMS.match(key)
+    ])
+    path = parts.path.rstrip("/")
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_domain(url):
+    canonical = canonical_url(url)
+    if canonical is None:
+        return None
+    host = urlsplit(canonical).hostname
+    return host[4:] if host.startswith("www.") else host
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def split_address(address):
+    # Адрес 2ГИС — части через запятую: «[ТЦ/район,] улица, дом[, этаж, офис]».
+    # Улица — часть перед номером дома, всё после дома и перед улицей — помещение.
+    if _empty(address):
+        return None, None, None
+    parts = [part.strip() for part in address.split(",") if part.strip()]
+    for index, part in enumerate(parts):
+        if index and _HOUSE_RE.match(part) and not _PREMISES_MARKERS.search(part):
+            premises = parts[:index - 1] + parts[index + 1:]
+            return parts[index - 1], part, ", ".join(premises) or None
+    if not parts:
+        return None, None, None
+    return parts[0], None, ", ".join(parts[1:]) or None
+
+
+def _map_unique(function, values):
+    # Значения в колонке сильно повторяются (типы предприятий, домены сетей),
+    # поэтому функция вызывается по разу на уникальное значение пачки.
+    results = {value: function(value) for value in set(values)}
+    return [results[value] for value in values]
+
+
+def _e164_cell(phones):
+    if _empty(phones):
+        return MISSING
+    normalized = []
+    for phone in phones.split(";"):
+        e164 = phone_to_e164(phone.strip()) if phone.strip() else None
+        if e164 and e164 not in normalized:
+            normalized.append(e164)
+    return "; ".join(normalized) or MISSING
+
+
+def _cell(value):
+    return MISSING if value is None else value
+
+
+def process_columns(columns):
+    # Обработка по колонкам: на вход — словарь «колонка → список значений»
+    # одинаковой длины, на выход — пересчитанные и новые колонки.
+    size = len(next(iter(columns.values()), []))
+    missing = [MISSING] * size
+    websites = columns.get("Веб-сайт", missing)
+    addresses = _map_unique(split_address, columns.get("Адрес", missing))
+    return {
+        E164_COLUMN: _map_unique(_e164_cell, columns.get("Телефоны", missing)),
+        "Веб-сайт": [
+            website if canonical is None else canonical
+            for website, canonical in zip(websites, _map_unique(canonical_url, websites))
+        ],
+        DOMAIN_COLUMN: [_cell(domain) for domain in _map_unique(normalize_domain, websites)],
+        STREET_COLUMN: [_cell(street) for street, _, _ in addresses],
+        HOUSE_COLUMN: [_cell(house) for _, house, _ in addresses],
+        PREMISES_COLUMN: [_cell(premises) for _, _, premises in addresses],
+        "Режим работы (тип)": _map_unique(determine_work_mode, columns.get("Тип предприятия", missing)),
+    }
+
+
+_SOURCE_COLUMNS = ("Телефоны", "Веб-сайт", "Адрес", "Тип предприятия")
+
+
+def process_rows(rows):
+    # Пачка строк CSV (словарей) обрабатывается как колонки и дополняется на месте.
+    if not rows:
+        return rows
+    columns = {name: [row.get(name) or MISSING for row in rows] for name in _SOURCE_COLUMNS}
+    for name, values in process_columns(columns).items():
+        if name in ("Веб-сайт", "Режим работы (тип)") and name not in rows[0]:
+            continue
+        for row, value in zip(rows, values):
+            row[name] = value
+    return rows
+
+
+def output_columns(columns):
+    return list(columns) + [column for column in POSTPROCESS_COLUMNS if column not in columns]
+
+
+def postprocess_csv(input_path, output_path, batch_size=DEFAULT_BATCH):
+    started = time.monotonic()
+    total = 0
+    remove_framed(output_path)
+    with open_text(input_path) as f:
+        reader = csv.DictReader(f, delimiter=';')
+        columns = output_columns(reader.fieldnames or [])
+        with CsvStreamWriter(output_path, columns) as csv_writer:
+            batch = []
+            for row in reader:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    for processed in process_rows(batch):
+                        csv_writer.write(processed)
+                    total += len(batch)
+                    batch = []
+            for processed in process_rows(batch):
+                csv_writer.write(processed)
+            total += len(batch)
+    elapsed = time.monotonic() - started
+    logger.info(f"Обработано {total} записей за {elapsed:.1f} с ({total / max(elapsed, 1e-9):.0f} записей/с)")
+    return total
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Нормализация и классификация выгрузки 2ГИС")
+    parser.add_argument("input", help="CSV-файл с результатами парсинга")
+    parser.add_argument("--output", required=True, help="путь к обработанному CSV")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="строк в пачке")
+    args = parser.parse_args()
+
+    postprocess_csv(args.input, args.output, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import re
+import math
+import time
+import logging
+import threading
+import importlib
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+# Разделитель разрядов в выдаче: «1 200 оценок», в том числе неразрывным пробелом.
+_DIGIT_GROUP_RE = re.compile(r"(?<=\d)\s+(?=\d{3}\b)")
+_WORD_RE = re.compile(r"\w+")
+
+# Веса признаков из выдачи в оценке по умолчанию.
+RATING_WEIGHT = 1.0
+REVIEWS_WEIGHT = 0.5
+CATEGORY_WEIGHT = 2.0
+
+
+def _number(value):
+    match = _NUMBER_RE.search(_DIGIT_GROUP_RE.sub("", value or ""))
+    return float(match.group(0).replace(",", ".")) if match else 0.0
+
+
+def _stems(text):
+    # Грубое совпадение по основе: «кафе» и «кафетерий», «мебель» и «мебели».
+    return {word[:4] for word in _WORD_RE.findall((text or "").lower()) if len(word) > 2}
+
+
+def default_score(company_basic_data, query=None):
+    # Рейтинг (0–5) и логарифм числа отзывов, плюс бонус, если категория
+    # совпадает со словами запроса. Поля, которых нет в профиле, дают ноль.
+    score = RATING_WEIGHT * _number(company_basic_data.get("Рейтинг"))
+    score += REVIEWS_WEIGHT * math.log1p(_number(company_basic_data.get("Отзывы")))
+    if query and _stems(query) & _stems(company_basic_data.get("Категория")):
+        score += CATEGORY_WEIGHT
+    return score
+
+
+def load_scorer(spec):
+    # Функция оценки в виде "модуль:функция", например "my_scoring:score".
+    module_name, _, function_name = spec.partition(":")
+    if not module_name or not function_name:
+        raise ValueError(f"Функция оценки задаётся как модуль:функция, получено: {spec}")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def prioritize(companies_basic_data, scorer, query=None):
+    # Сортировка устойчивая: при равной оценке сохраняется порядок выдачи.
+    if scorer is None:
+        return list(companies_basic_data)
+    scored = []
+    for company_data in companies_basic_data:
+        try:
+            score = scorer(company_data, query)
+        except Exception as e:
+            logger.debug("Ошибка оценки компании %s: %s", company_data.get("Название"), e)
+            score = 0.0
+        scored.append((score, company_data))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [company_data for _, company_data in scored]
+
+
+# Бюджет задачи на загрузку карточек: не больше max_companies компаний и не
+# дольше seconds секунд с момента создания. Компании сверх бюджета записываются
+# с данными из выдачи, а обход выдачи останавливается после текущей страницы.
+class FetchBudget:
+    def __init__(self, max_companies=None, seconds=None):
+        self.max_companies = max_companies
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.taken = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self):
+        if self.max_companies is not None and self.taken >= self.max_companies:
+            return True
+        return self.seconds is not None and time.monotonic() - self.started >= self.seconds
+
+    def take(self):
+        with self._lock:
+            if self.exhausted:
+                self.skipped += 1
+                return False
+            self.taken += 1
+            return True
+
+    def stats(self):
+        return {
+            "taken": self.taken,
+            "skipped": self.skipped,
+            "elapsed": time.monotonic() - self.started,
+            "exhausted": self.exhausted,
+        }
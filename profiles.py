@@ -0,0 +1,110 @@
+import re
+from dataclasses import dataclass
+
+# Поля карточки в выдаче и CSS-селекторы, по которым они извлекаются.
+# Название и ссылка на карточку извлекаются всегда.
+LISTING_SELECTORS = {
+    "Адрес": "._14quei",
+    "Категория": "._4cxmw7",
+    "Рейтинг": "._y10azs",
+    "Отзывы": "._jspzdm",
+}
+
+SOCIAL_COLUMNS = [
+    "ВКонтакте", "YouTube", "WhatsApp", "Telegram", "Instagram",
+    "Facebook", "Одноклассники", "Twitter", "Другие соцсети"
+]
+
+# Группы данных страницы компании и колонки, которые они заполняют.
+DETAIL_GROUPS = {
+    "phones": ["Телефоны"],
+    "email": ["Email"],
+    "website": ["Веб-сайт"],
+    "hours": ["Режим работы"],
+    "business": ["Тип предприятия"],
+    "socials": SOCIAL_COLUMNS,
+}
+
+_FIRM_ID_RE = re.compile(r"/firm/(\d+)")
+
+
+def firm_id_from_url(url):
+    if not url:
+        return None
+    match = _FIRM_ID_RE.search(url)
+    return match.group(1) if match else None
+
+
+# Группы полей, не загруженные из-за бюджета времени; у полных записей пусто.
+TIMED_OUT_COLUMN = "Не загружено"
+
+FULL_COLUMNS = [
+    "Название", "Адрес", "Категория", "Рейтинг", "Отзывы", "Ссылка",
+    "Телефоны", "Email", "Веб-сайт", "Режим работы", "Режим работы (тип)",
+    "Тип предприятия", "ВКонтакте", "YouTube", "WhatsApp", "Telegram",
+    "Instagram", "Facebook", "Одноклассники", "Twitter", "Другие соцсети",
+    "Ссылка 2ГИС", TIMED_OUT_COLUMN
+]
+
+
+@dataclass(frozen=True)
+class FieldProfile:
+    name: str
+    columns: tuple
+    listing_fields: tuple = ()
+    detail_groups: tuple = ()
+    dedup: str = "url"
+
+    @property
+    def needs_details(self):
+        return bool(self.detail_groups)
+
+    @property
+    def needs_phone_reveal(self):
+        return "phones" in self.detail_groups
+
+    @property
+    def resolves_redirects(self):
+        return "website" in self.detail_groups
+
+    def dedup_key(self, company_data):
+        if self.dedup == "name":
+            return company_data.get("Название")
+        # Ссылки на одну фирму различаются параметрами, поэтому ключ — ID фирмы.
+        link = company_data.get("Ссылка 2ГИС")
+        return firm_id_from_url(link) or link
+
+
+PROFILES = {
+    "full": FieldProfile(
+        name="full",
+        columns=tuple(FULL_COLUMNS),
+        listing_fields=tuple(LISTING_SELECTORS),
+        detail_groups=tuple(DETAIL_GROUPS),
+    ),
+    "contacts": FieldProfile(
+        name="contacts",
+        columns=(
+            "Название", "Адрес", "Категория", "Телефоны", "Email", "Веб-сайт",
+            *SOCIAL_COLUMNS, "Ссылка 2ГИС", TIMED_OUT_COLUMN
+        ),
+        listing_fields=("Адрес", "Категория"),
+        detail_groups=("phones", "email", "website", "socials"),
+    ),
+    "website-only": FieldProfile(
+        name="website-only",
+        columns=("Название", "Категория", "Веб-сайт", TIMED_OUT_COLUMN),
+        listing_fields=("Категория",),
+        detail_groups=("website",),
+        dedup="name",
+    ),
+}
+
+DEFAULT_PROFILE = "full"
+
+
+def get_profile(name):
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный профиль полей: {name}. Доступны: {', '.join(PROFILES)}")
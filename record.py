@@ -0,0 +1,156 @@
+from enum import IntEnum
+
+from extraction import determine_work_mode
+from profiles import FULL_COLUMNS, SOCIAL_COLUMNS, TIMED_OUT_COLUMN
+
+MISSING = "Н/Д"
+
+
+class Social(IntEnum):
+    VK = 0
+    YOUTUBE = 1
+    WHATSAPP = 2
+    TELEGRAM = 3
+    INSTAGRAM = 4
+    FACEBOOK = 5
+    ODNOKLASSNIKI = 6
+    TWITTER = 7
+    OTHER = 8
+
+    @property
+    def column(self):
+        return SOCIAL_COLUMNS[self]
+
+
+SOCIAL_BY_COLUMN = {social.column: social for social in Social}
+
+
+def _value(value):
+    return None if not value or value == MISSING else value
+
+
+def _cell(value):
+    return MISSING if value is None else value
+
+
+# Атрибут записи и колонка CSV, которую он заполняет.
+_COLUMNS = (
+    ("name", "Название"),
+    ("address", "Адрес"),
+    ("category", "Категория"),
+    ("rating", "Рейтинг"),
+    ("reviews", "Отзывы"),
+    ("email", "Email"),
+    ("website", "Веб-сайт"),
+    ("hours", "Режим работы"),
+    ("business_type", "Тип предприятия"),
+    ("gis_link", "Ссылка 2ГИС"),
+)
+
+# Ключи данных карточки (extract_card и скрипт company_details) по группам полей.
+_CARD_FIELDS = {
+    "email": ("email", "email"),
+    "website": ("website", "website"),
+    "hours": ("hours", "workingHours"),
+    "business": ("business_type", "businessType"),
+}
+
+
+# Запись о компании. Отсутствующие значения хранятся как None, соцсети — кортежем
+# по порядку Social (или None, если ни одной нет), телефоны — кортежем строк.
+# Заглушка «Н/Д» и русские названия колонок появляются только в to_row().
+class CompanyRecord:
+    __slots__ = (
+        "name", "address", "category", "rating", "reviews", "phones", "email", "website",
+        "hours", "business_type", "socials", "gis_link", "timed_out"
+    )
+
+    def __init__(self, name=None, address=None, category=None, rating=None, reviews=None,
+                 phones=(), email=None, website=None, hours=None, business_type=None,
+                 socials=None, gis_link=None, timed_out=()):
+        self.name = name
+        self.address = address
+        self.category = category
+        self.rating = rating
+        self.reviews = reviews
+        self.phones = phones
+        self.email = email
+        self.website = website
+        self.hours = hours
+        self.business_type = business_type
+        self.socials = socials
+        self.gis_link = gis_link
+        self.timed_out = timed_out
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls()
+        for attribute, column in _COLUMNS:
+            setattr(record, attribute, _value(data.get(column)))
+        phones = _value(data.get("Телефоны"))
+        if phones:
+            record.phones = tuple(phone.strip() for phone in phones.split(";") if phone.strip())
+        record.set_socials({column: data.get(column) for column in SOCIAL_COLUMNS})
+        timed_out = _value(data.get(TIMED_OUT_COLUMN))
+        if timed_out:
+            record.timed_out = tuple(group.strip() for group in timed_out.split(","))
+        return record
+
+    def set_socials(self, socials):
+        values = [None] * len(Social)
+        for column, value in socials.items():
+            value = _value(value)
+            if value is not None and column in SOCIAL_BY_COLUMN:
+                values[SOCIAL_BY_COLUMN[column]] = value
+        self.socials = tuple(values) if any(values) else None
+
+    def social(self, network):
+        return self.socials[network] if self.socials else None
+
+    def apply_card(self, data, groups):
+        if "phones" in groups:
+            self.phones = tuple(data.get("phones") or ())
+        for group, (attribute, key) in _CARD_FIELDS.items():
+            if group in groups:
+                setattr(self, attribute, _value(data.get(key)))
+        if "socials" in groups:
+            self.set_socials(data.get("socials") or {})
+        if data.get("timed_out"):
+            self.timed_out = tuple(data["timed_out"])
+
+    @property
+    def link(self):
+        return self.website or self.gis_link
+
+    @property
+    def work_mode(self):
+        return determine_work_mode(self.business_type or MISSING)
+
+    def to_row(self, columns=FULL_COLUMNS):
+        row = {}
+        for column in columns:
+            row[column] = self._column_value(column)
+        if self.timed_out:
+            row[TIMED_OUT_COLUMN] = ", ".join(self.timed_out)
+        return row
+
+    def _column_value(self, column):
+        if column in SOCIAL_BY_COLUMN:
+            return _cell(self.social(SOCIAL_BY_COLUMN[column]))
+        if column == "Телефоны":
+            return "; ".join(self.phones) if self.phones else MISSING
+        if column == "Ссылка":
+            return _cell(self.link)
+        if column == "Режим работы (тип)":
+            return self.work_mode
+        if column == TIMED_OUT_COLUMN:
+            return ", ".join(self.timed_out)
+        attribute = _ATTRIBUTE_BY_COLUMN.get(column)
+        return _cell(getattr(self, attribute)) if attribute else MISSING
+
+
+_ATTRIBUTE_BY_COLUMN = {column: attribute for attribute, column in _COLUMNS}
+
+
+def to_row(record, columns=FULL_COLUMNS):
+    return record.to_row(columns) if isinstance(record, CompanyRecord) else record
@@ -0,0 +1,336 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+import concurrent.futures
+
+from main import BLOCK_RETRIES, OUTPUT_FOLDER, DriverPool, block_monitor, memory_governor, selectors
+from blocks import BlockDetected
+from compressed_io import (
+    COMPRESSIONS, FramedWriter, compressed_path, compression_for, iter_records, remove_framed, strip_compression
+)
+from log_config import setup_logging
+from page_scripts import run_page_script
+from profiles import firm_id_from_url
+from record import CompanyRecord
+from state import JobLocked, JobState, job_name
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+REVIEWS_TAB = "/tab/reviews"
+CURSOR_FILE = "reviews_cursor.jsonl"
+# Сколько отзывов забирается из страницы за один вызов скрипта и сколько раз
+# подряд порция может прийти пустой, прежде чем отзывы фирмы считаются исчерпанными.
+BATCH_SIZE = 20
+IDLE_ROUNDS = 3
+SCROLL_PAUSE = 1.0
+
+_FIRM_PATH_RE = re.compile(r"^.*?/firm/\d+")
+_DATE_RE = re.compile(r"(\d{1,2})\s+([а-яё]+)\s+(\d{4})", re.IGNORECASE)
+_MONTHS = {
+    "января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6,
+    "июля": 7, "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12,
+}
+
+
+def build_reviews_path(csv_file_path, compression=None):
+    return compressed_path(os.path.splitext(strip_compression(csv_file_path))[0] + "_reviews.jsonl", compression)
+
+
+def reviews_url(link):
+    match = _FIRM_PATH_RE.match(link or "")
+    return match.group(0) + REVIEWS_TAB if match else None
+
+
+def parse_review_date(text):
+    # «12 марта 2024, отредактирован» → 2024-03-12.
+    match = _DATE_RE.search(text or "")
+    if not match or match.group(2).lower() not in _MONTHS:
+        return None
+    day, month, year = int(match.group(1)), _MONTHS[match.group(2).lower()], int(match.group(3))
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def review_id(firm_id, item):
+    # У отзывов на странице нет собственного ID: он выводится из фирмы, автора,
+    # даты и начала текста и не меняется между запусками.
+    key = "\x1f".join((firm_id, item["author"], item["date"], item["text"][:200]))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+# Файл отзывов в формате JSON lines, только дописывается. Порция отзывов фирмы
+# записывается сразу после извлечения и сбрасывается на диск (в сжатом файле —
+# закрывается кадр), поэтому в памяти держится не больше одной порции.
+class ReviewSink:
+    def __init__(self, path, compression=None):
+        self.path = path
+        self.compression = compression or compression_for(path)
+        self.written = 0
+        self._lock = threading.Lock()
+        if self.compression:
+            self._file = FramedWriter(path, self.compression)
+        else:
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def write_batch(self, reviews):
+        if not reviews:
+            return
+        with self._lock:
+            with span("reviews_write", rows=len(reviews)):
+                for review in reviews:
+                    self._file.write(json.dumps(review, ensure_ascii=False) + "\n")
+                if self.compression:
+                    self._file.commit()
+                else:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+            self.written += len(reviews)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# Позиция сбора по каждой фирме: ID последнего записанного отзыва, число
+# записанных отзывов и признак завершения. Журнал только дописывается, последняя
+# строка по фирме главнее. Строка пишется после сброса порции в ReviewSink:
+# после аварии отзывы могут повториться, но не потеряться.
+class ReviewCursors:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cursors = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Пропущена повреждённая строка журнала отзывов")
+                        continue
+                    self._cursors[entry["firm"]] = entry
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def get(self, firm_id):
+        with self._lock:
+            return self._cursors.get(firm_id)
+
+    def done(self, firm_id):
+        cursor = self.get(firm_id)
+        return cursor is not None and cursor["done"]
+
+    def update(self, firm_id, last, count, done=False):
+        entry = {"firm": firm_id, "last": last, "count": count, "done": done}
+        with self._lock:
+            self._cursors[firm_id] = entry
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "firms": len(self._cursors),
+                "done": sum(1 for cursor in self._cursors.values() if cursor["done"]),
+            }
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def harvest_firm(driver, record, sink, cursors, max_reviews=None):
+    firm_id = firm_id_from_url(record.gis_link)
+    cursor = cursors.get(firm_id) or {"last": None, "count": 0}
+    resume_from = cursor["last"]
+    count = cursor["count"]
+    last = cursor["last"]
+    if max_reviews is not None and count >= max_reviews:
+        cursors.update(firm_id, last, count, done=True)
+        return count
+
+    while True:
+        with span("reviews_load"):
+            driver.get(reviews_url(record.gis_link))
+            if selectors.wait(driver, "review_item", 10, required=False) is None:
+                block_monitor.check(driver, "отзывы")
+                # Отзывов нет или они не успели загрузиться: после того как селектор
+                # помечен неработающим, ожидание сокращено до долей секунды. Позиция
+                # не закрывается, и фирма проверяется снова при следующем запуске.
+                logger.info("Отзывы фирмы %s не найдены, фирма будет проверена при следующем запуске", firm_id)
+                return count
+
+        # При возобновлении отзывы до последнего записанного пропускаются.
+        skipping = resume_from
+        idle = 0
+        while max_reviews is None or count < max_reviews:
+            with span("reviews_batch"):
+                result = run_page_script(driver, "reviews_batch", BATCH_SIZE) or {}
+            items = result.get("items") or []
+            batch = []
+            for item in items:
+                review = review_id(firm_id, item)
+                if skipping is not None:
+                    if review == skipping:
+                        skipping = None
+                    continue
+                batch.append({
+                    "firm_id": firm_id,
+                    "firm": record.name,
+                    "review_id": review,
+                    "author": item["author"],
+                    "date": item["date"],
+                    "date_iso": parse_review_date(item["date"]),
+                    "rating": item["rating"],
+                    "text": item["text"],
+                })
+            if max_reviews is not None:
+                batch = batch[:max_reviews - count]
+            if batch:
+                sink.write_batch(batch)
+                count += len(batch)
+                last = batch[-1]["review_id"]
+                cursors.update(firm_id, last, count)
+
+            if items:
+                idle = 0
+                continue
+            # Пустая порция: либо подгрузка ещё идёт, либо отзывы закончились или страница заблокирована.
+            block_monitor.check(driver, "отзывы")
+            idle += 1
+            if idle >= IDLE_ROUNDS:
+                break
+            time.sleep(SCROLL_PAUSE)
+
+        if skipping is None:
+            break
+        # Отзыв, на котором остановились, пропал со страницы (удалён или изменён):
+        # фирма собирается заново, повторы можно убрать по review_id.
+        logger.warning("Отзыв %s фирмы %s не найден, отзывы собираются заново", resume_from, firm_id)
+        resume_from = None
+
+    cursors.update(firm_id, last, count, done=True)
+    return count
+
+
+def fetch_reviews(record, driver_pool, sink, cursors, max_reviews=None):
+    with block_monitor.slot():
+        driver = driver_pool.get_driver()
+        quarantined = False
+        try:
+            with span("reviews", firm=firm_id_from_url(record.gis_link)):
+                count = harvest_firm(driver, record, sink, cursors, max_reviews)
+        except BlockDetected:
+            block_monitor.quarantine(driver, driver_pool)
+            quarantined = True
+            raise
+        finally:
+            if not quarantined:
+                driver_pool.return_driver(driver)
+    block_monitor.success()
+    return count
+
+
+def process_firm(record, driver_pool, sink, cursors, max_reviews=None):
+    for attempt in range(BLOCK_RETRIES + 1):
+        try:
+            return fetch_reviews(record, driver_pool, sink, cursors, max_reviews)
+        except BlockDetected as e:
+            # Сбор продолжится с последнего записанного отзыва.
+            logger.warning("Отзывы %s отложены после блокировки: %s", record.name, e)
+        except Exception as e:
+            logger.error("Ошибка сбора отзывов %s: %s", record.name, e)
+            return None
+    logger.warning("Отзывы %s не собраны: блокировка после %d попыток", record.name, BLOCK_RETRIES + 1)
+    return None
+
+
+def harvest_csv(input_path, driver_pool, sink, cursors, max_workers=5, max_reviews=None):
+    # Строки CSV читаются потоком, а в работе одновременно не больше 2 × max_workers
+    # фирм: память не зависит ни от размера выгрузки, ни от числа отзывов.
+    seen = set()
+    firms = 0
+    skipped = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for row in iter_records(input_path):
+            record = CompanyRecord.from_dict(row)
+            firm_id = firm_id_from_url(record.gis_link)
+            if not firm_id or firm_id in seen:
+                continue
+            seen.add(firm_id)
+            if cursors.done(firm_id):
+                skipped += 1
+                continue
+            if len(pending) >= max_workers * 2:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                firms += len(done)
+            pending.add(executor.submit(process_firm, record, driver_pool, sink, cursors, max_reviews))
+        firms += len(pending)
+        concurrent.futures.wait(pending)
+
+    logger.info(
+        f"Сбор отзывов завершён: фирм {firms}, пропущено собранных ранее {skipped}, "
+        f"записано отзывов {sink.written}"
+    )
+    return sink.written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сбор отзывов о компаниях из выгрузки 2ГИС")
+    parser.add_argument("input", help="CSV-файл с результатами парсинга")
+    parser.add_argument("--output", help="файл отзывов JSON lines (по умолчанию <выгрузка>_reviews.jsonl)")
+    parser.add_argument("--workers", type=int, default=5, help="число драйверов")
+    parser.add_argument("--max-per-firm", type=int, default=None, help="не больше N отзывов на фирму")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default=None, help="сжимать файл отзывов")
+    parser.add_argument("--fresh", action="store_true", help="начать заново: удалить файл отзывов и позиции сбора")
+    args = parser.parse_args()
+
+    setup_logging()
+    output_path = args.output or build_reviews_path(args.input, args.compress)
+    state = JobState(OUTPUT_FOLDER, job_name(output_path))
+    try:
+        state.acquire()
+    except JobLocked as e:
+        logger.error(f"{e}")
+        return
+    setup_logging(log_file=state.log_path())
+
+    cursors_path = os.path.join(state.directory, CURSOR_FILE)
+    if args.fresh:
+        remove_framed(output_path)
+        if os.path.exists(cursors_path):
+            os.remove(cursors_path)
+
+    driver_pool = None
+    sink = None
+    cursors = None
+    try:
+        cursors = ReviewCursors(cursors_path)
+        sink = ReviewSink(output_path, args.compress)
+        logger.info(f"Отзывы пишутся в {output_path}")
+        driver_pool = DriverPool(args.workers, state.tmp_dir)
+        harvest_csv(args.input, driver_pool, sink, cursors, args.workers, args.max_per_firm)
+        selectors.log_report()
+        block_monitor.log_report()
+        memory_governor.log_report()
+        stats = cursors.stats()
+        logger.info(f"Фирм с собранными отзывами: {stats['done']} из {stats['firms']}")
+    except Exception as e:
+        logger.error(f"Произошла критическая ошибка: {e}", exc_info=True)
+    finally:
+        if driver_pool is not None:
+            driver_pool.close_all()
+        if sink is not None:
+            sink.close()
+        if cursors is not None:
+            cursors.close()
+        state.release()
+
+
+if __name__ == "__main__":
+    main()
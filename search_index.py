@@ -0,0 +1,290 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+
+from compressed_io import iter_records
+from dedup import normalize_phones
+from postprocess import normalize_domain
+from profiles import firm_id_from_url
+from record import CompanyRecord
+
+logger = logging.getLogger(__name__)
+
+DATA_FOLDER = "parsed_data"
+DEFAULT_INDEX = os.path.join(DATA_FOLDER, "search_index.sqlite")
+# Файлы выгрузок, в том числе сжатые и части из режима --shard-rows.
+CSV_SUFFIXES = (".csv", ".csv.gz", ".csv.zst")
+SKIP_FOLDERS = {"state"}
+INSERT_BATCH = 5000
+DEFAULT_LIMIT = 20
+
+_TOKEN_RE = re.compile(r"\w+")
+_PHONE_DIGITS = re.compile(r"\D+")
+
+
+def _yo(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+# Полнотекстовый индекс хранит только ссылки на строки firms (external content),
+# «ё» в нём заменяется на «е» триггерами — так же, как и в запросах.
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS files ("
+    " path TEXT PRIMARY KEY,"
+    " size INTEGER NOT NULL,"
+    " mtime INTEGER NOT NULL,"
+    " rows INTEGER NOT NULL,"
+    " indexed_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS firms ("
+    " id INTEGER PRIMARY KEY,"
+    " file TEXT NOT NULL,"
+    " firm_key TEXT NOT NULL,"
+    " name TEXT, address TEXT, category TEXT, phones TEXT,"
+    " website TEXT, domain TEXT, email TEXT, link TEXT)",
+    "CREATE INDEX IF NOT EXISTS firms_file ON firms (file)",
+    "CREATE INDEX IF NOT EXISTS firms_domain ON firms (domain)",
+    "CREATE INDEX IF NOT EXISTS firms_key ON firms (firm_key)",
+    "CREATE TABLE IF NOT EXISTS phones ("
+    " phone TEXT NOT NULL,"
+    " reversed TEXT NOT NULL,"
+    " firm INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS phones_phone ON phones (phone)",
+    "CREATE INDEX IF NOT EXISTS phones_reversed ON phones (reversed)",
+    "CREATE INDEX IF NOT EXISTS phones_firm ON phones (firm)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS firms_fts USING fts5("
+    " name, address, category,"
+    " content='firms', content_rowid='id',"
+    " tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS firms_ai AFTER INSERT ON firms BEGIN"
+    " INSERT INTO firms_fts (rowid, name, address, category) VALUES ("
+    f"  new.id, {_yo('new.name')}, {_yo('new.address')}, {_yo('new.category')});"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS firms_ad AFTER DELETE ON firms BEGIN"
+    " INSERT INTO firms_fts (firms_fts, rowid, name, address, category) VALUES ("
+    f"  'delete', old.id, {_yo('old.name')}, {_yo('old.address')}, {_yo('old.category')});"
+    " DELETE FROM phones WHERE firm = old.id;"
+    " END",
+)
+
+_RESULT_COLUMNS = ("name", "address", "category", "phones", "website", "email", "link", "file")
+
+
+def fts_query(text):
+    # Каждое слово запроса ищется как начало слова, все слова обязательны.
+    tokens = _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def find_csv_files(folder):
+    for root, folders, files in os.walk(folder):
+        folders[:] = sorted(name for name in folders if name not in SKIP_FOLDERS)
+        for name in sorted(files):
+            if name.endswith(CSV_SUFFIXES):
+                yield os.path.join(root, name)
+
+
+# Поисковый индекс по всем выгрузкам: SQLite с FTS5 по названию, адресу и
+# категории и обычными индексами по телефону (последние 10 цифр, а также они же
+# в обратном порядке — для поиска по концу номера) и домену сайта. Файл
+# выгрузки переиндексируется целиком, только если изменились его размер или
+# время изменения; записи удалённых файлов из индекса убираются.
+class SearchIndex:
+    def __init__(self, path=DEFAULT_INDEX):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def update(self, folder=DATA_FOLDER):
+        started = time.monotonic()
+        with self._lock:
+            known = {
+                path: (size, mtime)
+                for path, size, mtime in self._conn.execute("SELECT path, size, mtime FROM files")
+            }
+        present = set()
+        indexed = 0
+        rows = 0
+        for path in find_csv_files(folder):
+            present.add(path)
+            stat = os.stat(path)
+            if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            rows += self._index_file(path, stat)
+            indexed += 1
+        removed = [path for path in known if path not in present]
+        with self._lock:
+            for path in removed:
+                self._conn.execute("DELETE FROM firms WHERE file = ?", (path,))
+                self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._conn.commit()
+        logger.info(
+            f"Индекс обновлён за {time.monotonic() - started:.1f} с: файлов переиндексировано {indexed}, "
+            f"записей {rows}, удалено файлов {len(removed)}"
+        )
+        return {"indexed": indexed, "rows": rows, "removed": len(removed)}
+
+    def _index_file(self, path, stat):
+        count = 0
+        with self._lock:
+            # Файл заменяется в одной транзакции: поиск не видит его наполовину переиндексированным.
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM firms WHERE file = ?", (path,))
+                batch = []
+                for row in iter_records(path):
+                    batch.append(CompanyRecord.from_dict(row))
+                    if len(batch) >= INSERT_BATCH:
+                        count += self._insert(path, batch)
+                        batch = []
+                count += self._insert(path, batch)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (path, size, mtime, rows, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime_ns, count, time.time())
+                )
+                self._conn.commit()
+            except Exception as e:
+                self._conn.rollback()
+                logger.error(f"Файл {path} не проиндексирован: {e}")
+                return 0
+        logger.info(f"Проиндексирован {path}: {count} записей")
+        return count
+
+    def _insert(self, path, records):
+        # ID строк назначаются заранее, чтобы фирмы и их телефоны вставлялись пачками.
+        next_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM firms").fetchone()[0]
+        firms = []
+        phones = []
+        for record in records:
+            if not record.name:
+                continue
+            firm_key = firm_id_from_url(record.gis_link) or record.gis_link or f"{record.name}|{record.address}"
+            firms.append((
+                next_id, path, firm_key, record.name, record.address, record.category,
+                "; ".join(record.phones) or None, record.website, normalize_domain(record.website),
+                record.email, record.gis_link
+            ))
+            phones.extend((phone, phone[::-1], next_id) for phone in normalize_phones(record.phones))
+            next_id += 1
+        self._conn.executemany(
+            "INSERT INTO firms (id, file, firm_key, name, address, category, phones, website, domain, email, link)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            firms
+        )
+        self._conn.executemany("INSERT INTO phones (phone, reversed, firm) VALUES (?, ?, ?)", phones)
+        return len(firms)
+
+    def search(self, text=None, phone=None, domain=None, limit=DEFAULT_LIMIT):
+        conditions = []
+        params = []
+        if phone:
+            digits = _PHONE_DIGITS.sub("", phone)
+            if len(digits) >= 10:
+                conditions.append("firms.id IN (SELECT firm FROM phones WHERE phone = ?)")
+                params.append(digits[-10:])
+            elif digits:
+                # Неполный номер ищется по концу: обычно известен городской номер без кода.
+                conditions.append("firms.id IN (SELECT firm FROM phones WHERE reversed GLOB ?)")
+                params.append(digits[::-1] + "*")
+        if domain:
+            conditions.append("firms.domain = ?")
+            params.append(normalize_domain(domain))
+
+        columns = ", ".join(f"firms.{column}" for column in ("firm_key",) + _RESULT_COLUMNS)
+        where = "".join(f" AND {condition}" for condition in conditions)
+        match = fts_query(text) if text else ""
+        if match:
+            # Ранжирование bm25 считается по всем совпадениям и на частых словах стоит
+            # сотни миллисекунд. Вместо него сначала идут совпадения в названии, затем
+            # в адресе и категории, внутри — новые записи первыми; LIMIT обрывает поиск.
+            query = (
+                f"SELECT {columns} FROM firms_fts JOIN firms ON firms.id = firms_fts.rowid"
+                f" WHERE firms_fts MATCH ?{where} ORDER BY firms_fts.rowid DESC LIMIT ?"
+            )
+            steps = [(f"name : ({match})", *params), (match, *params)]
+        elif conditions:
+            query = f"SELECT {columns} FROM firms WHERE {' AND '.join(conditions)} ORDER BY firms.id DESC LIMIT ?"
+            steps = [tuple(params)]
+        else:
+            return []
+
+        # Одна фирма встречается в нескольких выгрузках: кандидатов берётся с
+        # запасом, и в ответ попадает первая найденная запись фирмы.
+        results = {}
+        with self._lock:
+            for step in steps:
+                for row in self._conn.execute(query, (*step, limit * 4)):
+                    if row[0] not in results:
+                        results[row[0]] = dict(zip(("firm_key",) + _RESULT_COLUMNS, row))
+                    if len(results) >= limit:
+                        return list(results.values())
+        return list(results.values())
+
+    def stats(self):
+        with self._lock:
+            files, rows = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(rows), 0) FROM files").fetchone()
+            firms = self._conn.execute("SELECT COUNT(DISTINCT firm_key) FROM firms").fetchone()[0]
+        return {"files": files, "rows": rows, "firms": firms}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Поиск по собранным выгрузкам 2ГИС")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="файл индекса SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = commands.add_parser("update", help="построить или обновить индекс")
+    update_parser.add_argument("--data", default=DATA_FOLDER, help="каталог с выгрузками")
+
+    commands.add_parser("stats", help="сводка по индексу")
+
+    query_parser = commands.add_parser("query", help="найти фирмы")
+    query_parser.add_argument("text", nargs="?", help="слова из названия, адреса или категории")
+    query_parser.add_argument("--phone", help="телефон или его последние цифры")
+    query_parser.add_argument("--domain", help="сайт или домен")
+    query_parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    query_parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+
+    args = parser.parse_args()
+
+    index = SearchIndex(args.index)
+    try:
+        if args.command == "update":
+            index.update(args.data)
+        elif args.command == "stats":
+            stats = index.stats()
+            print(f"Файлов: {stats['files']}, записей: {stats['rows']}, фирм: {stats['firms']}")
+        elif args.command == "query":
+            if not (args.text or args.phone or args.domain):
+                parser.error("укажите текст запроса, --phone или --domain")
+            started = time.perf_counter()
+            results = index.search(args.text, args.phone, args.domain, args.limit)
+            elapsed = (time.perf_counter() - started) * 1000
+            if args.json:
+                print(json.dumps(results, ensure_ascii=False, indent=2))
+                return
+            for result in results:
+                print(f"{result['name']} — {result['address'] or 'Н/Д'}")
+                print(f"    {result['phones'] or 'Н/Д'} | {result['website'] or 'Н/Д'} | {result['link'] or 'Н/Д'}")
+                print(f"    {result['file']}")
+            print(f"Найдено: {len(results)} за {elapsed:.1f} мс")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import time
+import logging
+import threading
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+from deadline import DeadlineExceeded, budget
+from extraction import SELECTOR_FALLBACKS, SELECTORS
+
+logger = logging.getLogger(__name__)
+
+
+class _SelectorStats:
+    __slots__ = ("hits", "misses", "last_hit")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.last_hit = 0.0
+
+
+# Реестр селекторов с запасными вариантами. Для каждого ключа из SELECTORS
+# ведётся статистика совпадений по всем альтернативам; альтернатива, сработавшая
+# последней, проверяется первой. Если ключ не находился dead_after раз подряд,
+# ожидание сокращается до dead_timeout, а полный таймаут выдаётся только каждой
+# probe_every-й проверке — на случай, если элемент снова появится на странице.
+class SelectorRegistry:
+    def __init__(self, selectors=SELECTORS, fallbacks=SELECTOR_FALLBACKS,
+                 dead_after=5, dead_timeout=0.5, probe_every=20):
+        self.dead_after = dead_after
+        self.dead_timeout = dead_timeout
+        self.probe_every = probe_every
+        self._lock = threading.Lock()
+        self._alternatives = {
+            key: [selector, *fallbacks.get(key, ())] for key, selector in selectors.items()
+        }
+        self._stats = {
+            (key, selector): _SelectorStats()
+            for key, alternatives in self._alternatives.items()
+            for selector in alternatives
+        }
+        self._failures = {key: 0 for key in self._alternatives}
+        self._skipped = {key: 0 for key in self._alternatives}
+        self.saved_seconds = 0.0
+
+    def alternatives(self, key):
+        with self._lock:
+            return sorted(
+                self._alternatives[key],
+                key=lambda selector: -self._stats[(key, selector)].last_hit
+            )
+
+    def _timeout_for(self, key, timeout):
+        with self._lock:
+            if self._failures[key] < self.dead_after:
+                return timeout
+            self._skipped[key] += 1
+            if self._skipped[key] % self.probe_every == 0:
+                return timeout
+            return min(timeout, self.dead_timeout)
+
+    def _record(self, key, selector):
+        with self._lock:
+            if selector is None:
+                self._failures[key] += 1
+                for alternative in self._alternatives[key]:
+                    self._stats[(key, alternative)].misses += 1
+                return
+            if self._failures[key] >= self.dead_after:
+                logger.info(f"Селектор {key} снова находится: {selector}")
+            self._failures[key] = 0
+            self._skipped[key] = 0
+            stats = self._stats[(key, selector)]
+            stats.hits += 1
+            stats.last_hit = time.monotonic()
+
+    def wait(self, driver, key, timeout, clickable=False, required=True, deadline=None):
+        alternatives = self.alternatives(key)
+        effective = self._timeout_for(key, budget(deadline, timeout))
+        found = {}
+
+        def locate(d):
+            for selector in alternatives:
+                try:
+                    element = d.find_element(By.CSS_SELECTOR, selector)
+                    if clickable and not (element.is_displayed() and element.is_enabled()):
+                        continue
+                except WebDriverException:
+                    continue
+                found["selector"] = selector
+                return element
+            return False
+
+        try:
+            element = WebDriverWait(driver, effective).until(locate)
+        except TimeoutException:
+            if deadline is not None and deadline.expired:
+                # Ожидание прервал бюджет компании, а не отсутствие элемента.
+                raise DeadlineExceeded(f"Бюджет времени исчерпан при ожидании {key}")
+            self._record(key, None)
+            if effective < timeout:
+                with self._lock:
+                    self.saved_seconds += timeout - effective
+            if required:
+                raise
+            return None
+        self._record(key, found["selector"])
+        return element
+
+    def find_all(self, root, key):
+        for selector in self.alternatives(key):
+            elements = root.find_elements(By.CSS_SELECTOR, selector)
+            if elements:
+                self._record(key, selector)
+                return elements
+        self._record(key, None)
+        return []
+
+    def report(self):
+        lines = []
+        with self._lock:
+            for key, alternatives in self._alternatives.items():
+                for selector in alternatives:
+                    stats = self._stats[(key, selector)]
+                    total = stats.hits + stats.misses
+                    if not total:
+                        continue
+                    state = "не находится" if self._failures[key] >= self.dead_after else "ок"
+                    lines.append(
+                        f"{key:<22} {selector:<45} {stats.hits:>6}/{total:<6} {state}"
+                    )
+        return lines
+
+    def log_report(self):
+        lines = self.report()
+        if not lines:
+            return
+        logger.info("Состояние селекторов (совпадений/проверок):")
+        for line in lines:
+            logger.info(f"  {line}")
+        if self.saved_seconds:
+            logger.info(f"Сокращённые ожидания сэкономили {self.saved_seconds:.0f} с")
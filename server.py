@@ -0,0 +1,491 @@
+import os
+import csv
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+from queue import Queue
+from collections import deque
+
+from flask import Flask, Response, jsonify, request
+
+from archive import SnapshotArchive, build_archive_path
+from compressed_io import iter_records, open_text, remove_framed
+from detail_cache import DetailCache
+from log_config import setup_logging
+from main import (
+    CITIES, DriverPool, OUTPUT_FOLDER, block_monitor, build_csv_path, crawl, find_city, memory_governor, selectors,
+    setup_driver
+)
+from priority import FetchBudget, default_score
+from profiles import DEFAULT_PROFILE, get_profile
+from search_index import DEFAULT_LIMIT, SearchIndex
+from state import JobLocked, JobState, job_name
+from tracing import start_tracing, stop_tracing
+from writer import CsvStreamWriter
+
+logger = logging.getLogger(__name__)
+
+# Сколько завершённых задач хранится в списке; более старые вытесняются.
+KEEP_FINISHED = 100
+
+
+# Общий пул драйверов для нескольких одновременных задач. Драйверы выдаются
+# задачам по кругу: пока одна задача ждёт драйвер, другая не может забрать
+# два подряд, поэтому крупная задача не вытесняет мелкие.
+class FairDriverPool:
+    def __init__(self, pool):
+        self.pool = pool
+        self._cond = threading.Condition()
+        self._waiters = {}
+        self._order = deque()
+
+    def _head(self):
+        for job_id in self._order:
+            if self._waiters.get(job_id):
+                return self._waiters[job_id][0]
+        return None
+
+    def get_driver(self, job_id):
+        ticket = object()
+        with self._cond:
+            self._waiters.setdefault(job_id, deque()).append(ticket)
+            if job_id not in self._order:
+                self._order.append(job_id)
+            while self._head() is not ticket:
+                self._cond.wait()
+        try:
+            return self.pool.get_driver()
+        finally:
+            with self._cond:
+                self._waiters[job_id].popleft()
+                self._order.remove(job_id)
+                if self._waiters[job_id]:
+                    self._order.append(job_id)
+                else:
+                    del self._waiters[job_id]
+                self._cond.notify_all()
+
+    def return_driver(self, driver):
+        self.pool.return_driver(driver)
+
+    def for_job(self, job_id):
+        return JobDriverPool(self, job_id)
+
+
+class JobDriverPool:
+    def __init__(self, fair_pool, job_id):
+        self.fair_pool = fair_pool
+        self.job_id = job_id
+
+    def get_driver(self):
+        return self.fair_pool.get_driver(self.job_id)
+
+    def return_driver(self, driver):
+        self.fair_pool.return_driver(driver)
+
+
+class Job:
+    def __init__(self, city_alias, city_name, query, profile, archive=False, max_companies=None, time_budget=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.city_alias = city_alias
+        self.city_name = city_name
+        self.query = query
+        self.profile = profile
+        self.csv_file_path = build_csv_path(city_name, query, profile)
+        self.archive = archive
+        self.max_companies = max_companies
+        self.time_budget = time_budget
+        self.budget = None
+        self.status = "queued"
+        self.error = None
+        self.last_page = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.companies = 0
+        # Строк в CSV задачи, уже сброшенных на диск: до них читает iter_results.
+        self.synced_rows = 0
+        self.cancelled = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def add_result(self, record):
+        with self._cond:
+            self.companies += 1
+
+    def mark_synced(self, rows):
+        with self._cond:
+            self.synced_rows = rows
+            self._cond.notify_all()
+
+    def set_status(self, status, error=None):
+        with self._cond:
+            self.status = status
+            self.error = error
+            if status == "running":
+                self.started_at = time.time()
+            elif self.finished:
+                self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def iter_results(self, start=0):
+        # Результаты читаются из CSV задачи, а не хранятся в памяти. Читаются только
+        # строки до последней синхронизации писателя: они целиком на диске.
+        position = 0
+        f = None
+        reader = None
+        try:
+            while True:
+                with self._cond:
+                    if position >= self.synced_rows and not self.finished:
+                        self._cond.wait(timeout=15)
+                    available = self.synced_rows
+                    finished = self.finished
+                batch = []
+                if position < available:
+                    if reader is None:
+                        f = open_text(self.csv_file_path)
+                        reader = csv.DictReader(f, delimiter=';')
+                    for row in reader:
+                        if position >= start:
+                            batch.append(row)
+                        position += 1
+                        if position >= available:
+                            break
+                yield batch
+                if finished and position >= available:
+                    return
+        finally:
+            if f is not None:
+                f.close()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "city": self.city_alias,
+            "query": self.query,
+            "profile": self.profile.name,
+            "status": self.status,
+            "error": self.error,
+            "last_page": self.last_page,
+            "companies": self.companies,
+            "rows": self.synced_rows,
+            "csv_file": self.csv_file_path,
+            "archive": self.archive,
+            "max_companies": self.max_companies,
+            "time_budget": self.time_budget,
+            "budget": self.budget.stats() if self.budget is not None else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    def __init__(self, pool_size=5, max_jobs=2, cache_path=None, search_index_path=None,
+                 keep_finished=KEEP_FINISHED):
+        self.pool_size = pool_size
+        self.max_jobs = max_jobs
+        self.keep_finished = keep_finished
+        self.cache_path = cache_path
+        self.cache = None
+        self.search_index_path = search_index_path
+        self.search_index = None
+        self.queue = Queue()
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._runners = []
+        self.pool = None
+        self.fair_pool = None
+
+    def start(self):
+        self.pool = DriverPool(self.pool_size)
+        self.fair_pool = FairDriverPool(self.pool)
+        if self.cache_path:
+            # Один кеш на все задачи: карточки, полученные одной задачей, доступны остальным.
+            self.cache = DetailCache(self.cache_path)
+        if self.search_index_path:
+            self.search_index = SearchIndex(self.search_index_path)
+        for i in range(self.max_jobs):
+            runner = threading.Thread(target=self._run, name=f"job-runner-{i + 1}", daemon=True)
+            runner.start()
+            self._runners.append(runner)
+        logger.info(f"Сервис задач запущен: {self.max_jobs} задач одновременно, {self.pool_size} драйверов")
+        return self
+
+    def submit(self, city_alias, city_name, query, profile, archive=False, max_companies=None, time_budget=None):
+        with self._lock:
+            for job in self.jobs.values():
+                if not job.finished and job.csv_file_path == build_csv_path(city_name, query, profile):
+                    raise ValueError(f"Такая задача уже выполняется: {job.id}")
+            job = Job(city_alias, city_name, query, profile, archive, max_companies, time_budget)
+            self.jobs[job.id] = job
+            self._prune()
+        self.queue.put(job)
+        logger.info(f"Задача {job.id} поставлена в очередь: {city_name}, '{query}', профиль {profile.name}")
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        # Снимок списка: _prune удаляет задачи из словаря под той же блокировкой.
+        with self._lock:
+            return list(self.jobs.values())
+
+    def _prune(self):
+        # Вызывается под self._lock: из списка задач убираются самые старые
+        # завершённые сверх keep_finished. Их выгрузки остаются на диске.
+        finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job.id]
+
+    def _run(self):
+        driver = None
+        while True:
+            job = self.queue.get()
+            if job.cancelled.is_set():
+                job.set_status("cancelled")
+                continue
+            try:
+                if driver is None:
+                    driver = setup_driver()
+                self._run_job(job, driver)
+            except JobLocked as e:
+                logger.error(f"Задача {job.id} не запущена: {e}")
+                job.set_status("failed", str(e))
+            except Exception as e:
+                logger.error(f"Задача {job.id} завершилась ошибкой: {e}", exc_info=True)
+                job.set_status("failed", str(e))
+                try:
+                    driver.quit()
+                except:
+                    pass
+                driver = None
+
+    def _run_job(self, job, driver):
+        # Каталог задачи занят, если ту же выгрузку ведёт другой процесс на этой
+        # машине (парсер из консоли или второй сервис): задача завершится ошибкой.
+        with JobState(OUTPUT_FOLDER, job_name(job.csv_file_path)) as state:
+            self._crawl_job(job, driver, state)
+
+    def _crawl_job(self, job, driver, state):
+        job.set_status("running")
+        # Как и в консольном парсере, прерванная задача продолжается с чекпоинта
+        # и дописывает выгрузку; без чекпоинта выгрузка начинается заново.
+        checkpoint = state.checkpoint.load()
+        start_page = checkpoint['last_page']
+        processed = checkpoint['processed']
+        existing = 0
+        if start_page or processed:
+            if os.path.exists(job.csv_file_path):
+                existing = sum(1 for _ in iter_records(job.csv_file_path))
+            logger.info(f"Задача {job.id} продолжается со страницы {start_page + 1}, уже обработано {len(processed)}")
+        else:
+            remove_framed(job.csv_file_path)
+        job.mark_synced(existing)
+        csv_writer = CsvStreamWriter(job.csv_file_path, job.profile.columns).start()
+        archive = SnapshotArchive(build_archive_path(job.csv_file_path)) if job.archive else None
+        if job.max_companies or job.time_budget:
+            # Время бюджета отсчитывается с запуска задачи, а не с постановки в очередь.
+            job.budget = FetchBudget(job.max_companies, job.time_budget)
+
+        def on_result(record):
+            csv_writer.write(record)
+            job.add_result(record)
+
+        def on_page_done(page, keys):
+            synced = csv_writer.sync()
+            if synced is None:
+                logger.warning(f"Задача {job.id}: строки страницы {page} не сброшены на диск, чекпоинт не продвигается")
+                return
+            job.mark_synced(existing + synced)
+            job.last_page = page
+            state.checkpoint.save(page, keys)
+
+        try:
+            crawl(
+                driver, self.fair_pool.for_job(job.id),
+                job.city_alias, job.city_name, job.query, job.profile,
+                on_result=on_result,
+                processed=processed,
+                start_page=start_page,
+                on_page_done=on_page_done,
+                max_workers=self.pool_size,
+                should_stop=job.cancelled.is_set,
+                archive=archive,
+                cache=self.cache,
+                scorer=default_score,
+                budget=job.budget
+            )
+        finally:
+            csv_writer.close()
+            job.mark_synced(existing + csv_writer.written)
+            if archive is not None:
+                archive.close()
+        if not job.cancelled.is_set():
+            state.checkpoint.remove()
+        job.set_status("cancelled" if job.cancelled.is_set() else "done")
+        logger.info(f"Задача {job.id} завершена: {job.companies} компаний")
+        selectors.log_report()
+        block_monitor.log_report()
+        memory_governor.log_report()
+        if self.search_index is not None:
+            # Переиндексируются только изменившиеся файлы, то есть выгрузка этой задачи.
+            self.search_index.update(OUTPUT_FOLDER)
+
+
+def create_app(manager):
+    app = Flask(__name__)
+
+    @app.get("/cities")
+    def list_cities():
+        return jsonify([
+            {"id": key, "alias": alias, "name": name}
+            for key, (alias, name) in sorted(CITIES.items(), key=lambda x: int(x[0]))
+        ])
+
+    @app.post("/jobs")
+    def create_job():
+        payload = request.get_json(silent=True) or {}
+        city = find_city(str(payload.get("city", "")))
+        if city is None:
+            return jsonify({"error": "Неизвестный город"}), 400
+        query = str(payload.get("query", "")).strip()
+        if not query:
+            return jsonify({"error": "Не указан поисковый запрос"}), 400
+        try:
+            profile = get_profile(payload.get("profile", DEFAULT_PROFILE))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            max_companies = payload.get("max_companies")
+            time_budget = payload.get("time_budget")
+            max_companies = int(max_companies) if max_companies is not None else None
+            time_budget = float(time_budget) if time_budget is not None else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "max_companies и time_budget должны быть числами"}), 400
+
+        try:
+            job = manager.submit(
+                city[0], city[1], query, profile, bool(payload.get("archive")), max_companies, time_budget
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
+        return jsonify(job.to_dict()), 202
+
+    @app.get("/jobs")
+    def list_jobs():
+        return jsonify([job.to_dict() for job in manager.list()])
+
+    @app.get("/jobs/<job_id>")
+    def get_job(job_id):
+        job = manager.get(job_id)
+        if job is None:
+            return jsonify({"error": "Задача не найдена"}), 404
+        return jsonify(job.to_dict())
+
+    @app.delete("/jobs/<job_id>")
+    def cancel_job(job_id):
+        job = manager.get(job_id)
+        if job is None:
+            return jsonify({"error": "Задача не найдена"}), 404
+        job.cancelled.set()
+        return jsonify(job.to_dict())
+
+    @app.get("/cache")
+    def cache_stats():
+        if manager.cache is None:
+            return jsonify({"error": "Кеш карточек не включён"}), 404
+        return jsonify(manager.cache.stats())
+
+    @app.get("/search")
+    def search():
+        if manager.search_index is None:
+            return jsonify({"error": "Поисковый индекс не включён"}), 404
+        text = request.args.get("q", "").strip()
+        phone = request.args.get("phone", "").strip()
+        domain = request.args.get("domain", "").strip()
+        if not (text or phone or domain):
+            return jsonify({"error": "Укажите q, phone или domain"}), 400
+        limit = max(1, min(request.args.get("limit", default=DEFAULT_LIMIT, type=int), 500))
+        return jsonify(manager.search_index.search(text, phone, domain, limit))
+
+    @app.get("/jobs/<job_id>/results")
+    def stream_results(job_id):
+        job = manager.get(job_id)
+        if job is None:
+            return jsonify({"error": "Задача не найдена"}), 404
+        start = request.args.get("from", default=0, type=int)
+
+        def generate():
+            for batch in job.iter_results(start):
+                if not batch:
+                    # Пустая строка не даёт прокси закрыть долгое соединение.
+                    yield "\n"
+                    continue
+                yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in batch)
+
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-сервис задач парсинга 2ГИС")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--pool-size", type=int, default=5, help="число драйверов для карточек компаний")
+    parser.add_argument("--max-jobs", type=int, default=2, help="сколько задач выполняется одновременно")
+    parser.add_argument("--detail-cache", metavar="PATH", help="SQLite-файл общего кеша карточек")
+    parser.add_argument(
+        "--keep-jobs", type=int, default=KEEP_FINISHED, metavar="N",
+        help="сколько завершённых задач хранить в списке /jobs"
+    )
+    parser.add_argument(
+        "--search-index", metavar="PATH",
+        help="поисковый индекс по выгрузкам (search_index.py): включает GET /search"
+    )
+    parser.add_argument(
+        "--driver-memory", type=int, metavar="MB",
+        help="перезапускать драйвер, если его процессы Chrome заняли больше MB мегабайт"
+    )
+    parser.add_argument("--js-heap", type=int, metavar="MB", help="предел кучи JavaScript во вкладках Chrome")
+    parser.add_argument("--log-file", help="файл лога в дополнение к выводу в консоль")
+    parser.add_argument("--log-json", action="store_true", help="писать лог в формате JSON lines")
+    parser.add_argument(
+        "--log-sample", type=int, default=1, metavar="N",
+        help="писать в лог только каждое N-е сообщение по отдельным компаниям"
+    )
+    parser.add_argument("--trace", metavar="PATH", help="файл временной шкалы этапов (Chrome trace events)")
+    args = parser.parse_args()
+    setup_logging(log_file=args.log_file, json_lines=args.log_json, sample_every=args.log_sample)
+    if args.trace:
+        start_tracing(args.trace)
+    memory_governor.configure(budget_mb=args.driver_memory, js_heap_mb=args.js_heap)
+
+    manager = JobManager(
+        pool_size=args.pool_size, max_jobs=args.max_jobs, cache_path=args.detail_cache,
+        search_index_path=args.search_index, keep_finished=args.keep_jobs
+    ).start()
+    app = create_app(manager)
+    try:
+        app.run(host=args.host, port=args.port, threaded=True)
+    finally:
+        manager.pool.close_all()
+        if manager.cache is not None:
+            manager.cache.close()
+        if manager.search_index is not None:
+            manager.search_index.close()
+        stop_tracing()
+
+
+if __name__ == "__main__":
+    main()
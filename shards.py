@@ -0,0 +1,267 @@
+import os
+import csv
+import glob
+import json
+import time
+import hashlib
+import logging
+import argparse
+from contextlib import contextmanager
+
+from writer import CsvStreamWriter
+from compressed_io import (
+    EXTENSIONS, open_text, remove_framed, replace_framed, strip_compression, truncate_uncommitted
+)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+_TMP_SUFFIX = ".tmp"
+
+
+def build_shards_path(csv_file_path):
+    return os.path.splitext(strip_compression(csv_file_path))[0] + "_shards"
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _count_rows(path):
+    with open_text(path) as f:
+        return max(0, sum(1 for _ in csv.reader(f, delimiter=';')) - 1)
+
+
+@contextmanager
+def _manifest_lock(directory):
+    # Манифест могут обновлять несколько запусков в одном каталоге.
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, MANIFEST_FILE + ".lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _owner_alive(tmp_path):
+    try:
+        pid = int(os.path.basename(tmp_path).split("-")[2])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"columns": [], "shards": []}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = path + _TMP_SUFFIX
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _register_shard(directory, columns, entry):
+    with _manifest_lock(directory):
+        manifest = read_manifest(directory)
+        manifest["columns"] = list(columns)
+        manifest["shards"].append(entry)
+        _write_manifest(directory, manifest)
+
+
+def _page_label(page):
+    # Страница режима областей — пара (область, номер); в манифест пишется строкой.
+    if isinstance(page, tuple):
+        return f"{page[0]}:{page[1]}"
+    return page
+
+
+def _finalize(directory, tmp_path, columns, first_page=None, last_page=None, pages=None):
+    path = tmp_path[:-len(_TMP_SUFFIX)]
+    # У сжатой части отбрасывается незавершённый кадр, индекс кадров переносится вместе с ней.
+    truncate_uncommitted(tmp_path)
+    replace_framed(tmp_path, path)
+    entry = {
+        "file": os.path.basename(path),
+        "rows": _count_rows(path),
+        "first_page": first_page,
+        "last_page": last_page,
+        "pages": pages,
+        "bytes": os.path.getsize(path),
+        "sha256": _sha256(path),
+        "finished_at": time.time(),
+    }
+    _register_shard(directory, columns, entry)
+    return entry
+
+
+# Запись результатов частями. Каждая часть пишется во временный файл
+# part-<запуск>-<номер>.csv[.gz|.zst].tmp и после завершения атомарно переименовывается;
+# в manifest.json добавляется число строк, диапазон и число страниц и SHA-256 части.
+# Части закрываются только на границе страницы (sync с номером страницы),
+# когда в текущей набралось max_rows строк или max_pages страниц. Страница —
+# номер страницы выдачи или, в режиме областей, пара (область, номер).
+class ShardedCsvWriter(CsvStreamWriter):
+    def __init__(self, directory, fieldnames, max_rows=None, max_pages=None, **kwargs):
+        super().__init__(None, fieldnames, **kwargs)
+        self.directory = directory
+        self.max_rows = max_rows
+        self.max_pages = max_pages
+        self.run_id = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+        self.shards = 0
+        self._rows = 0
+        self._pages = []
+        # Последняя синхронизированная страница; не сбрасывается при смене части.
+        self._last_page = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._recover()
+        return super().start()
+
+    def _recover(self):
+        # Части, оставшиеся незакрытыми после аварийного завершения, закрываются
+        # без диапазона страниц: их строки уже учтены чекпоинтом. Части запусков,
+        # которые ещё работают, не трогаем.
+        for tmp_path in sorted(glob.glob(os.path.join(self.directory, f"part-*.csv*{_TMP_SUFFIX}"))):
+            if _owner_alive(tmp_path):
+                continue
+            entry = _finalize(self.directory, tmp_path, self.fieldnames)
+            logger.warning(f"Восстановлена незакрытая часть {entry['file']}: {entry['rows']} строк")
+
+    def _open(self, path):
+        self.shards += 1
+        extension = EXTENSIONS.get(self.compression, "")
+        self.file_path = os.path.join(
+            self.directory, f"part-{self.run_id}-{self.shards:05d}.csv{extension}{_TMP_SUFFIX}"
+        )
+        self._rows = 0
+        self._pages = []
+        super()._open(self.file_path)
+
+    def _write_row(self, item):
+        super()._write_row(item)
+        self._rows += 1
+
+    def _on_sync(self, page):
+        super()._on_sync(page)
+        if page is None:
+            return
+        self._add_pages(page)
+        if ((self.max_rows and self._rows >= self.max_rows)
+                or (self.max_pages and len(self._pages) >= self.max_pages)):
+            self._rotate()
+
+    def _add_pages(self, page):
+        # Параллельный обход подтверждает страницы по непрерывному префиксу: когда
+        # разрыв закрывается, одна синхронизация покрывает несколько номеров, и все
+        # они относятся к текущей части. В режиме областей номера в каждой области
+        # начинаются заново, поэтому страницы различаются парой (область, номер).
+        if isinstance(page, int) and isinstance(self._last_page, int):
+            if page <= self._last_page:
+                return
+            self._pages.extend(range(self._last_page + 1, page + 1))
+        elif page != self._last_page:
+            self._pages.append(page)
+        self._last_page = page
+
+    def _close_shard(self):
+        super()._finish()
+        if self._rows == 0:
+            remove_framed(self.file_path)
+            return
+        pages = self._pages
+        entry = _finalize(
+            self.directory, self.file_path, self.fieldnames,
+            _page_label(pages[0]) if pages else None, _page_label(pages[-1]) if pages else None, len(pages)
+        )
+        logger.info(f"Часть {entry['file']} закрыта: {entry['rows']} строк")
+
+    def _rotate(self):
+        self._close_shard()
+        self._open(None)
+
+    def _finish(self):
+        self._close_shard()
+
+
+def iter_shard_paths(directory, seen=()):
+    # Готовые части в порядке появления в манифесте; seen — уже загруженные файлы,
+    # чтобы при повторном вызове во время обхода забирать только новые.
+    for entry in read_manifest(directory)["shards"]:
+        if entry["file"] not in seen:
+            yield os.path.join(directory, entry["file"]), entry
+
+
+def verify_shards(directory):
+    broken = []
+    for path, entry in iter_shard_paths(directory):
+        if not os.path.exists(path) or _sha256(path) != entry["sha256"]:
+            broken.append(entry["file"])
+    return broken
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Части результатов парсинга 2ГИС")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="готовые части из манифеста")
+    list_parser.add_argument("directory")
+    verify_parser = commands.add_parser("verify", help="проверить контрольные суммы частей")
+    verify_parser.add_argument("directory")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        total = 0
+        for path, entry in iter_shard_paths(args.directory):
+            total += entry["rows"]
+            if entry["first_page"] is None:
+                pages = "?"
+            elif entry["first_page"] == entry["last_page"]:
+                pages = str(entry["first_page"])
+            else:
+                pages = f"{entry['first_page']} … {entry['last_page']}"
+            if entry.get("pages"):
+                pages += f" ({entry['pages']})"
+            print(f"{entry['file']}\t{entry['rows']} строк\tстраницы {pages}")
+        print(f"Всего строк: {total}")
+    elif args.command == "verify":
+        broken = verify_shards(args.directory)
+        for name in broken:
+            print(f"Повреждена или отсутствует: {name}")
+        if broken:
+            raise SystemExit(1)
+        print("Все части в порядке")
+
+
+if __name__ == "__main__":
+    main()
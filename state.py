@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+import threading
+
+from compressed_io import FramedWriter, open_text, remove_framed, strip_compression
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STATE_FOLDER = "state"
+LOCK_FILE = "job.lock"
+CHECKPOINT_FILE = "checkpoint.jsonl.gz"
+
+
+class JobLocked(RuntimeError):
+    pass
+
+
+def job_name(csv_file_path):
+    # Имя задачи — имя файла результатов без расширений: город, запрос и профиль.
+    return os.path.splitext(os.path.basename(strip_compression(csv_file_path)))[0]
+
+
+# Чекпоинт задачи — журнал: каждое сохранение дописывает кадр gzip с номером
+# страницы и ключами компаний, записанных с прошлого сохранения, а не
+# переписывает всё множество обработанных компаний. Ключи передаёт вызывающий:
+# в чекпоинт попадают только компании, строки которых уже сброшены на диск,
+# а не все, взятые в работу потоками обхода.
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._saved = set()
+        self._journal = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {'last_page': 0, 'processed': set()}
+        last_page = 0
+        processed = set()
+        try:
+            # Читаются только завершённые кадры: запись, оборванная аварией, не учитывается.
+            with open_text(self.path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    last_page = entry['last_page']
+                    processed.update(entry['processed'])
+            logger.info(f"Чекпоинт загружен: страница {last_page}")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки чекпоинта: {e}")
+        self._saved.update(processed)
+        return {'last_page': last_page, 'processed': processed}
+
+    def save(self, page_num, keys):
+        try:
+            with self._lock:
+                added = [key for key in set(keys) if key not in self._saved]
+                if self._journal is None:
+                    self._journal = FramedWriter(self.path, "gzip")
+                self._journal.write(json.dumps({'last_page': page_num, 'processed': added}, ensure_ascii=False) + "\n")
+                self._journal.commit()
+                self._saved.update(added)
+            logger.info(f"Чекпоинт сохранён: страница {page_num}, новых компаний {len(added)}")
+        except Exception as e:
+            logger.error(f"Ошибка сохранения чекпоинта: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def remove(self):
+        self.close()
+        with self._lock:
+            self._saved.clear()
+            remove_framed(self.path)
+
+
+# Состояние одной задачи (город, запрос, профиль) в parsed_data/state/<задача>/:
+# чекпоинт, логи и временные файлы, включая профили Chrome. Каталог занимается
+# блокировкой job.lock, поэтому разные задачи работают на одной машине
+# независимо, а повторный запуск той же задачи получает JobLocked.
+class JobState:
+    def __init__(self, root, name):
+        self.name = name
+        self.directory = os.path.join(root, STATE_FOLDER, name)
+        self.logs_dir = os.path.join(self.directory, "logs")
+        self.tmp_dir = os.path.join(self.directory, "tmp")
+        self.checkpoint = Checkpoint(os.path.join(self.directory, CHECKPOINT_FILE))
+        self._lock_file = None
+
+    def acquire(self):
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, LOCK_FILE), 'a+', encoding='utf-8')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.seek(0)
+                owner = lock_file.read().strip() or "?"
+                lock_file.close()
+                raise JobLocked(f"Задача {self.name} уже выполняется (pid {owner})")
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        # Временные файлы прошлого запуска никому не принадлежат: блокировка у нас.
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        os.makedirs(self.logs_dir, exist_ok=True)
+        return self
+
+    def release(self):
+        self.checkpoint.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        if self._lock_file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock_file.close()
+        self._lock_file = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def log_path(self):
+        return os.path.join(self.logs_dir, f"parsing_{time.strftime('%Y%m%d_%H%M%S')}.log")
+
+    def profile_dir(self, prefix="chrome"):
+        return tempfile.mkdtemp(prefix=f"{prefix}-", dir=self.tmp_dir)
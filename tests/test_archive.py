@@ -0,0 +1,37 @@
+from archive import SnapshotArchive, build_archive_path, latest_entries, read_index, read_snapshot
+
+
+def test_snapshots_round_trip(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    archive.add_card("https://2gis.ru/moscow/firm/123", "<html>старая</html>")
+    archive.add_card("https://2gis.ru/moscow/firm/123", "<html>новая</html>", "http://a", "http://b")
+    archive.add_listing("moscow", "кафе", 1, "<html>выдача</html>", ["123"])
+    archive.close()
+
+    entries = read_index(str(tmp_path))
+    cards = latest_entries(entries, "card")
+    assert [entry["key"] for entry in cards] == ["123"]
+    assert read_snapshot(str(tmp_path), cards[0]) == "<html>новая</html>"
+    assert cards[0]["resolved"] == "http://b"
+
+
+def test_grid_listings_are_keyed_by_area(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    archive.add_listing("moscow", "кафе", 1, "<html>a</html>", [], area="37.6,55.7/z12")
+    archive.add_listing("moscow", "кафе", 1, "<html>b</html>", [], area="37.7,55.8/z12")
+    archive.close()
+    listings = latest_entries(read_index(str(tmp_path)), "listing")
+    assert sorted(read_snapshot(str(tmp_path), entry) for entry in listings) == ["<html>a</html>", "<html>b</html>"]
+
+
+def test_truncated_index_line_is_skipped(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    archive.add_listing("moscow", "кафе", 1, "<html></html>", [])
+    archive.close()
+    with open(tmp_path / "index.jsonl", 'a', encoding='utf-8') as f:
+        f.write('{"kind": "card", "key"')
+    assert len(read_index(str(tmp_path))) == 1
+
+
+def test_archive_path():
+    assert build_archive_path("parsed_data/Москва_кафе.csv.gz") == "parsed_data/Москва_кафе_archive"
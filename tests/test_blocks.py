@@ -0,0 +1,62 @@
+import pytest
+
+import blocks
+from blocks import BlockMonitor, classify_page
+
+
+class FakePool:
+    def return_driver(self, driver):
+        pass
+
+
+class FakeDriver:
+    session_id = "s1"
+
+    def execute_cdp_cmd(self, command, params):
+        pass
+
+
+@pytest.mark.parametrize("state, reason", [
+    ({"url": "https://2gis.ru/showcaptcha?retpath=x", "textLength": 500}, "captcha"),
+    ({"url": "https://2gis.ru", "text": "Слишком много запросов", "textLength": 500}, "rate_limit"),
+    ({"url": "https://2gis.ru", "textLength": 10}, "empty"),
+    ({"url": "https://2gis.ru", "text": "Кафе", "textLength": 500}, None),
+])
+def test_classify_page(state, reason):
+    assert classify_page(state) == reason
+
+
+def test_empty_page_needs_repeat_on_same_driver():
+    monitor = BlockMonitor()
+    assert not monitor.confirm("empty", "a")
+    # Пустая страница другого драйвера и нормальная страница третьего не влияют на счёт «a».
+    assert not monitor.confirm("empty", "b")
+    assert not monitor.confirm(None, "c")
+    assert monitor.confirm("empty", "a")
+    assert monitor.confirm("empty", "b")
+
+
+def test_normal_page_resets_streak():
+    monitor = BlockMonitor()
+    assert not monitor.confirm("empty", "a")
+    assert not monitor.confirm(None, "a")
+    assert not monitor.confirm("empty", "a")
+    assert monitor.confirm("captcha", "a")
+
+
+def test_quarantine_uses_applied_cooldown(monkeypatch):
+    timers = []
+
+    class FakeTimer:
+        def __init__(self, interval, function, args):
+            timers.append(interval)
+            self.daemon = False
+
+        def start(self):
+            pass
+
+    monkeypatch.setattr(blocks.threading, "Timer", FakeTimer)
+    monitor = BlockMonitor(cooldown=30.0)
+    assert monitor.record("captcha") == 30.0
+    monitor.quarantine(FakeDriver(), FakePool())
+    assert timers == [30.0]
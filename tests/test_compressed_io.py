@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from compressed_io import FramedWriter, committed_size, iter_records, open_text, strip_compression
+from state import Checkpoint
+from writer import CsvStreamWriter
+
+
+@pytest.mark.parametrize("extension", [".gz", ".zst"])
+def test_compressed_csv_appends_across_runs(tmp_path, extension):
+    if extension == ".zst":
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / f"out.csv{extension}")
+    for name in ("Кафе", "Бар"):
+        with CsvStreamWriter(path, ["Название"]) as csv_writer:
+            csv_writer.write({"Название": name})
+            csv_writer.sync(1)
+    assert [row["Название"] for row in iter_records(path)] == ["Кафе", "Бар"]
+
+
+def test_uncommitted_frame_is_invisible_and_truncated(tmp_path):
+    path = str(tmp_path / "data.jsonl.gz")
+    writer = FramedWriter(path, "gzip")
+    writer.write("первая\n")
+    writer.commit()
+    size = committed_size(path)
+    writer.write("оборванная\n" * 1000)
+    writer.flush()
+    # Процесс «упал» до commit(): читатели видят только завершённый кадр.
+    with open_text(path) as f:
+        assert f.read() == "первая\n"
+    FramedWriter(path, "gzip").close()
+    assert os.path.getsize(path) == size
+
+
+def test_checkpoint_journal_round_trip(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl.gz")
+    checkpoint = Checkpoint(path)
+    checkpoint.save(1, ["a", "b"])
+    checkpoint.save(2, ["b", "c"])
+    checkpoint.close()
+    assert Checkpoint(path).load() == {"last_page": 2, "processed": {"a", "b", "c"}}
+    checkpoint.remove()
+    assert Checkpoint(path).load() == {"last_page": 0, "processed": set()}
+
+
+def test_strip_compression():
+    assert strip_compression("Москва_кафе.csv.zst") == "Москва_кафе.csv"
+    assert strip_compression("Москва_кафе.csv") == "Москва_кафе.csv"
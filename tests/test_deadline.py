@@ -0,0 +1,36 @@
+import csv
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded, budget
+from profiles import FULL_COLUMNS, TIMED_OUT_COLUMN
+from record import CompanyRecord
+from writer import CsvStreamWriter
+
+
+def test_timeout_is_capped_by_remaining_budget():
+    deadline = Deadline(0.5)
+    assert deadline.timeout(10) <= 0.5
+    assert deadline.timeout(0.1) == 0.1
+    assert budget(None, 7) == 7
+
+
+def test_expired_deadline_raises():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded):
+        budget(deadline, 10)
+
+
+def test_timed_out_groups_reach_csv(tmp_path):
+    record = CompanyRecord(name="Кафе", timed_out=("phones", "socials"))
+    path = tmp_path / "out.csv"
+    with CsvStreamWriter(str(path), FULL_COLUMNS) as csv_writer:
+        csv_writer.write(record)
+        csv_writer.write(CompanyRecord(name="Бар"))
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f, delimiter=';'))
+    assert [row[TIMED_OUT_COLUMN] for row in rows] == ["phones, socials", ""]
+    assert CompanyRecord.from_dict(rows[0]).timed_out == ("phones", "socials")
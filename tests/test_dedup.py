@@ -0,0 +1,69 @@
+import csv
+
+import pytest
+
+from dedup import CLUSTER_COLUMN, normalize_address, normalize_name, resolve_csv
+
+
+@pytest.mark.parametrize("address", [
+    "Ленинский проспект, 15",
+    "Ленинский пр-кт, 15",
+    "Ленинский пр-т, д. 15",
+    "Ленинский пр-кт, 15, 2 этаж",
+    "Ленинский проспект, 15, офис 12",
+    "Ленинский пр-кт, 15, 3-й этаж, оф. 4б",
+])
+def test_address_variants_normalize_equally(address):
+    assert normalize_address(address) == "ленинский пр 15"
+
+
+def test_boulevard_abbreviation():
+    assert normalize_address("Тверской б-р, 3") == normalize_address("Тверской бульвар, 3")
+
+
+def test_office_word_inside_street_name_is_kept():
+    assert normalize_address("Офисная улица, 5") == "офисная ул 5"
+
+
+def test_name_drops_legal_form():
+    assert normalize_name("ООО «Ромашка»") == "ромашка"
+    assert normalize_address("Н/Д") == ""
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def read_rows(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f, delimiter=';'))
+
+
+HEADER = ["Название", "Адрес", "Телефоны", "Email", "Ссылка 2ГИС"]
+ROWS = [
+    ["Кофейня Зерно", "Ленинский проспект, 15", "+7 (495) 111-22-33", "Н/Д", "https://2gis.ru/moscow/firm/1"],
+    ["ООО Кофейня Зерно", "Ленинский пр-кт, 15, 2 этаж", "84951112233", "a@zerno.ru", "https://2gis.ru/moscow/firm/2"],
+    ["Кофейня Зерно", "Тверская улица, 7", "+7 495 999-00-00", "Н/Д", "https://2gis.ru/moscow/firm/3"],
+    ["Аптека Здоровье", "Ленинский проспект, 15", "Н/Д", "Н/Д", "https://2gis.ru/moscow/firm/4"],
+]
+
+
+def test_branches_stay_separate_and_duplicates_merge(tmp_path):
+    input_path, output_path = tmp_path / "in.csv", tmp_path / "out.csv"
+    write_csv(input_path, HEADER, ROWS)
+    assert resolve_csv(str(input_path), str(output_path)) == (4, 3)
+    clusters = [row[CLUSTER_COLUMN] for row in read_rows(output_path)]
+    assert clusters[0] == clusters[1]
+    assert len({clusters[0], clusters[2], clusters[3]}) == 3
+
+
+def test_collapse_keeps_most_complete_record(tmp_path):
+    input_path, output_path = tmp_path / "in.csv", tmp_path / "out.csv"
+    write_csv(input_path, HEADER, ROWS)
+    resolve_csv(str(input_path), str(output_path), collapse=True)
+    rows = read_rows(output_path)
+    assert len(rows) == 3
+    assert rows[0]["Email"] == "a@zerno.ru"
@@ -0,0 +1,44 @@
+import time
+
+from detail_cache import DetailCache
+
+
+def test_hit_requires_all_groups(tmp_path):
+    cache = DetailCache(str(tmp_path / "cache.sqlite"))
+    cache.put("123", ("phones", "website"), {"phones": ["+7 900"], "website": "http://a"})
+    assert cache.get("123", ("website",)) == {"phones": ["+7 900"], "website": "http://a"}
+    assert cache.get("123", ("website", "email")) is None
+    assert cache.get("456", ("website",)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    cache.close()
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = DetailCache(str(tmp_path / "cache.sqlite"), ttl=0)
+    cache.put("123", ("website",), {"website": "http://a"})
+    time.sleep(0.01)
+    assert cache.get("123", ("website",)) is None
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DetailCache(str(tmp_path / "cache.sqlite"), max_entries=3)
+    for firm_id in ("1", "2", "3"):
+        cache.put(firm_id, ("website",), {})
+        time.sleep(0.01)
+    cache.get("1", ("website",))
+    cache.put("4", ("website",), {})
+    assert cache.get("2", ("website",)) is None
+    assert cache.get("1", ("website",)) == {}
+    assert cache.stats()["size"] == 3
+    cache.close()
+
+
+def test_cache_persists_between_runs(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = DetailCache(path)
+    cache.put("123", ("website",), {"website": "http://a"})
+    cache.close()
+    cache = DetailCache(path)
+    assert cache.get("123", ("website",)) == {"website": "http://a"}
+    cache.close()
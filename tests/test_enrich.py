@@ -0,0 +1,72 @@
+import csv
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from enrich import LIVENESS_COLUMN, SiteEnricher, enrich_csv
+
+PAGES = {
+    "/": (200, '<a href="mailto:info@example.ru">Почта</a> <a href="https://vk.com/cafe">ВК</a>'),
+    "/robots.txt": (200, "User-agent: *\nDisallow: /private\n"),
+    "/old": (301, ""),
+    "/private": (200, '<a href="mailto:secret@example.ru">Почта</a>'),
+}
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, body = PAGES.get(self.path, (404, "нет"))
+        data = body.encode("utf-8")
+        self.send_response(status)
+        if status == 301:
+            self.send_header("Location", "/")
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def read_rows(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f, delimiter=';'))
+
+
+def test_enrich_csv_fills_contacts_and_keeps_columns(site, tmp_path):
+    input_path = tmp_path / "in.csv"
+    output_path = tmp_path / "out.csv"
+    rows = [
+        ("Кафе", f"{site}/old", "Н/Д", "Н/Д", "1"),
+        ("Бар", f"{site}/private", "Н/Д", "Н/Д", "2"),
+        ("Склад", f"{site}/missing", "bar@example.ru", "Н/Д", "3"),
+    ]
+    with open(input_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(["Название", "Веб-сайт", "Email", "ВКонтакте", "Метка"])
+        writer.writerows(rows)
+
+    enrich_csv(str(input_path), str(output_path), SiteEnricher(concurrency=4, timeout=5.0))
+    cafe, bar, store = read_rows(output_path)
+
+    assert cafe["Email"] == "info@example.ru"
+    assert cafe["ВКонтакте"] == "https://vk.com/cafe"
+    assert cafe[LIVENESS_COLUMN] == "да"
+    assert bar["Email"] == "Н/Д"
+    assert bar[LIVENESS_COLUMN] == "запрещено robots.txt"
+    assert store["Email"] == "bar@example.ru"
+    assert store[LIVENESS_COLUMN] == "нет (404)"
+    # Колонка, которой нет в CompanyRecord, переносится без изменений.
+    assert [row["Метка"] for row in (cafe, bar, store)] == ["1", "2", "3"]
@@ -0,0 +1,38 @@
+import pytest
+
+from geo_grid import CITY_BOUNDS, MAX_ZOOM, initial_tiles, tile_search_url
+
+
+def test_initial_tiles_cover_city():
+    tiles = initial_tiles("moscow", grid=3)
+    assert len(tiles) == 9
+    min_lon, min_lat, max_lon, max_lat = CITY_BOUNDS["moscow"]
+    assert min(tile.min_lon for tile in tiles) == min_lon
+    assert max(tile.max_lat for tile in tiles) == pytest.approx(max_lat)
+
+
+def test_split_zooms_in():
+    tile = initial_tiles("moscow", grid=1)[0]
+    children = tile.split()
+    assert len(children) == 4
+    assert all(child.depth == 1 and child.zoom >= tile.zoom for child in children)
+    assert len({child.label() for child in children}) == 4
+
+
+def test_zoom_is_capped():
+    tile = initial_tiles("moscow", grid=1)[0]
+    for _ in range(12):
+        tile = tile.split()[0]
+    assert tile.zoom == MAX_ZOOM
+
+
+def test_search_url():
+    tile = initial_tiles("spb", grid=1)[0]
+    url = tile_search_url("spb", "кафе", tile)
+    assert url.startswith("https://2gis.ru/spb/search/%D0%BA%D0%B0%D1%84%D0%B5?m=")
+    assert url.endswith(f"%2F{tile.zoom}")
+
+
+def test_unknown_city_rejected():
+    with pytest.raises(ValueError):
+        initial_tiles("tver")
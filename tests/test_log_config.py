@@ -0,0 +1,69 @@
+import json
+import atexit
+import logging
+import queue
+
+import pytest
+
+import log_config
+from log_config import JsonFormatter, SampleFilter, company_logger, forward_log_record, setup_logging, setup_worker_logging
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    if log_config._listener is not None:
+        atexit.unregister(log_config._listener.stop)
+        log_config._listener.stop()
+        log_config._listener = None
+
+
+def test_json_formatter_keeps_extra_fields():
+    record = logging.makeLogRecord({"name": "main", "levelname": "INFO", "msg": "страница %d", "args": (3,)})
+    record.page = 3
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "страница 3"
+    assert entry["page"] == 3
+
+
+def test_sample_filter_keeps_warnings():
+    sample = SampleFilter(3)
+    infos = [sample.filter(logging.makeLogRecord({"levelno": logging.INFO})) for _ in range(6)]
+    assert infos == [True, False, False, True, False, False]
+    assert sample.filter(logging.makeLogRecord({"levelno": logging.WARNING}))
+
+
+def test_company_messages_are_sampled_in_log_file(tmp_path, root_logger):
+    log_file = tmp_path / "job.log"
+    company = company_logger("test_log_config")
+    listener = setup_logging(log_file=str(log_file), json_lines=True, sample_every=2)
+    for i in range(4):
+        company.info("компания %d", i)
+    logging.getLogger("test_log_config").info("итог")
+    atexit.unregister(listener.stop)
+    listener.stop()
+    log_config._listener = None
+    messages = [json.loads(line)["message"] for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert messages == ["компания 0", "компания 2", "итог"]
+
+
+def test_worker_records_are_prefixed(root_logger):
+    records = queue.SimpleQueue()
+    setup_worker_logging(records, "[процесс 1] ")
+    logging.getLogger("worker").info("готов %s", "к работе")
+    record = records.get_nowait()
+    assert record.getMessage() == "[процесс 1] готов к работе"
+
+    received = []
+    handler = logging.Handler()
+    handler.emit = received.append
+    root_logger.handlers[:] = [handler]
+    forward_log_record(record)
+    assert received == [record]
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+pytest.importorskip("selenium")
+
+import main
+
+
+class FakeListingPool:
+    def __init__(self, size):
+        self.drivers = [object() for _ in range(size)]
+        self._free = list(self.drivers)
+        self._lock = threading.Lock()
+
+    def get_driver(self):
+        with self._lock:
+            return self._free.pop()
+
+    def return_driver(self, driver):
+        with self._lock:
+            self._free.append(driver)
+
+
+def test_parallel_pages_commit_contiguous_prefix(monkeypatch):
+    second_range_done = threading.Event()
+
+    def fake_crawl(driver, driver_pool, city_alias, city_name, search_query, profile, on_result,
+                   start_page=0, on_page_done=None, max_pages=100, **kwargs):
+        if start_page == 1:
+            # Первый диапазон завершается последним: страницы 3-4 ждут разрыва.
+            second_range_done.wait(timeout=10)
+        for page in range(start_page, max_pages + 1):
+            on_page_done(page, [f"firm-{page}"])
+        if start_page == 3:
+            second_range_done.set()
+        return {"last_page": max_pages, "exhausted": max_pages >= 4}
+
+    monkeypatch.setattr(main, "crawl", fake_crawl)
+    committed = []
+    main.crawl_pages_parallel(
+        FakeListingPool(2), None, "moscow", "Москва", "кафе", None, on_result=None,
+        on_page_done=lambda page, keys: committed.append((page, keys)), chunk=2, max_pages=4
+    )
+    # Пока страница 1 не готова, чекпоинт не продвигается; затем подтверждается весь префикс.
+    assert committed == [(1, ["firm-1"]), (4, ["firm-2", "firm-3", "firm-4"])]
+
+
+def test_search_page_url():
+    assert main.search_page_url("moscow", "кафе", 1).endswith("/search/%D0%BA%D0%B0%D1%84%D0%B5")
+    assert main.search_page_url("moscow", "кафе", 3).endswith("/page/3")
@@ -0,0 +1,102 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import memory_governor
+from memory_governor import MB, MemoryGovernor, process_tree, tree_rss
+
+
+class FakeSwitch:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def window(self, handle):
+        self.driver.current = handle
+
+
+class FakeProcess:
+    pid = os.getpid()
+
+
+class FakeService:
+    process = FakeProcess()
+
+
+# Драйвер, процесс которого — сам тест; вкладки хранятся списком.
+class FakeDriver:
+    session_id = "session-1"
+    service = FakeService()
+
+    def __init__(self, windows=("main",)):
+        self.windows = list(windows)
+        self.current = self.windows[0]
+        self.switch_to = FakeSwitch(self)
+
+    @property
+    def window_handles(self):
+        return list(self.windows)
+
+    @property
+    def current_window_handle(self):
+        return self.current
+
+    def close(self):
+        self.windows.remove(self.current)
+
+
+@pytest.fixture(params=["psutil", "proc"])
+def backend(request, monkeypatch):
+    if request.param == "psutil":
+        pytest.importorskip("psutil")
+    else:
+        if not os.path.isdir("/proc"):
+            pytest.skip("нет /proc")
+        monkeypatch.setattr(memory_governor, "psutil", None)
+
+
+def test_process_tree_includes_children(backend):
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        assert process_tree(os.getpid())[0] == os.getpid()
+        assert child.pid in process_tree(os.getpid())
+        assert tree_rss(os.getpid()) > 0
+    finally:
+        child.kill()
+        child.wait()
+
+
+def test_budget_is_checked_every_nth_return(backend):
+    governor = MemoryGovernor(budget_mb=1, check_every=2)
+    driver = FakeDriver()
+    governor.register(driver)
+    assert governor.on_return(driver) is False
+    assert governor.on_return(driver) is True
+    governor.unregister(driver, recycled=True)
+    report = governor.report()
+    assert report["recycled"] == 1
+    assert report["drivers"][0]["peak_mb"] > 1
+
+
+def test_extra_windows_are_closed():
+    governor = MemoryGovernor()
+    driver = FakeDriver(["main", "popup-1", "popup-2"])
+    governor.register(driver)
+    assert governor.on_return(driver) is False
+    assert driver.windows == ["main"]
+    assert driver.current == "main"
+    assert governor.report()["closed_windows"] == 2
+
+
+def test_cgroup_limits(tmp_path):
+    assert MemoryGovernor(cgroup=str(tmp_path)).cgroup is None
+    governor = MemoryGovernor(budget_mb=100, cgroup=str(tmp_path))
+    assert (tmp_path / "cgroup.subtree_control").read_text() == "+memory"
+    assert governor.chrome_arguments() == []
+
+    governor.register(FakeDriver())
+    path = tmp_path / f"driver-{os.getpid()}"
+    assert (path / "memory.high").read_text() == str(100 * MB)
+    assert (path / "memory.max").read_text() == str(100 * memory_governor.CGROUP_HARD_FACTOR * MB)
+    assert MemoryGovernor(js_heap_mb=512).chrome_arguments() == ["--js-flags=--max-old-space-size=512"]
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+import multiproc
+from multiproc import WorkerProcessPool
+from profiles import DEFAULT_PROFILE, get_profile
+
+# Дочерние процессы импортируют main из sys.path родителя, поэтому вместо
+# настоящего парсера с Chrome им подкладывается этот модуль.
+FAKE_MAIN = '''
+import os
+
+
+class DriverPool:
+    def __init__(self, size, profile_root=None):
+        self.drivers = [object()] * size
+
+    def close_all(self):
+        pass
+
+
+class _Report:
+    def log_report(self):
+        pass
+
+    def configure(self, **kwargs):
+        pass
+
+
+block_monitor = selectors = memory_governor = _Report()
+
+
+def process_single_company(data, driver_pool, profile, cache=None, company_budget=None):
+    if data["Название"] == "crash":
+        os._exit(3)
+    return {"Название": data["Название"]}
+'''
+
+
+@pytest.fixture
+def fake_main(tmp_path, monkeypatch):
+    monkeypatch.setattr(multiproc, "RESTART_BACKOFF", 0.05)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    def write(source):
+        (tmp_path / "main.py").write_text(source, encoding="utf-8")
+
+    return write
+
+
+def run_batch(pool, companies):
+    pool.start()
+    try:
+        return pool.process_batch(companies)
+    finally:
+        pool.close()
+
+
+def test_crashing_company_is_skipped(fake_main):
+    fake_main(FAKE_MAIN)
+    pool = WorkerProcessPool(2, 2, get_profile(DEFAULT_PROFILE))
+    companies = [{"Название": f"c{i}"} for i in range(10)] + [{"Название": "crash"}]
+    results = run_batch(pool, companies)
+    assert sorted(record["Название"] for record in results) == sorted(f"c{i}" for i in range(10))
+    assert pool.restarts >= 1
+
+
+def test_worker_failing_on_start_is_retired(fake_main):
+    fake_main('raise ImportError("chromedriver не найден")\n')
+    pool = WorkerProcessPool(1, 1, get_profile(DEFAULT_PROFILE), max_restarts=2)
+    started = time.monotonic()
+    assert run_batch(pool, [{"Название": "c1"}, {"Название": "c2"}]) == []
+    assert pool.restarts == 2
+    assert time.monotonic() - started < 30
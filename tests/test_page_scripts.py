@@ -0,0 +1,50 @@
+from page_scripts import (
+    PAGE_SCRIPTS, SCRIPT_NAMESPACE, build_bootstrap, register_page_scripts, run_page_script, script_versions
+)
+
+
+class FakeDriver:
+    # Документ браузера: словарь зарегистрированных скриптов и журнал вызовов.
+    def __init__(self, registered=True):
+        self.registered = registered
+        self.cdp = []
+        self.scripts = []
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp.append(command)
+        return {"identifier": "7"}
+
+    def execute_script(self, script, *args):
+        self.scripts.append(script)
+        if script.startswith("(function"):
+            self.registered = True
+            return None
+        return {"ok": True} if self.registered else "__gisTraceMissing"
+
+
+def test_versions_cover_every_script():
+    versions = script_versions()
+    assert set(versions) == set(PAGE_SCRIPTS)
+    assert all(version.startswith(f"{PAGE_SCRIPTS[name][0]}.") for name, version in versions.items())
+
+
+def test_bootstrap_defines_namespace():
+    bootstrap = build_bootstrap(["company_details"])
+    assert f"window.{SCRIPT_NAMESPACE}" in bootstrap
+    assert "ns['company_details']" in bootstrap
+
+
+def test_register_replaces_previous_script():
+    driver = FakeDriver()
+    assert register_page_scripts(driver, "3") == "7"
+    assert driver.cdp == ["Page.removeScriptToEvaluateOnNewDocument", "Page.addScriptToEvaluateOnNewDocument"]
+
+
+def test_run_sends_script_only_when_missing():
+    driver = FakeDriver()
+    assert run_page_script(driver, "company_details", ["phones"]) == {"ok": True}
+    assert len(driver.scripts) == 1
+
+    driver = FakeDriver(registered=False)
+    assert run_page_script(driver, "company_details") == {"ok": True}
+    assert len(driver.scripts) == 3
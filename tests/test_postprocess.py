@@ -0,0 +1,51 @@
+import csv
+
+import pytest
+
+from postprocess import (DOMAIN_COLUMN, E164_COLUMN, HOUSE_COLUMN, PREMISES_COLUMN, STREET_COLUMN,
+                         canonical_url, normalize_domain, phone_to_e164, postprocess_csv, split_address)
+
+
+@pytest.mark.parametrize("phone, expected", [
+    ("8 (495) 111-22-33 доб. 12", "+74951112233"),
+    ("495 111 22 33", "+74951112233"),
+    ("+375 29 123-45-67", "+375291234567"),
+    ("22-33-44", None),
+])
+def test_phone_to_e164(phone, expected):
+    assert phone_to_e164(phone) == expected
+
+
+def test_canonical_url_and_domain():
+    assert canonical_url("HTTP://WWW.Example.ru:80/path/?utm_source=x&id=1#top") == "http://www.example.ru/path?id=1"
+    assert canonical_url("Н/Д") is None
+    assert normalize_domain("www.example.ru/contacts") == "example.ru"
+
+
+def test_split_address():
+    assert split_address("ТЦ Европа, Ленинский проспект, 15 к2, 3 этаж, офис 12") == (
+        "Ленинский проспект", "15 к2", "ТЦ Европа, 3 этаж, офис 12"
+    )
+    assert split_address("Тверская улица, 7") == ("Тверская улица", "7", None)
+    assert split_address("Н/Д") == (None, None, None)
+
+
+def test_postprocess_csv_adds_columns_in_batches(tmp_path):
+    input_path, output_path = tmp_path / "in.csv", tmp_path / "out.csv"
+    with open(input_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(["Название", "Телефоны", "Веб-сайт", "Адрес"])
+        writer.writerow(["Кофейня", "+7 (495) 111-22-33; 8 495 111 22 33", "https://www.zerna.ru/", "Тверская улица, 7"])
+        writer.writerow(["Аптека", "Н/Д", "Н/Д", "Н/Д"])
+        writer.writerow(["Пекарня", "22-33-44", "bread.ru/?utm_medium=x", "Арбат, 1, офис 3"])
+
+    assert postprocess_csv(str(input_path), str(output_path), batch_size=2) == 3
+    with open(output_path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f, delimiter=';'))
+
+    assert [row[E164_COLUMN] for row in rows] == ["+74951112233", "Н/Д", "Н/Д"]
+    assert [row["Веб-сайт"] for row in rows] == ["https://www.zerna.ru", "Н/Д", "http://bread.ru"]
+    assert [row[DOMAIN_COLUMN] for row in rows] == ["zerna.ru", "Н/Д", "bread.ru"]
+    assert (rows[2][STREET_COLUMN], rows[2][HOUSE_COLUMN], rows[2][PREMISES_COLUMN]) == ("Арбат", "1", "офис 3")
+    # Колонки, которой не было во входном файле, обработка не добавляет.
+    assert "Режим работы (тип)" not in rows[0]
@@ -0,0 +1,34 @@
+import pytest
+
+from priority import FetchBudget, default_score, load_scorer, prioritize
+
+
+def test_score_reads_listing_numbers():
+    plain = default_score({"Рейтинг": "4,5", "Отзывы": "1 200 оценок"})
+    assert plain > default_score({"Рейтинг": "4,5", "Отзывы": "12 оценок"})
+    assert default_score({}) == 0.0
+
+
+def test_matching_category_gets_bonus():
+    company = {"Рейтинг": "4", "Категория": "Кафе-кондитерская"}
+    assert default_score(company, "кафе") > default_score(company, "аптека")
+
+
+def test_prioritize_is_stable_and_survives_errors():
+    companies = [{"Название": "a", "s": 1}, {"Название": "b", "s": 2}, {"Название": "c", "s": 1}, {"Название": "d"}]
+    ordered = prioritize(companies, lambda company, query: company["s"])
+    assert [company["Название"] for company in ordered] == ["b", "a", "c", "d"]
+    assert prioritize(companies, None) == companies
+
+
+def test_budget_limits_companies():
+    budget = FetchBudget(max_companies=2)
+    assert [budget.take() for _ in range(3)] == [True, True, False]
+    assert budget.exhausted
+    assert budget.stats()["skipped"] == 1
+
+
+def test_load_scorer():
+    assert load_scorer("priority:default_score") is default_score
+    with pytest.raises(ValueError):
+        load_scorer("priority")
@@ -0,0 +1,31 @@
+import pytest
+
+from profiles import DEFAULT_PROFILE, PROFILES, TIMED_OUT_COLUMN, firm_id_from_url, get_profile
+
+
+def test_firm_id_from_url():
+    assert firm_id_from_url("https://2gis.ru/moscow/firm/70000001012345678?m=37.6") == "70000001012345678"
+    assert firm_id_from_url("https://2gis.ru/moscow/search/кафе") is None
+    assert firm_id_from_url(None) is None
+
+
+def test_dedup_key_by_firm_id():
+    profile = get_profile(DEFAULT_PROFILE)
+    first = {"Ссылка 2ГИС": "https://2gis.ru/moscow/firm/123?stat=a"}
+    second = {"Ссылка 2ГИС": "https://2gis.ru/moscow/firm/123/tab/reviews"}
+    assert profile.dedup_key(first) == profile.dedup_key(second) == "123"
+
+
+def test_dedup_key_by_name():
+    assert get_profile("website-only").dedup_key({"Название": "Кафе"}) == "Кафе"
+
+
+def test_profiles_mark_timed_out_groups():
+    assert all(TIMED_OUT_COLUMN in profile.columns for profile in PROFILES.values())
+    assert get_profile("contacts").needs_phone_reveal
+    assert not get_profile("website-only").needs_phone_reveal
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        get_profile("нет такого")
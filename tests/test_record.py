@@ -0,0 +1,47 @@
+import csv
+
+from dedup import CLUSTER_COLUMN, resolve_csv
+from profiles import FULL_COLUMNS
+from record import MISSING, CompanyRecord, Social, to_row
+
+
+def test_round_trip_through_row():
+    row = {
+        "Название": "Кафе", "Телефоны": "+7 900; +7 901", "ВКонтакте": "https://vk.com/cafe",
+        "Веб-сайт": "http://cafe.ru", "Email": MISSING, "Ссылка 2ГИС": "https://2gis.ru/moscow/firm/1",
+    }
+    record = CompanyRecord.from_dict(row)
+    assert record.phones == ("+7 900", "+7 901")
+    assert record.email is None
+    assert record.social(Social.VK) == "https://vk.com/cafe"
+    out = record.to_row()
+    assert list(out) == FULL_COLUMNS
+    assert out["Телефоны"] == "+7 900; +7 901"
+    assert out["Ссылка"] == "http://cafe.ru"
+    assert out["Адрес"] == MISSING
+
+
+def test_apply_card_only_touches_requested_groups():
+    record = CompanyRecord(name="Кафе", email="old@cafe.ru", website="http://old")
+    record.apply_card({"email": "new@cafe.ru", "website": "http://new", "phones": ["+7 900"]}, ("website",))
+    assert (record.email, record.website, record.phones) == ("old@cafe.ru", "http://new", ())
+
+
+def test_plain_rows_pass_through():
+    row = {"Название": "Кафе"}
+    assert to_row(row) is row
+
+
+def test_dedup_keeps_unmodeled_columns(tmp_path):
+    input_path, output_path = tmp_path / "in.csv", tmp_path / "out.csv"
+    with open(input_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(["Название", "Адрес", "Сайт доступен", "Телефон (E.164)"])
+        writer.writerow(["Кафе", "Тверская улица, 7", "да", "+74951112233"])
+    resolve_csv(str(input_path), str(output_path))
+    with open(output_path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f, delimiter=';'))
+    assert rows == [{
+        "Название": "Кафе", "Адрес": "Тверская улица, 7", "Сайт доступен": "да",
+        "Телефон (E.164)": "+74951112233", CLUSTER_COLUMN: "1",
+    }]
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+pytest.importorskip("selenium")
+
+import reviews
+from record import CompanyRecord
+from reviews import ReviewCursors, ReviewSink, harvest_firm, parse_review_date, reviews_url
+
+LINK = "https://2gis.ru/moscow/firm/123?stat=x"
+
+
+class FakeDriver:
+    def get(self, url):
+        self.url = url
+
+
+def item(number):
+    return {"author": f"автор {number}", "date": "12 марта 2024", "rating": 5, "text": f"отзыв {number}"}
+
+
+@pytest.fixture
+def page(monkeypatch):
+    # Страница отзывов: каждый вызов скрипта отдаёт следующую порцию.
+    batches = []
+    monkeypatch.setattr(reviews, "SCROLL_PAUSE", 0)
+    monkeypatch.setattr(reviews.block_monitor, "check", lambda driver, where=None: None)
+    monkeypatch.setattr(reviews.selectors, "wait", lambda *args, **kwargs: object() if batches else None)
+    monkeypatch.setattr(reviews, "run_page_script", lambda *args: {"items": batches.pop(0) if batches else []})
+    return batches
+
+
+def harvest(tmp_path, max_reviews=None):
+    sink = ReviewSink(str(tmp_path / "reviews.jsonl"))
+    cursors = ReviewCursors(str(tmp_path / "cursor.jsonl"))
+    count = harvest_firm(FakeDriver(), CompanyRecord(name="Кафе", gis_link=LINK), sink, cursors, max_reviews)
+    sink.close()
+    cursors.close()
+    return count, ReviewCursors(str(tmp_path / "cursor.jsonl")).get("123")
+
+
+def read_reviews(tmp_path):
+    with open(tmp_path / "reviews.jsonl", 'r', encoding='utf-8') as f:
+        return [json.loads(line)["text"] for line in f]
+
+
+def test_reviews_url_and_date():
+    assert reviews_url(LINK) == "https://2gis.ru/moscow/firm/123/tab/reviews"
+    assert parse_review_date("12 марта 2024, отредактирован") == "2024-03-12"
+    assert parse_review_date("вчера") is None
+
+
+def test_missing_reviews_keep_cursor_open(tmp_path, page):
+    count, cursor = harvest(tmp_path)
+    assert count == 0
+    assert cursor is None
+
+
+def test_harvest_resumes_after_last_review(tmp_path, page):
+    page.extend([[item(1), item(2)]])
+    assert harvest(tmp_path, max_reviews=1)[0] == 1
+    page.extend([[item(1), item(2), item(3)]])
+    count, cursor = harvest(tmp_path)
+    assert count == 3
+    assert cursor["done"]
+    assert read_reviews(tmp_path) == ["отзыв 1", "отзыв 2", "отзыв 3"]
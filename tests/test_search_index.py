@@ -0,0 +1,66 @@
+import csv
+import os
+
+import pytest
+
+from search_index import SearchIndex, fts_query
+
+HEADER = ["Название", "Адрес", "Категория", "Телефоны", "Веб-сайт", "Ссылка 2ГИС"]
+ROWS = [
+    ["Кофейня Зёрна", "Ленинский проспект, 15", "Кофейни", "+7 (495) 111-22-33", "https://www.zerna.ru/", "https://2gis.ru/moscow/firm/1"],
+    ["Аптека Здоровье", "Тверская улица, 7", "Аптеки", "+7 495 999-00-00", "Н/Д", "https://2gis.ru/moscow/firm/2"],
+]
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def index(tmp_path):
+    data = tmp_path / "data"
+    (data / "state").mkdir(parents=True)
+    write_csv(data / "moscow.csv", ROWS)
+    # Служебный каталог в индекс не попадает.
+    write_csv(data / "state" / "skip.csv", ROWS)
+    index = SearchIndex(str(tmp_path / "index.sqlite"))
+    yield index, data
+    index.close()
+
+
+def names(results):
+    return [result["name"] for result in results]
+
+
+def test_fts_query_uses_prefixes_and_yo():
+    assert fts_query("Зёрна, кофе") == '"зерна"* "кофе"*'
+
+
+def test_search_by_text_phone_and_domain(index):
+    index, data = index
+    assert index.update(str(data)) == {"indexed": 1, "rows": 2, "removed": 0}
+    assert names(index.search("зерна")) == ["Кофейня Зёрна"]
+    assert names(index.search("тверск")) == ["Аптека Здоровье"]
+    assert names(index.search(phone="8 495 111-22-33")) == ["Кофейня Зёрна"]
+    assert names(index.search(phone="99-00-00")) == ["Аптека Здоровье"]
+    assert names(index.search(domain="zerna.ru")) == ["Кофейня Зёрна"]
+    assert index.search() == []
+
+
+def test_unchanged_files_are_skipped_and_removed_files_dropped(index):
+    index, data = index
+    index.update(str(data))
+    assert index.update(str(data))["indexed"] == 0
+
+    # Та же фирма во второй выгрузке в ответ попадает один раз.
+    write_csv(data / "copy.csv", ROWS[:1])
+    assert index.update(str(data))["indexed"] == 1
+    assert names(index.search("кофейня")) == ["Кофейня Зёрна"]
+    assert index.stats() == {"files": 2, "rows": 3, "firms": 2}
+
+    os.remove(data / "moscow.csv")
+    assert index.update(str(data))["removed"] == 1
+    assert index.search("аптека") == []
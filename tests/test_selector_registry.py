@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("selenium")
+
+from selector_registry import SelectorRegistry
+
+
+class FakeRoot:
+    def __init__(self, present):
+        self.present = present
+
+    def find_elements(self, by, selector):
+        return ["element"] if selector in self.present else []
+
+
+def make_registry(**kwargs):
+    return SelectorRegistry(selectors={"item": "div.new"}, fallbacks={"item": ("div.old",)}, **kwargs)
+
+
+def test_last_matching_alternative_goes_first():
+    registry = make_registry()
+    assert registry.find_all(FakeRoot({"div.old"}), "item") == ["element"]
+    assert registry.alternatives("item") == ["div.old", "div.new"]
+
+
+def test_dead_selector_gets_short_timeout_with_probes():
+    registry = make_registry(dead_after=2, dead_timeout=0.5, probe_every=3)
+    for _ in range(2):
+        assert registry.find_all(FakeRoot(set()), "item") == []
+    timeouts = [registry._timeout_for("item", 10) for _ in range(3)]
+    assert timeouts == [0.5, 0.5, 10]
+
+
+def test_match_revives_selector():
+    registry = make_registry(dead_after=1)
+    registry.find_all(FakeRoot(set()), "item")
+    registry.find_all(FakeRoot({"div.new"}), "item")
+    assert registry._timeout_for("item", 10) == 10
+    assert any("ок" in line for line in registry.report())
@@ -0,0 +1,61 @@
+import csv
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("selenium")
+
+from profiles import DEFAULT_PROFILE, get_profile
+from server import Job, JobManager, create_app
+
+
+def make_job(tmp_path, query="кафе"):
+    job = Job("moscow", "Москва", query, get_profile(DEFAULT_PROFILE))
+    job.csv_file_path = str(tmp_path / f"{query}.csv")
+    return job
+
+
+def write_csv(path, names):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(["Название"])
+        writer.writerows([name] for name in names)
+
+
+def test_results_are_read_up_to_synced_rows(tmp_path):
+    job = make_job(tmp_path)
+    write_csv(job.csv_file_path, ["a", "b", "c", "d"])
+    job.mark_synced(2)
+    results = []
+
+    def read():
+        for batch in job.iter_results(1):
+            results.extend(row["Название"] for row in batch)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    job.mark_synced(4)
+    job.set_status("done")
+    reader.join(timeout=30)
+    assert not reader.is_alive()
+    assert results == ["b", "c", "d"]
+
+
+def test_finished_jobs_are_pruned(tmp_path):
+    manager = JobManager(keep_finished=1)
+    jobs = [manager.submit("moscow", "Москва", f"запрос {i}", get_profile(DEFAULT_PROFILE)) for i in range(2)]
+    for job in jobs:
+        job.set_status("done")
+    manager.submit("moscow", "Москва", "запрос 2", get_profile(DEFAULT_PROFILE))
+    assert jobs[0].id not in manager.jobs
+    assert jobs[1].id in manager.jobs
+
+
+def test_list_jobs_returns_snapshot(tmp_path):
+    manager = JobManager()
+    job = manager.submit("moscow", "Москва", "кафе", get_profile(DEFAULT_PROFILE))
+    client = create_app(manager).test_client()
+    response = client.get("/jobs")
+    assert response.status_code == 200
+    assert [entry["id"] for entry in response.get_json()] == [job.id]
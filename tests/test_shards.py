@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from shards import ShardedCsvWriter, iter_shard_paths, read_manifest, verify_shards
+
+
+def run(directory, syncs, **kwargs):
+    csv_writer = ShardedCsvWriter(str(directory), ["Название"], **kwargs).start()
+    for page in syncs:
+        csv_writer.write({"Название": str(page)})
+        csv_writer.sync(page)
+    csv_writer.close()
+    return [
+        (entry["first_page"], entry["last_page"], entry["pages"], entry["rows"])
+        for entry in read_manifest(str(directory))["shards"]
+    ]
+
+
+@pytest.mark.parametrize("syncs, expected", [
+    ([1, 2, 3, 4, 5], [(1, 2, 2, 2), (3, 4, 2, 2), (5, 5, 1, 1)]),
+    # Параллельный обход: повтор номера ничего не добавляет, скачок покрывает пропущенные страницы.
+    ([1, 4, 4, 6], [(1, 4, 4, 2), (5, 6, 2, 2)]),
+    ([("a", 1), ("a", 2), ("b", 1), ("b", 2), ("c", 1)], [("a:1", "a:2", 2, 2), ("b:1", "b:2", 2, 2), ("c:1", "c:1", 1, 1)]),
+])
+def test_shards_close_on_page_count(tmp_path, syncs, expected):
+    assert run(tmp_path, syncs, max_pages=2) == expected
+
+
+def test_shards_close_on_row_count(tmp_path):
+    assert [rows for *_, rows in run(tmp_path, [1, 2, 3], max_rows=2)] == [2, 1]
+
+
+def test_verify_detects_modified_shard(tmp_path):
+    run(tmp_path, [1, 2], max_rows=1)
+    assert verify_shards(str(tmp_path)) == []
+    path, entry = next(iter_shard_paths(str(tmp_path)))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("лишнее\n")
+    assert verify_shards(str(tmp_path)) == [entry["file"]]
+
+
+def test_unfinished_shard_of_dead_run_is_recovered(tmp_path):
+    name = "part-20240101000000-999999999-00001.csv.tmp"
+    with open(tmp_path / name, 'w', encoding='utf-8') as f:
+        f.write("Название\nКафе\n")
+    ShardedCsvWriter(str(tmp_path), ["Название"]).start().close()
+    shards = read_manifest(str(tmp_path))["shards"]
+    assert [(entry["file"], entry["rows"]) for entry in shards] == [(name[:-4], 1)]
+    assert not os.path.exists(tmp_path / name)
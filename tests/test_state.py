@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from state import JobLocked, JobState, job_name
+
+
+def test_job_name_from_csv_path():
+    assert job_name("parsed_data/Москва_кафе_contacts.csv.gz") == "Москва_кафе_contacts"
+
+
+def test_second_run_of_same_job_is_locked(tmp_path):
+    with JobState(str(tmp_path), "Москва_кафе") as state:
+        with pytest.raises(JobLocked, match=str(os.getpid())):
+            JobState(str(tmp_path), "Москва_кафе").acquire()
+        # Другая задача в том же каталоге не блокируется.
+        JobState(str(tmp_path), "Москва_бар").acquire().release()
+        profile = state.profile_dir()
+        assert os.path.dirname(profile) == state.tmp_dir
+    assert not os.path.exists(state.tmp_dir)
+    JobState(str(tmp_path), "Москва_кафе").acquire().release()
+
+
+def test_stale_temp_files_are_cleared(tmp_path):
+    state = JobState(str(tmp_path), "Москва_кафе")
+    os.makedirs(state.tmp_dir)
+    open(os.path.join(state.tmp_dir, "old"), 'w').close()
+    with state:
+        assert os.listdir(state.tmp_dir) == []
+
+
+def test_checkpoints_are_separate_per_job(tmp_path):
+    with JobState(str(tmp_path), "Москва_кафе") as cafe, JobState(str(tmp_path), "Москва_бар") as bar:
+        cafe.checkpoint.save(3, ["1"])
+        assert bar.checkpoint.load()["last_page"] == 0
+    assert JobState(str(tmp_path), "Москва_кафе").checkpoint.load()["last_page"] == 3
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from tracing import instant, span, start_tracing, stop_tracing
+
+
+def test_span_is_noop_without_tracer():
+    stop_tracing()
+    with span("card") as current:
+        assert current is None
+
+
+def test_trace_file_is_valid_json(tmp_path):
+    path = tmp_path / "trace.json"
+    start_tracing(str(path))
+    try:
+        with span("card", firm="123"):
+            instant("block", reason="captcha")
+        with pytest.raises(ValueError):
+            with span("card_script"):
+                raise ValueError
+    finally:
+        stop_tracing()
+    events = json.loads(path.read_text(encoding="utf-8"))
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert spans["card"]["args"] == {"firm": "123"}
+    assert spans["card_script"]["args"] == {"error": "ValueError"}
+    assert any(event["ph"] == "i" and event["name"] == "block" for event in events)
+
+
+def test_interrupted_trace_is_readable(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = start_tracing(str(path))
+    with span("card"):
+        pass
+    tracer.flush()
+    # Файл без закрывающей скобки, как после аварийного завершения.
+    events = json.loads(path.read_text(encoding="utf-8") + "]")
+    stop_tracing()
+    assert [event["name"] for event in events if event["ph"] == "X"] == ["card"]
@@ -0,0 +1,63 @@
+import csv
+
+import pytest
+
+import writer
+from writer import CsvStreamWriter, WriterStopped
+
+
+def read_rows(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f, delimiter=';'))
+
+
+def test_sync_returns_written_rows(tmp_path):
+    path = tmp_path / "out.csv"
+    with CsvStreamWriter(str(path), ["Название", "Адрес"]) as csv_writer:
+        csv_writer.write({"Название": "Кафе"})
+        csv_writer.write({"Название": "Бар", "Адрес": "Ленина, 1"})
+        assert csv_writer.sync(1) == 2
+        assert [row["Название"] for row in read_rows(path)] == ["Кафе", "Бар"]
+    assert read_rows(path)[0]["Адрес"] == "Н/Д"
+
+
+def test_transform_failure_keeps_batch(tmp_path):
+    path = tmp_path / "out.csv"
+    calls = []
+
+    def transform(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise ValueError("сбой постобработки")
+        return rows
+
+    csv_writer = CsvStreamWriter(str(path), ["Название"], transform=transform).start()
+    csv_writer.write({"Название": "Кафе"})
+    # Неудачная синхронизация не сообщает число записей, строки остаются в пачке.
+    assert csv_writer.sync(1) is None
+    csv_writer.write({"Название": "Бар"})
+    assert csv_writer.sync(2) == 2
+    csv_writer.close()
+    assert [row["Название"] for row in read_rows(path)] == ["Кафе", "Бар"]
+
+
+def test_periodic_flush_failure_keeps_thread_alive(tmp_path):
+    csv_writer = CsvStreamWriter(
+        str(tmp_path / "out.csv"), ["Название"], flush_every=1, transform=lambda rows: 1 / 0
+    ).start()
+    csv_writer.write({"Название": "Кафе"})
+    assert csv_writer.sync() is None
+    assert csv_writer._thread.is_alive()
+    csv_writer.close()
+
+
+def test_write_and_sync_raise_when_thread_stopped(tmp_path, monkeypatch):
+    monkeypatch.setattr(writer, "ALIVE_CHECK_INTERVAL", 0.05)
+    csv_writer = CsvStreamWriter(str(tmp_path / "out.csv"), ["Название"], queue_size=2).start()
+    csv_writer.queue.put(writer._STOP)
+    csv_writer._thread.join()
+    with pytest.raises(WriterStopped):
+        csv_writer.sync()
+    with pytest.raises(WriterStopped):
+        for _ in range(10):
+            csv_writer.write({"Название": "Кафе"})
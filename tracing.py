@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import atexit
+import threading
+from contextlib import nullcontext
+
+FLUSH_EVERY = 5000
+
+# Один пустой контекст на все вызовы span() при выключенной трассировке:
+# проверка глобальной переменной и возврат готового объекта, без выделений памяти.
+_NULL_SPAN = nullcontext()
+
+_tracer = None
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.tracer.now()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.complete(self.name, self.start, self.tracer.now(), self.args)
+
+
+# Запись интервалов в формате Chrome trace events (JSON Array Format), который
+# открывают Perfetto и chrome://tracing. Интервалы копятся в памяти и
+# дописываются в файл пачками по FLUSH_EVERY; формат допускает файл без
+# закрывающей скобки, поэтому трасса прерванного запуска тоже читается.
+class Tracer:
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+        self._events = []
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write("[\n")
+        self._empty = True
+        self._add({"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "2gisTrace"}})
+
+    def now(self):
+        return (time.perf_counter_ns() - self._origin) // 1000
+
+    def _add(self, event):
+        with self._lock:
+            self._events.append(event)
+            full = len(self._events) >= FLUSH_EVERY
+        if full:
+            self.flush()
+
+    def _tid(self):
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self._threads:
+            self._threads.add(tid)
+            self._add({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": thread.name}})
+        return tid
+
+    def complete(self, name, start, end, args=None):
+        event = {"name": name, "ph": "X", "ts": start, "dur": end - start, "pid": self.pid, "tid": self._tid()}
+        if args:
+            event["args"] = args
+        self._add(event)
+
+    def instant(self, name, **args):
+        event = {"name": name, "ph": "i", "s": "t", "ts": self.now(), "pid": self.pid, "tid": self._tid()}
+        if args:
+            event["args"] = args
+        self._add(event)
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+            if self._file is None or not events:
+                return
+            lines = ",\n".join(json.dumps(event, ensure_ascii=False, default=str) for event in events)
+            self._file.write(lines if self._empty else ",\n" + lines)
+            self._empty = False
+            self._file.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write("\n]\n")
+            self._file.close()
+            self._file = None
+
+
+def span(name, **args):
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, args)
+
+
+def instant(name, **args):
+    tracer = _tracer
+    if tracer is not None:
+        tracer.instant(name, **args)
+
+
+def start_tracing(path):
+    global _tracer
+    stop_tracing()
+    _tracer = Tracer(path)
+    atexit.register(stop_tracing)
+    return _tracer
+
+
+def stop_tracing():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
@@ -0,0 +1,192 @@
+import os
+import csv
+import time
+import logging
+import threading
+from queue import Queue, Empty, Full
+
+from record import to_row
+from compressed_io import compression_for, open_writer
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+# Как часто write() и sync() проверяют, что поток записи ещё жив.
+ALIVE_CHECK_INTERVAL = 1.0
+
+
+class WriterStopped(Exception):
+    pass
+
+
+class _SyncRequest:
+    def __init__(self, page=None):
+        self.page = page
+        self.written = None
+        self.done = threading.Event()
+
+
+# Запись CSV в отдельном потоке с постоянно открытым файлом. Записи попадают
+# в ограниченную очередь и сбрасываются на диск пачками: по достижении
+# flush_every записей или раз в flush_interval секунд. sync() дожидается
+# записи всего, что уже поставлено в очередь, и делает fsync. Файл с
+# расширением .gz или .zst (или с явным compression) сжимается кадрами
+# (compressed_io.FramedWriter), каждый sync() завершает кадр. transform, если
+# задан, получает пачку строк (словарей) перед каждым сбросом и возвращает
+# строки для записи — так пачками работает постобработка (postprocess.py).
+# Пачка остаётся в памяти, пока не записана: при ошибке сброс повторяется позже,
+# а sync() возвращает None, и чекпоинт не продвигается. Если поток записи
+# завершился, write() и sync() выбрасывают WriterStopped вместо вечного ожидания.
+class CsvStreamWriter:
+    def __init__(self, file_path, fieldnames, queue_size=1000, flush_every=50, flush_interval=2.0,
+                 compression=None, transform=None):
+        self.file_path = file_path
+        self.compression = compression or compression_for(file_path)
+        self.fieldnames = list(fieldnames)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.transform = transform
+        self._batch = []
+        self.queue = Queue(maxsize=queue_size)
+        self.written = 0
+        self._file = None
+        self._thread = None
+
+    def start(self):
+        self._open(self.file_path)
+        self._thread = threading.Thread(target=self._run, name="csv-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def _check_alive(self):
+        if self._thread is None or not self._thread.is_alive():
+            raise WriterStopped(f"Поток записи CSV {self.file_path} остановлен")
+
+    def _put(self, item):
+        while True:
+            self._check_alive()
+            try:
+                self.queue.put(item, timeout=ALIVE_CHECK_INTERVAL)
+                return
+            except Full:
+                continue
+
+    def write(self, record):
+        self._put(record)
+
+    def sync(self, page=None):
+        # Возвращает число записей, сброшенных на диск к моменту синхронизации,
+        # или None, если сбросить не удалось.
+        request = _SyncRequest(page)
+        self._put(request)
+        while not request.done.wait(ALIVE_CHECK_INTERVAL):
+            self._check_alive()
+        return request.written
+
+    def close(self):
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        logger.info(f"Сохранено {self.written} записей в {self.file_path}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _open(self, path):
+        self._file = open_writer(path, self.compression)
+        self._writer = csv.DictWriter(
+            self._file, fieldnames=self.fieldnames, delimiter=';',
+            restval="Н/Д", extrasaction='ignore'
+        )
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def _write_row(self, item):
+        if self.transform is not None:
+            self._batch.append(to_row(item, self.fieldnames))
+            return
+        self._writer.writerow(to_row(item, self.fieldnames))
+
+    def _write_batch(self):
+        if not self._batch:
+            return
+        with span("csv_transform", rows=len(self._batch)):
+            rows = self.transform(self._batch)
+        self._writer.writerows(rows)
+        self._batch = []
+
+    def _on_sync(self, page):
+        self._flush(fsync=True)
+
+    def _finish(self):
+        try:
+            self._flush(fsync=True)
+        finally:
+            self._file.close()
+
+    def _flush(self, fsync=False):
+        self._write_batch()
+        if fsync and self.compression:
+            self._file.commit()
+            return
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def _run(self):
+        pending = 0
+        last_flush = time.monotonic()
+        try:
+            while True:
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except Empty:
+                    item = None
+
+                if item is _STOP:
+                    break
+
+                if isinstance(item, _SyncRequest):
+                    try:
+                        with span("csv_sync", page=item.page):
+                            self._on_sync(item.page)
+                        item.written = self.written
+                    except Exception as e:
+                        logger.error(f"Ошибка синхронизации CSV: {e}")
+                    pending = 0
+                    last_flush = time.monotonic()
+                    item.done.set()
+                    continue
+
+                if item is not None:
+                    try:
+                        with span("csv_write"):
+                            self._write_row(item)
+                        self.written += 1
+                        pending += 1
+                    except Exception as e:
+                        logger.error(f"Ошибка сохранения в CSV: {e}")
+
+                if pending and (pending >= self.flush_every
+                                or time.monotonic() - last_flush >= self.flush_interval):
+                    try:
+                        with span("csv_flush", rows=pending):
+                            self._flush()
+                    except Exception as e:
+                        logger.error(f"Ошибка сохранения в CSV: {e}")
+                    pending = 0
+                    last_flush = time.monotonic()
+                elif not pending:
+                    last_flush = time.monotonic()
+        finally:
+            try:
+                self._finish()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения в CSV: {e}")